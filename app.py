@@ -1,86 +1,76 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 import io
 import os
 import base64
+import uuid
 
-from utils import generate_proof_pdf, generate_multipage_proof_pdf
+from utils import dangling_photo_refs, log_proof_entries, multipage_proof_key, write_multipage_proof_pdf
+from thumbnails import get_thumbnail
+from pdf_preview import PREVIEW_PAGES, PdfPreview, PreviewUnavailable
+from pdf_profiles import PROFILES, get_profile
+from photo_ingest import IngestQueue, upload_id
+from photo_list import apply_page_order, ensure_ids, move_photo, page_bounds, page_count, page_of
+from photo_store import PhotoStore, load_photo_bytes, sweep_expired
+import metrics
 
 st.set_page_config(page_title="SnapProof", page_icon="📸")
 st.title("📸 SnapProof – Mobile Session Proof Generator")
 
+LOG_PAGE_SIZE = 25
+# generated proofs are logged here, and the "Search proof log" panel reads it
+PROOF_LOG_DB = os.getenv("PROOF_LOG_DB", "proof_log.db")
+# without a rasterizer, PDFs up to this size are previewed by embedding them whole
+PREVIEW_EMBED_MAX_BYTES = int(float(os.getenv("SNAPPROOF_PREVIEW_EMBED_MB", "5")) * 1024 * 1024)
+
 # Initialize session state
 if "photos" not in st.session_state:
-    st.session_state.photos = []  # list of dicts {bytes, filename}
+    st.session_state.photos = []  # list of dicts {id, ref, sha256, filename, timestamp, comment, width, height}
 if "statement" not in st.session_state:
     st.session_state.statement = ""
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "store" not in st.session_state:
+    # photo bytes live in a per-session spool directory, not in server memory
+    st.session_state.store = PhotoStore(st.session_state.session_id)
+if not st.session_state.store.touch():
+    # idle past the TTL, so the expiry sweep removed this session's photos; drop the stale handles
+    kept = [p for p in st.session_state.photos if p.get("ref") is None]
+    if len(kept) < len(st.session_state.photos):
+        st.warning(f"{len(st.session_state.photos) - len(kept)} photo(s) expired after the session sat idle; "
+                   "add them again.")
+    st.session_state.photos = kept
+    st.session_state.pdf_ready = False
+    st.session_state.pdf_key = None
+    if "ingest" in st.session_state:
+        st.session_state.ingest.close()
+if "ingest" not in st.session_state:
+    # uploads and captures are validated, spooled and prepared off the script thread
+    st.session_state.ingest = IngestQueue(st.session_state.store)
+sweep_expired()
+# Prometheus /metrics endpoint, once per server process, when SNAPPROOF_METRICS_PORT is set
+metrics.serve_from_env()
 
 
-st.header("Capture or upload photos")
-col1, col2 = st.columns([1, 1])
+def remove_photo(idx: int) -> None:
+    p = st.session_state.photos.pop(idx)
+    st.session_state.ingest.discard(p.get("sha256"))
+    if p.get("ref") is not None:
+        st.session_state.store.delete(p["ref"])
 
-# Camera: auto-add captured photo to session and clear the preview so camera stays ready
-with col1:
-    st.write("Use your device camera")
-    cam = st.camera_input("Take a photo")
-    if cam is not None:
-        cam_bytes = cam.getvalue()
-        # avoid duplicate adds by comparing last_camera
-        if st.session_state.get("last_camera") != cam_bytes:
-            from datetime import datetime as _dt
-            st.session_state.photos.append({
-                "bytes": cam_bytes,
-                "filename": f"camera_{len(st.session_state.photos)+1}.jpg",
-                "timestamp": _dt.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "comment": "",
-            })
-            st.session_state.last_camera = cam_bytes
-            # re-run to clear the camera input immediately
-            st.experimental_rerun()
 
-with col2:
-    st.write("Or upload from gallery")
-    uploaded = st.file_uploader("Upload images", type=["png", "jpg", "jpeg"], accept_multiple_files=True)
-    if uploaded:
-        from datetime import datetime as _dt
-    for u in uploaded:
-        st.session_state.photos.append({"bytes": u.read(), "filename": u.name, "timestamp": _dt.now().strftime("%Y-%m-%d %H:%M:%S"), "comment": ""})
-        st.success(f"Added {len(uploaded)} image(s) to session")
+def photo_thumbnail(p: dict, size: int = 160) -> bytes:
+    """Cached thumbnail for a session photo, keyed by its content hash."""
+    return get_thumbnail(p["ref"], size, digest=p["sha256"])
 
-st.markdown("---")
 
-st.header("Session photos")
-if len(st.session_state.photos) == 0:
-    st.info("No photos yet. Use the camera or upload to start a session.")
-else:
-    st.write(f"{len(st.session_state.photos)} photo(s) in this session")
+def session_pdf_path() -> str:
+    """Path of this session's generated proof PDF, kept in the session spool directory."""
+    return st.session_state.store.path_for("proof.pdf")
 
-    # If reorder info is present in the query params, apply it (coming from the JS Sortable UI)
-    params = st.experimental_get_query_params()
-    if "order" in params:
-        try:
-            order_str = params.get("order")[0]
-            order = [int(x) for x in order_str.split(",") if x.strip()!='']
-            if len(order) == len(st.session_state.photos):
-                new_photos = [st.session_state.photos[i] for i in order]
-                st.session_state.photos = new_photos
-        except Exception:
-            st.warning("Could not apply order from UI; ignoring.")
-        # clear query params so reloading doesn't reapply
-        st.experimental_set_query_params()
-        st.experimental_rerun()
 
-        # Render a draggable reorder UI using SortableJS via an HTML component.
-        # This posts the new order back by reloading the page with ?order=index,...
-        try:
-            # prepare HTML list of images as base64
-            items_html = []
-            for i, p in enumerate(st.session_state.photos):
-                b64 = base64.b64encode(p["bytes"]).decode('utf-8')
-                items_html.append('<div class="item" data-idx="%d"><img src="data:image/jpeg;base64,%s" style="width:120px; height:auto; display:block;"/><div style="text-align:center;">%d. %s</div></div>' % (i, b64, i+1, p["filename"]))
-
-            items_joined = ''.join(items_html)
-            sortable_html = """
+# Drag-and-drop reorder UI for one page of photos; {ITEMS} is the page's thumbnail tiles
+SORTABLE_HTML = """
 <style>
 .sortable-wrap { display:flex; gap:8px; flex-wrap:wrap; align-items:flex-start; }
 .item { border:1px solid #ddd; padding:6px; background:#fff; border-radius:6px; cursor:grab; }
@@ -105,44 +95,10 @@ else:
         window.location.search = qs;
     };
 </script>
-""".replace('{ITEMS}', items_joined)
-            st.components.v1.html(sortable_html, height=240)
-        except Exception:
-            st.info("Drag-and-drop reorder UI unavailable — falling back to buttons below.")
-
-        st.markdown("---")
-
-        # Editable labels + controls fallback (Up/Down/Delete) — works regardless of JS
-        for idx, p in enumerate(st.session_state.photos):
-            cols = st.columns([1, 3, 1, 1, 1])
-            with cols[0]:
-                st.image(p["bytes"], width=90)
-            with cols[1]:
-                label = f"Photo {idx+1} - {p.get('timestamp','') }"
-                st.write(f"**{label} — {p['filename']}**")
-                # editable position input
-                new_pos = st.number_input("Position", min_value=1, max_value=len(st.session_state.photos), value=idx+1, key=f"pos_{idx}")
-                if st.button("Move", key=f"move_{idx}"):
-                    # move item to new_pos (1-based)
-                    try:
-                        new_index = int(new_pos) - 1
-                        if 0 <= new_index < len(st.session_state.photos) and new_index != idx:
-                            item = st.session_state.photos.pop(idx)
-                            st.session_state.photos.insert(new_index, item)
-                            st.experimental_rerun()
-                    except Exception:
-                        st.warning("Invalid position")
-                # Per-photo comment (editable)
-                try:
-                    comment_val = st.text_area("Comment (optional)", value=p.get('comment',''), key=f"comment_{idx}")
-                    # persist back into the photo dict
-                    st.session_state.photos[idx]['comment'] = comment_val
-                except Exception:
-                    # fallback to a single-line input if textarea isn't suitable
-                    comment_val = st.text_input("Comment (optional)", value=p.get('comment',''), key=f"comment_fallback_{idx}")
-                    st.session_state.photos[idx]['comment'] = comment_val
-                # Small per-photo dictation helper (copy/paste style)
-                dictation_block = ('''
+"""
+
+# Per-photo Web Speech dictation helper; {IDX} is the photo id
+PHOTO_DICTATION_HTML = '''
 <div>
   <button id="start_{IDX}">Start</button>
   <button id="stop_{IDX}">Stop</button>
@@ -185,29 +141,157 @@ else:
     document.getElementById('copy_{IDX}').onclick = () => { navigator.clipboard.writeText(result_{IDX}.textContent); alert('Copied to clipboard — paste into the comment box.'); };
   </script>
 </div>
-''').replace('{IDX}', str(idx))
+'''
+
+
+st.header("Capture or upload photos")
+col1, col2 = st.columns([1, 1])
+
+# Streamlit returns the current capture and every uploaded file on each rerun; the ingest queue
+# submits each one once (by widget file id, then by content) and checks it in the background.
+ingest = st.session_state.ingest
+# prepare new photos for the output profile picked below (its value from the last run)
+ingest.profile = st.session_state.get("pdf_profile")
+with col1:
+    st.write("Use your device camera")
+    cam = st.camera_input("Take a photo")
+    if cam is not None and not ingest.seen(upload_id(cam)):
+        ingest.submit(cam.getvalue(), f"camera_{len(st.session_state.photos) + ingest.pending + 1}.jpg",
+                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"), file_id=upload_id(cam))
+
+with col2:
+    st.write("Or upload from gallery")
+    uploaded = st.file_uploader("Upload images", type=["png", "jpg", "jpeg"], accept_multiple_files=True)
+    for u in uploaded or []:
+        if not ingest.seen(upload_id(u)):
+            ingest.submit(u.getvalue(), u.name, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), file_id=upload_id(u))
+
+if ingest.pending:
+    with st.spinner(f"Checking {ingest.pending} photo(s)..."):
+        ingest.wait(timeout=2)
+ready, rejected = ingest.drain()
+for p in ready:
+    p["id"] = uuid.uuid4().hex
+st.session_state.photos.extend(ready)
+if ready:
+    st.success(f"Added {len(ready)} image(s) to session")
+for message in rejected:
+    st.error(message)
+if ingest.pending:
+    st.info(f"{ingest.pending} photo(s) are still being checked.")
+    if st.button("Refresh"):
+        st.rerun()
+
+st.markdown("---")
+
+st.header("Session photos")
+if len(st.session_state.photos) == 0:
+    st.info("No photos yet. Use the camera or upload to start a session.")
+else:
+    photos = st.session_state.photos
+    ensure_ids(photos)
+    st.write(f"{len(photos)} photo(s) in this session")
+
+    # If reorder info is present in the query params, apply it (coming from the JS Sortable UI).
+    # It lists the global indices of the page that was dragged, in their new order.
+    if "order" in st.query_params:
+        try:
+            order_str = st.query_params["order"]
+            order = [int(x) for x in order_str.split(",") if x.strip()!='']
+            if order and not apply_page_order(photos, min(order), order):
+                st.warning("Photos changed since the order was sent; ignoring.")
+        except Exception:
+            st.warning("Could not apply order from UI; ignoring.")
+        # clear query params so reloading doesn't reapply
+        st.query_params.clear()
+        st.rerun()
+
+    # Only the current page is rendered, so a rerun costs O(page) rather than O(session)
+    start, stop, page = page_bounds(len(photos), st.session_state.get("photo_page", 0))
+    st.session_state.photo_page = page
+    pages = page_count(len(photos))
+    if pages > 1:
+        nav = st.columns([1, 2, 1])
+        with nav[0]:
+            if st.button("◀ Previous", disabled=page == 0):
+                st.session_state.photo_page = page - 1
+                st.rerun()
+        with nav[1]:
+            st.write(f"Page {page + 1} of {pages} — photos {start + 1}–{stop}")
+        with nav[2]:
+            if st.button("Next ▶", disabled=page == pages - 1):
+                st.session_state.photo_page = page + 1
+                st.rerun()
+
+    # Render a draggable reorder UI for this page using SortableJS via an HTML component.
+    # This posts the new order back by reloading the page with ?order=index,...
+    try:
+        # prepare HTML list of cached thumbnails as base64 (full photos stay on the server)
+        items_html = []
+        for i in range(start, stop):
+            p = photos[i]
+            b64 = base64.b64encode(photo_thumbnail(p)).decode('utf-8')
+            items_html.append('<div class="item" data-idx="%d"><img src="data:image/jpeg;base64,%s" style="width:120px; height:auto; display:block;"/><div style="text-align:center;">%d. %s</div></div>' % (i, b64, i+1, p["filename"]))
+
+        items_joined = ''.join(items_html)
+        sortable_html = SORTABLE_HTML.replace('{ITEMS}', items_joined)
+        st.components.v1.html(sortable_html, height=240)
+    except Exception:
+        st.info("Drag-and-drop reorder UI unavailable — falling back to buttons below.")
+
+    st.markdown("---")
+
+    # Editable labels + controls fallback (Up/Down/Delete) — works regardless of JS.
+    # Widgets are keyed by photo id, so comments and toggles follow a photo when it moves.
+    for idx in range(start, stop):
+        p = photos[idx]
+        pid = p["id"]
+        cols = st.columns([1, 3, 1, 1, 1])
+        with cols[0]:
+            st.image(photo_thumbnail(p), width=90)
+        with cols[1]:
+            label = f"Photo {idx+1} - {p.get('timestamp','') }"
+            st.write(f"**{label} — {p['filename']}**")
+            # editable position input (any position in the session, not just this page)
+            new_pos = st.number_input("Position", min_value=1, max_value=len(photos), value=idx+1, key=f"pos_{pid}_{idx}")
+            if st.button("Move", key=f"move_{pid}"):
+                # move item to new_pos (1-based) and follow it to its page
+                new_index = int(new_pos) - 1
+                if move_photo(photos, idx, new_index):
+                    st.session_state.photo_page = page_of(new_index)
+                    st.rerun()
+            # Per-photo comment (editable)
+            try:
+                comment_val = st.text_area("Comment (optional)", value=p.get('comment',''), key=f"comment_{pid}")
+                # persist back into the photo dict
+                p['comment'] = comment_val
+            except Exception:
+                # fallback to a single-line input if textarea isn't suitable
+                comment_val = st.text_input("Comment (optional)", value=p.get('comment',''), key=f"comment_fallback_{pid}")
+                p['comment'] = comment_val
+            # Small per-photo dictation helper (copy/paste style), only loaded when asked for
+            if st.checkbox("🎤 Dictate comment", key=f"dictate_{pid}"):
                 try:
-                    st.components.v1.html(dictation_block, height=120)
+                    st.components.v1.html(PHOTO_DICTATION_HTML.replace('{IDX}', pid), height=120)
                 except Exception:
                     pass
-            with cols[2]:
-                if st.button("Up", key=f"up_{idx}"):
-                    if idx > 0:
-                        st.session_state.photos[idx-1], st.session_state.photos[idx] = st.session_state.photos[idx], st.session_state.photos[idx-1]
-                        st.experimental_rerun()
-            with cols[3]:
-                if st.button("Down", key=f"down_{idx}"):
-                    if idx < len(st.session_state.photos)-1:
-                        st.session_state.photos[idx+1], st.session_state.photos[idx] = st.session_state.photos[idx], st.session_state.photos[idx+1]
-                        st.experimental_rerun()
-            with cols[4]:
-                if st.button("Delete", key=f"del_{idx}"):
-                    st.session_state.photos.pop(idx)
-                    st.experimental_rerun()
-
-    if st.button("View full photos"):
-        for p in st.session_state.photos:
-            st.image(p["bytes"], use_column_width=True)
+        with cols[2]:
+            if st.button("Up", key=f"up_{pid}"):
+                if move_photo(photos, idx, idx - 1):
+                    st.rerun()
+        with cols[3]:
+            if st.button("Down", key=f"down_{pid}"):
+                if move_photo(photos, idx, idx + 1):
+                    st.rerun()
+        with cols[4]:
+            if st.button("Delete", key=f"del_{pid}"):
+                remove_photo(idx)
+                st.rerun()
+
+    # Full-size photos are only sent to the browser on request
+    if st.button("View full photos on this page"):
+        for p in photos[start:stop]:
+            st.image(load_photo_bytes(p), use_column_width=True)
 
 st.markdown("---")
 
@@ -264,6 +348,12 @@ st.components.v1.html(dictation_html, height=180)
 
 st.markdown("---")
 
+# Output profile: trades generation time against the size of the PDF
+profile_names = list(PROFILES)
+pdf_profile = st.selectbox("PDF size", profile_names, index=profile_names.index(get_profile().name),
+                           key="pdf_profile", help="fast: quickest to generate, largest file · balanced: default · "
+                                "smallest: re-encodes every photo for the smallest file")
+
 col_a, col_b = st.columns([1, 1])
 with col_a:
     if st.button("✓ Confirm & Generate Proof"):
@@ -273,18 +363,100 @@ with col_a:
             st.warning("Please add a statement before generating the proof.")
         else:
             photo_comments = {i: p.get('comment', '') for i, p in enumerate(st.session_state.photos)}
-            pdf_bytes = generate_multipage_proof_pdf(st.session_state.photos, st.session_state.statement, photo_comments=photo_comments)
+            missing = dangling_photo_refs(st.session_state.statement, len(st.session_state.photos))
+            if missing:
+                st.warning(f"The statement mentions {', '.join(missing)}, but the session has "
+                           f"{len(st.session_state.photos)} photo(s); those references are not linked.")
+            pdf_key = multipage_proof_key(st.session_state.photos, st.session_state.statement,
+                                          photo_comments=photo_comments, profile=pdf_profile)
+            # unchanged since the last click: the session's PDF (and its preview pages) are still current
+            if pdf_key != st.session_state.get("pdf_key") or not os.path.exists(session_pdf_path()):
+                # Write the PDF to a per-session file so it is streamed from disk, not held in session memory;
+                # a proof generated before (e.g. before an edit that was undone) comes from the proof cache
+                write_multipage_proof_pdf(session_pdf_path(), st.session_state.photos, st.session_state.statement, photo_comments=photo_comments,
+                                          profile=pdf_profile, cache_key=pdf_key)
+                st.session_state.pdf_key = pdf_key
+                generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                task = st.session_state.statement.strip().splitlines()[0][:200]
+                log_proof_entries([{"timestamp": generated_at, "task": task, "filename": p.get("filename", "")}
+                                   for p in st.session_state.photos], PROOF_LOG_DB)
+            st.session_state.pdf_ready = True
+            st.session_state.preview_pages = PREVIEW_PAGES
             st.success("Proof package generated — download below")
-            st.download_button("📄 Download Proof PDF", data=pdf_bytes, file_name="proof.pdf", mime="application/pdf")
+
+    if st.session_state.get("pdf_ready") and os.path.exists(session_pdf_path()):
+        # handed over as an open file: read from disk for the response, never kept in server memory
+        with open(session_pdf_path(), "rb") as pdf_file:
+            st.download_button("📄 Download Proof PDF", data=pdf_file, file_name="proof.pdf", mime="application/pdf")
+        if st.checkbox("Preview PDF in app"):
+            # small JPEGs of the first pages, rendered once and cached next to the PDF, instead of
+            # sending the whole document as a data URL on every rerun
             try:
-                pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-                pdf_display = f'<iframe src="data:application/pdf;base64,{pdf_base64}" width="100%" height="800px" type="application/pdf"></iframe>'
-                if st.checkbox("Preview PDF in app"):
-                    st.markdown(pdf_display, unsafe_allow_html=True)
+                preview = PdfPreview(session_pdf_path())
+                shown = st.session_state.get("preview_pages", PREVIEW_PAGES)
+                with metrics.stage("preview.render") as s:
+                    page_paths = preview.pages(0, shown)
+                    s.photos = len(page_paths)
+                    s.bytes_out = sum(os.path.getsize(path) for path in page_paths)
+                for n, path in enumerate(page_paths, start=1):
+                    st.image(path, caption=f"Page {n} of {preview.page_count}", use_column_width=True)
+                if shown < preview.page_count and st.button("Show more pages"):
+                    st.session_state.preview_pages = shown + PREVIEW_PAGES
+                    st.rerun()
+            except PreviewUnavailable as e:
+                if os.path.getsize(session_pdf_path()) <= PREVIEW_EMBED_MAX_BYTES:
+                    # no rasterizer installed: embed small PDFs whole, as before page previews
+                    with open(session_pdf_path(), "rb") as f:
+                        pdf_base64 = base64.b64encode(f.read()).decode("utf-8")
+                    st.markdown(f'<iframe src="data:application/pdf;base64,{pdf_base64}" width="100%" height="800px" '
+                                f'type="application/pdf"></iframe>', unsafe_allow_html=True)
+                else:
+                    st.info(f"In-app preview is not available on this server ({e}). Download the PDF to view it.")
             except Exception as e:
                 st.warning(f"PDF preview not available: {e}")
 with col_b:
     if st.button("Reset session"):
         st.session_state.photos = []
         st.session_state.statement = ""
-        st.experimental_rerun()
+        st.session_state.pdf_ready = False
+        st.session_state.pdf_key = None
+        # drop the spooled photos and generated PDF of this session; photos still being
+        # ingested for it are cancelled, or refused by the cleared store
+        st.session_state.ingest.close()
+        st.session_state.store.clear()
+        st.rerun()
+
+st.markdown("---")
+
+# Proof log search, backed by the indexed SQLite log (PROOF_LOG_DB, default proof_log.db)
+with st.expander("Search proof log"):
+    if not os.path.exists(PROOF_LOG_DB):
+        st.info(f"No proofs logged to {PROOF_LOG_DB} yet. Proofs generated here are logged to it; import an "
+                f"existing CSV log with `python proof_log_db.py import proof_log.csv {PROOF_LOG_DB}`.")
+    else:
+        from proof_log_db import get_log_store
+        log_store = get_log_store(PROOF_LOG_DB)
+        q_cols = st.columns([2, 1, 1])
+        with q_cols[0]:
+            q_text = st.text_input("Task or filename contains", key="log_search")
+        with q_cols[1]:
+            q_since = st.date_input("From", value=None, key="log_since")
+        with q_cols[2]:
+            q_until = st.date_input("To", value=None, key="log_until")
+        filters = {
+            "search": q_text.strip() or None,
+            "since": q_since.isoformat() if q_since else None,
+            # inclusive end date: everything before the following day
+            "until": (q_until + timedelta(days=1)).isoformat() if q_until else None,
+        }
+        total = log_store.count(**filters)
+        n_pages = max(1, -(-total // LOG_PAGE_SIZE))
+        current_page = st.number_input("Page", min_value=1, max_value=n_pages, value=1)
+        rows = log_store.query(**filters, limit=LOG_PAGE_SIZE, offset=(current_page - 1) * LOG_PAGE_SIZE)
+        st.caption(f"{total} matching proof(s) — page {current_page} of {n_pages}")
+        st.table([{k: r[k] for k in ("timestamp", "task", "filename")} for r in rows])
+
+# Per-stage timings, when enabled with SNAPPROOF_METRICS=1 (or a metrics port)
+if metrics.is_enabled():
+    with st.expander("Performance metrics"):
+        st.json(metrics.snapshot())
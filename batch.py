@@ -0,0 +1,244 @@
+"""Headless batch proof generation.
+
+Reads a manifest of proof jobs, renders them across a process pool and writes
+one PDF per job into an output directory. Log entries are written in bulk by
+the parent process through a single writer, and a journal in the output
+directory lets an interrupted run resume where it stopped.
+
+Manifest formats (one job per line / row):
+
+  JSONL: {"id": "job-1", "images": ["a.jpg", "b.jpg"], "task": "...",
+          "statement": "...", "comments": ["first photo", "second photo"]}
+  CSV:   id,images,task,statement,comments
+         with images separated by ';' and comments by '|'
+
+A job with a single image and no statement becomes a single-photo proof
+(generate_proof_pdf); anything else becomes a multi-page proof. Relative
+image paths are resolved against the manifest's directory.
+
+Usage:
+  python batch.py manifest.jsonl -o out/ [-w 4] [--log proof_log.csv] [--no-resume]
+                  [--profile fast|balanced|smallest]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from pdf_profiles import PROFILES, get_profile
+from photo_store import PhotoRef
+from proof_manifest import hash_file
+from utils import log_proof_entries, warm_renderer, write_multipage_proof_pdf, write_proof_pdf
+
+JOURNAL_NAME = ".batch_journal.jsonl"
+
+# per worker process: (path, size, mtime) -> SHA-256, so reference photos shared by many jobs
+# are hashed once and then hit the prepared-image cache without being read again
+_file_digests = {}
+_FILE_DIGESTS_MAX = 10000
+
+
+def file_photo_ref(path: str) -> PhotoRef:
+    """PhotoRef for an image file, with its content digest memoized by path, size and mtime."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        digest, _ = hash_file(path)
+        if len(_file_digests) >= _FILE_DIGESTS_MAX:
+            _file_digests.clear()
+        _file_digests[key] = digest
+    return PhotoRef(path, st.st_size, digest)
+
+
+def _split(value, sep, keep_empty=False):
+    """Split a manifest cell on `sep`. keep_empty keeps blank items, for columns matched up by position."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    items = [v.strip() for v in str(value).split(sep)]
+    return items if keep_empty else [v for v in items if v]
+
+
+def read_manifest(path: str):
+    """Yield job dicts (id, images, task, statement, comments) from a CSV or JSONL manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for n, row in enumerate(rows, start=1):
+            images = _split(row.get("images") or row.get("image"), ";")
+            comments = row.get("comments") or []
+            if not isinstance(comments, dict):
+                # "first||third": the second photo has no comment, the third still gets its own
+                comments = {i: c for i, c in enumerate(_split(comments, "|", keep_empty=True)) if c}
+            yield {
+                "id": str(row.get("id") or f"job_{n:06d}"),
+                "images": [os.path.join(base, p) for p in images],
+                "task": row.get("task") or "",
+                "statement": row.get("statement") or "",
+                "comments": comments,
+            }
+
+
+def run_job(job: dict, out_dir: str, image_workers: int = 1, profile: str = None) -> dict:
+    """Render one job to `<out_dir>/<id>.pdf`. Runs in a worker process."""
+    start = time.perf_counter()
+    safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in job["id"])
+    out_path = os.path.join(out_dir, safe_id + ".pdf")
+    tmp_path = out_path + ".part"
+    result = {"id": job["id"], "output": out_path, "ok": False, "error": None, "entries": []}
+    try:
+        if len(job["images"]) == 1 and not job["statement"]:
+            with open(job["images"][0], "rb") as f:
+                data = f.read()
+            entry = write_proof_pdf(tmp_path, data, os.path.basename(job["images"][0]), job["task"], log_path=None,
+                                    profile=profile)
+            result["entries"] = [entry]
+        else:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            photos = [{"ref": file_photo_ref(p), "filename": os.path.basename(p)} for p in job["images"]]
+            write_multipage_proof_pdf(tmp_path, photos, job["statement"] or job["task"],
+                                      photo_comments=job["comments"], workers=image_workers, profile=profile)
+            task = job["task"] or (job["statement"].splitlines() or [""])[0][:200]
+            result["entries"] = [{"timestamp": timestamp, "task": task, "filename": p["filename"]} for p in photos]
+        # publish atomically so a crash never leaves a truncated PDF under the final name
+        os.replace(tmp_path, out_path)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def load_journal(out_dir: str) -> set:
+    """Ids of jobs finished by earlier runs whose PDFs are still present."""
+    done = set()
+    path = os.path.join(out_dir, JOURNAL_NAME)
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if rec.get("ok") and os.path.exists(rec.get("output", "")):
+                done.add(rec["id"])
+    return done
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_batch(manifest_path: str, out_dir: str, workers: int = None, log_path: str = "proof_log.csv",
+              resume: bool = True, flush_every: int = 100, image_workers: int = 1, profile: str = None) -> dict:
+    """Render every job of a manifest. Returns a summary dict with counts and latencies.
+
+    profile: PDF output profile for every job (see pdf_profiles; default SNAPPROOF_PDF_PROFILE)
+    """
+    get_profile(profile)  # fail on an unknown profile before starting workers
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    done = load_journal(out_dir) if resume else set()
+    journal = open(os.path.join(out_dir, JOURNAL_NAME), "a", encoding="utf-8")
+
+    latencies, failed, pending_entries, pending_records = [], [], [], []
+    skipped = 0
+
+    def flush():
+        # log rows first, journal second: a crash in between re-runs the jobs rather than losing their log rows
+        if pending_entries:
+            log_proof_entries(pending_entries, log_path)
+        for rec in pending_records:
+            journal.write(json.dumps(rec) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        pending_entries.clear()
+        pending_records.clear()
+
+    def collect(future):
+        res = future.result()
+        latencies.append(res["seconds"])
+        if res["ok"]:
+            pending_entries.extend(res["entries"])
+        else:
+            failed.append((res["id"], res["error"]))
+        pending_records.append({k: res[k] for k in ("id", "output", "ok", "error", "seconds")})
+        if len(pending_records) >= flush_every:
+            flush()
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_renderer) as pool:
+            in_flight = set()
+            for job in read_manifest(manifest_path):
+                if job["id"] in done:
+                    skipped += 1
+                    continue
+                # bound the number of queued jobs so huge manifests stream through
+                if len(in_flight) >= workers * 4:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        collect(fut)
+                in_flight.add(pool.submit(run_job, job, out_dir, image_workers, profile))
+            for fut in wait(in_flight).done:
+                collect(fut)
+    finally:
+        flush()
+        journal.close()
+    wall = time.perf_counter() - start
+
+    return {
+        "completed": len(latencies) - len(failed),
+        "failed": failed,
+        "skipped": skipped,
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall if wall > 0 else 0.0,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate SnapProof PDFs from a CSV/JSONL manifest")
+    parser.add_argument("manifest")
+    parser.add_argument("-o", "--out", default="batch_output", help="output directory for PDFs")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--log", default="proof_log.csv", help="proof log path")
+    parser.add_argument("--no-resume", action="store_true", help="re-render jobs already in the journal")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                        help="PDF output profile (default: SNAPPROOF_PDF_PROFILE or balanced)")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.manifest, args.out, workers=args.workers, log_path=args.log,
+                        resume=not args.no_resume, profile=args.profile)
+    for job_id, error in summary["failed"]:
+        print(f"FAILED {job_id}: {error}", file=sys.stderr)
+    print(f"completed={summary['completed']} failed={len(summary['failed'])} skipped={summary['skipped']} "
+          f"wall={summary['wall_seconds']:.2f}s throughput={summary['throughput']:.2f} proofs/s")
+    print(f"latency p50={summary['p50']:.3f}s p90={summary['p90']:.3f}s "
+          f"p99={summary['p99']:.3f}s max={summary['max']:.3f}s")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Benchmark suite for the SnapProof PDF generators.
+
+Runs `generate_proof_pdf` and `generate_multipage_proof_pdf` over a matrix of
+photo counts, resolutions, formats and statement lengths, using synthetic
+images made the same way as the smoke tests. The images are generated once
+into a cache directory and each case runs in a fresh subprocess that only
+reads them, so its peak RSS reflects proof generation alone. Wall time, peak
+RSS and output size are written to a JSON file and compared against a
+baseline. Cases with an `env` run with those environment overrides, e.g.
+SNAPPROOF_JPEG_DRAFT=0 to compare full-size JPEG decoding with draft mode.
+`--filter profile=` runs only the output profile comparison (see pdf_profiles)
+and `--filter LONG_STATEMENT` the one-pass statement layout against a
+paragraph per line (see statement_layout). Proofs are always rendered, never
+served from the proof cache.
+
+Usage:
+  python bench_pdf.py                      # quick matrix, compare to bench_baseline.json
+  python bench_pdf.py --matrix full        # 1-200 photos, VGA to 48 MP
+  python bench_pdf.py --save-baseline      # record the current run as the baseline
+  python bench_pdf.py --threshold 0.25     # fail if a case is >25% slower or bigger
+
+Exit status is 1 when any case regresses past the threshold.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "12mp": (4032, 3024),
+    "48mp": (8000, 6000),
+}
+
+MATRICES = {
+    "quick": {
+        "counts": [1, 10],
+        "resolutions": ["vga", "12mp"],
+        "formats": ["JPEG", "PNG"],
+        "lines": [1, 200, 10000],
+        "draft_compare": ["12mp"],
+        "statement_compare": [2000],
+        "profiles": ["fast", "balanced", "smallest"],
+    },
+    "full": {
+        "counts": [1, 10, 60, 200],
+        "resolutions": ["vga", "hd", "12mp", "48mp"],
+        "formats": ["JPEG", "PNG"],
+        "lines": [1, 200, 2000, 10000],
+        "draft_compare": ["12mp", "48mp"],
+        "statement_compare": [2000, 10000],
+        "profiles": ["fast", "balanced", "smallest"],
+    },
+}
+
+
+def case_key(case: dict) -> str:
+    key = f"{case['gen']}/n={case['photos']}/{case['res']}/{case['fmt']}/lines={case['lines']}"
+    if case.get("opts"):
+        key += "/" + ",".join(f"{k}={v}" for k, v in sorted(case["opts"].items()))
+    if case.get("env"):
+        key += "/" + ",".join(f"{k}={v}" for k, v in sorted(case["env"].items()))
+    return key
+
+
+def build_cases(matrix: str) -> list:
+    """One-factor-at-a-time cases around a small base case, so the matrix stays tractable."""
+    m = MATRICES[matrix]
+    base = {"photos": m["counts"][0], "res": "vga", "fmt": "JPEG", "lines": m["lines"][0]}
+    cases = []
+    for res in m["resolutions"]:
+        for fmt in m["formats"]:
+            cases.append(dict(base, gen="single", res=res, fmt=fmt, photos=1))
+    for n in m["counts"]:
+        cases.append(dict(base, gen="multi", photos=n))
+    for res in m["resolutions"]:
+        cases.append(dict(base, gen="multi", photos=5, res=res))
+    for fmt in m["formats"]:
+        cases.append(dict(base, gen="multi", photos=5, res="hd", fmt=fmt))
+    for lines in m["lines"]:
+        cases.append(dict(base, gen="multi", photos=1, lines=lines))
+    # peak RSS of draft-mode JPEG decoding against full-size decoding
+    for res in m.get("draft_compare", []):
+        for env in ({}, {"SNAPPROOF_JPEG_DRAFT": "0"}):
+            cases.append(dict(base, gen="single", res=res, fmt="JPEG", photos=1, env=env))
+            cases.append(dict(base, gen="multi", res=res, fmt="JPEG", photos=5, env=env))
+    # one-pass layout of long statements against a Paragraph per line
+    for lines in m.get("statement_compare", []):
+        for env in ({"SNAPPROOF_LONG_STATEMENT_LINES": "200"}, {"SNAPPROOF_LONG_STATEMENT_LINES": str(lines)}):
+            cases.append(dict(base, gen="multi", photos=3, lines=lines, env=env))
+    # time against size for each PDF output profile, on small and camera-sized JPEGs
+    for profile in m.get("profiles", []):
+        for res in ("vga", "12mp"):
+            cases.append(dict(base, gen="multi", res=res, fmt="JPEG", photos=5, opts={"profile": profile}))
+    unique = {}
+    for case in cases:
+        unique.setdefault(case_key(case), case)
+    return list(unique.values())
+
+
+def make_test_image(size, fmt, color=(220, 100, 100), label="SnapProof Benchmark") -> bytes:
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", size, color=color)
+    draw = ImageDraw.Draw(img)
+    draw.text((20, 20), label, fill=(255, 255, 255))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+IMAGE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "snapproof_bench_images")
+
+
+def case_images(case: dict) -> list:
+    """Paths of the case's synthetic images, generating any that aren't cached yet."""
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    size = RESOLUTIONS[case["res"]]
+    paths = []
+    for i in range(case["photos"]):
+        path = os.path.join(IMAGE_CACHE_DIR, f"{case['res']}_{i}.{case['fmt'].lower()}")
+        if not os.path.exists(path):
+            data = make_test_image(size, case["fmt"], color=(40 + (i * 37) % 200, 100, 150), label=f"Photo {i + 1}")
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+        paths.append(path)
+    return paths
+
+
+def make_statement(lines: int, photos: int) -> str:
+    return "\n".join(f"Line {i + 1}: inspected the area shown in Photo {i % photos + 1}." for i in range(lines))
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_case(case: dict) -> dict:
+    """Run one case in this process and return its measurements."""
+    from utils import generate_multipage_proof_pdf, generate_proof_pdf
+
+    opts = case.get("opts") or {}
+    images = []
+    for path in case["images"]:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    input_bytes = sum(len(b) for b in images)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        if case["gen"] == "single":
+            pdf = generate_proof_pdf(images[0], "bench.jpg", "Benchmark", log_path=os.path.join(tmp, "log.csv"), **opts)
+        else:
+            photos = [{"bytes": b, "filename": f"bench_{i + 1}.jpg"} for i, b in enumerate(images)]
+            pdf = generate_multipage_proof_pdf(photos, make_statement(case["lines"], case["photos"]), cache=False,
+                                               **opts)
+        wall = time.perf_counter() - start
+    return {"wall": wall, "peak_rss_kb": peak_rss_kb(), "output_bytes": len(pdf), "input_bytes": input_bytes}
+
+
+def run_isolated(case: dict, repeat: int) -> dict:
+    """Run a case `repeat` times in fresh subprocesses; keep the fastest wall time and lowest RSS."""
+    results = []
+    case = dict(case, images=case_images(case))
+    env = dict(os.environ, **(case.get("env") or {}))
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case)],
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env)
+        if proc.returncode != 0:
+            raise RuntimeError(f"case {case_key(case)} failed:\n{proc.stderr}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    best = min(results, key=lambda r: r["wall"])
+    rss = [r["peak_rss_kb"] for r in results if r["peak_rss_kb"] is not None]
+    best["peak_rss_kb"] = min(rss) if rss else None
+    return best
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("wall", "peak_rss_kb", "output_bytes"):
+            if cur.get(metric) is None or not base.get(metric):
+                continue
+            ratio = cur[metric] / base[metric]
+            if ratio > 1 + threshold:
+                regressions.append(f"{key}: {metric} {base[metric]:.4g} -> {cur[metric]:.4g} (+{(ratio - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SnapProof PDF generation")
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="quick")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (fastest is kept)")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("SNAPPROOF_BENCH_THRESHOLD", "0.25")),
+                        help="allowed fractional increase before a case counts as a regression")
+    parser.add_argument("--filter", default="", help="only run cases whose key contains this text")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    results = {}
+    for case in build_cases(args.matrix):
+        key = case_key(case)
+        if args.filter not in key:
+            continue
+        res = run_isolated(case, args.repeat)
+        results[key] = res
+        rss = f"{res['peak_rss_kb'] / 1024:.0f} MB" if res["peak_rss_kb"] is not None else "n/a"
+        print(f"{key:<56} {res['wall'] * 1000:9.1f} ms  rss {rss:>8}  out {res['output_bytes'] / 1024:9.1f} KB")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print("REGRESSION", line)
+    if not regressions:
+        print(f"No regressions beyond {args.threshold * 100:.0f}% against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""Image preparation stage for proof PDFs.
+
+Uploaded photos are usually far larger than the box they are drawn in. This
+module decodes a photo, applies its EXIF orientation, resamples it to the
+target DPI for its drawn size and re-encodes it as JPEG, so the PDF only
+carries the pixels it can show. JPEGs that already fit are passed through
+byte-for-byte (pdf_profiles can change that and the encoder settings).
+
+Memory per photo stays bounded: JPEGs are decoded in draft mode at roughly
+the target size, images over a pixel or decode-memory cap are refused before
+decoding (ImageTooLarge), and concurrent decodes share a process-wide budget.
+"""
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from metrics import stage
+
+DEFAULT_DPI = int(os.getenv("SNAPPROOF_IMAGE_DPI", "150"))
+DEFAULT_JPEG_QUALITY = int(os.getenv("SNAPPROOF_JPEG_QUALITY", "85"))
+# 0 means one worker per CPU
+DEFAULT_WORKERS = int(os.getenv("SNAPPROOF_IMAGE_WORKERS", "0"))
+DEFAULT_CACHE_BYTES = int(os.getenv("SNAPPROOF_PREPARED_CACHE_MB", "128")) * 1024 * 1024
+# source images larger than this are refused without decoding them
+DEFAULT_MAX_PIXELS = int(float(os.getenv("SNAPPROOF_MAX_IMAGE_MP", "100")) * 1_000_000)
+# estimated decode memory for one image (after draft reduction)
+DEFAULT_MAX_DECODE_BYTES = int(os.getenv("SNAPPROOF_MAX_DECODE_MB", "512")) * 1024 * 1024
+# decode memory shared by all images being prepared at once in this process
+DEFAULT_DECODE_BUDGET_BYTES = int(os.getenv("SNAPPROOF_DECODE_BUDGET_MB", "768")) * 1024 * 1024
+# set SNAPPROOF_JPEG_DRAFT=0 to always decode JPEGs at full size (for benchmarking)
+USE_JPEG_DRAFT = os.getenv("SNAPPROOF_JPEG_DRAFT", "1").lower() not in ("0", "false", "no")
+
+# EXIF tag holding the camera orientation
+_ORIENTATION = 0x0112
+
+
+class ImageTooLarge(ValueError):
+    """Raised instead of decoding an image over the pixel or decode-memory cap."""
+
+
+class DecodeBudget:
+    """Counting limit on the bytes of decoded pixels held at once across threads."""
+
+    def __init__(self, max_bytes: int = DEFAULT_DECODE_BUDGET_BYTES):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        # an image bigger than the whole budget waits until it can run alone
+        nbytes = min(nbytes, self.max_bytes)
+        with self._cond:
+            while self.in_use + nbytes > self.max_bytes:
+                self._cond.wait()
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+
+decode_budget = DecodeBudget()
+
+
+def check_pixels(width: int, height: int, max_pixels: int = None) -> None:
+    """Raise ImageTooLarge if a width x height image is over the pixel cap."""
+    max_pixels = max_pixels or DEFAULT_MAX_PIXELS
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"{width}x{height} image ({width * height / 1e6:.0f} MP) is over the "
+                            f"{max_pixels / 1e6:.0f} MP limit")
+
+
+def check_image(data: bytes, max_pixels: int = None) -> tuple:
+    """Read only the image header and raise ImageTooLarge if it is over the pixel cap. Returns (width, height)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        check_pixels(*img.size, max_pixels=max_pixels)
+        return img.size
+
+
+@dataclass
+class PreparedImage:
+    """Encoded image data plus the size it should be drawn at (in points)."""
+    data: bytes
+    width: int
+    height: int
+    draw_width: float
+    draw_height: float
+    passthrough: bool = False
+
+
+def fit_size(img_w: float, img_h: float, max_w: float, max_h: float = None) -> tuple:
+    """Scale (img_w, img_h) down to fit max_w x max_h, never up. One pixel is one point."""
+    scale = min(1.0, max_w / img_w)
+    if max_h is not None:
+        scale = min(scale, max_h / img_h)
+    return img_w * scale, img_h * scale
+
+
+def prepare_image(data: bytes, max_width: float, max_height: float = None,
+                  dpi: int = None, jpeg_quality: int = None,
+                  subsampling: int = None, optimize: bool = False, passthrough: str = "fit") -> PreparedImage:
+    """Prepare image bytes for embedding in a box of max_width x max_height points.
+
+    subsampling / optimize: JPEG encoder options (see pdf_profiles.PdfProfile)
+    passthrough: when an upright RGB or greyscale JPEG is embedded untouched:
+    "fit" if it needs no resampling, "always", or "never" (re-encode, keeping
+    the original only if it is smaller).
+
+    Raises ImageTooLarge for images over the caps, and whatever PIL raises for
+    unreadable ones; callers render their own "(Could not embed image)" fallback.
+    """
+    from PIL import Image
+
+    dpi = dpi or DEFAULT_DPI
+    jpeg_quality = jpeg_quality or DEFAULT_JPEG_QUALITY
+
+    img = Image.open(io.BytesIO(data))
+    check_pixels(*img.size)
+    orientation = img.getexif().get(_ORIENTATION, 1)
+    rotated = orientation in (5, 6, 7, 8)
+    if rotated:
+        img_w, img_h = img.height, img.width
+    else:
+        img_w, img_h = img.size
+
+    draw_w, draw_h = fit_size(img_w, img_h, max_width, max_height)
+    target_w = max(1, math.ceil(draw_w / 72.0 * dpi))
+    target_h = max(1, math.ceil(draw_h / 72.0 * dpi))
+    needs_resize = img_w > target_w or img_h > target_h
+
+    embeddable = img.format == "JPEG" and orientation == 1 and img.mode in ("RGB", "L")
+    if embeddable and (passthrough == "always" or (passthrough == "fit" and not needs_resize)):
+        return PreparedImage(data, img_w, img_h, draw_w, draw_h, passthrough=True)
+
+    if needs_resize and USE_JPEG_DRAFT and img.format == "JPEG":
+        # let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, staying at or above the target
+        img.draft(None, (target_h, target_w) if rotated else (target_w, target_h))
+    # the decoded pixels plus one RGBA-sized working copy (EXIF rotation, mode conversion)
+    decode_bytes = img.width * img.height * (len(img.getbands()) + 4)
+    if decode_bytes > DEFAULT_MAX_DECODE_BYTES:
+        raise ImageTooLarge(f"{img.width}x{img.height} image needs about {decode_bytes // (1024 * 1024)} MB "
+                            f"to decode, over the {DEFAULT_MAX_DECODE_BYTES // (1024 * 1024)} MB limit")
+
+    with decode_budget.reserve(decode_bytes):
+        img = _decode_and_scale(img, data, target_w, target_h)
+
+    with stage("image.encode") as s:
+        out = io.BytesIO()
+        options = {"quality": jpeg_quality, "optimize": optimize}
+        if subsampling is not None:
+            options["subsampling"] = subsampling
+        img.save(out, format="JPEG", **options)
+        s.bytes_out = out.tell()
+    if embeddable and not needs_resize and out.tell() >= len(data):
+        return PreparedImage(data, img_w, img_h, draw_w, draw_h, passthrough=True)
+    return PreparedImage(out.getvalue(), img.width, img.height, draw_w, draw_h)
+
+
+def _decode_and_scale(img, data: bytes, target_w: int, target_h: int):
+    """Decode, orient and resample to target_w x target_h, flattening to RGB or L."""
+    from PIL import Image, ImageOps
+
+    with stage("image.decode") as s:
+        s.bytes_in = len(data)
+        img.load()
+    with stage("image.scale"):
+        img = ImageOps.exif_transpose(img)
+        if img.width > target_w or img.height > target_h:
+            img = img.resize((target_w, target_h), Image.LANCZOS)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # flatten transparency onto white, as a printed page would show it
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+    return img
+
+
+class PreparedImageCache:
+    """Thread-safe LRU of PreparedImage results, bounded by the bytes of encoded data.
+
+    Keys combine the content hash of the source image with the target box and
+    encoding settings, so a photo is only re-processed when it or its
+    rendering parameters change (not when comments or the order change).
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            prepared = self._items.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return prepared
+
+    def put(self, key, prepared: PreparedImage) -> None:
+        size = len(prepared.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old.data)
+            self._items[key] = prepared
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted.data)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+
+default_cache = PreparedImageCache()
+
+
+def _digest_of(data, digest: str = None) -> str:
+    if digest:
+        return digest
+    if getattr(data, "sha256", None):
+        return data.sha256
+    if hasattr(data, "read_bytes"):
+        data = data.read_bytes()
+    return hashlib.sha256(data).hexdigest()
+
+
+def _prepare_or_error(data, max_width, max_height, dpi, jpeg_quality, subsampling, optimize, passthrough):
+    try:
+        if hasattr(data, "read_bytes"):
+            # a photo store handle: read it in the worker, so only in-flight photos are in memory
+            data = data.read_bytes()
+        return prepare_image(data, max_width, max_height, dpi=dpi, jpeg_quality=jpeg_quality,
+                             subsampling=subsampling, optimize=optimize, passthrough=passthrough)
+    except Exception as e:
+        return e
+
+
+def prepare_images(images: list, max_width: float, max_height: float = None,
+                   dpi: int = None, jpeg_quality: int = None,
+                   workers: int = None, use_processes: bool = False,
+                   digests: list = None, cache=None,
+                   subsampling: int = None, optimize: bool = False, passthrough: str = "fit") -> list:
+    """Prepare many images in parallel, keeping their order.
+
+    PIL releases the GIL while decoding, resampling and encoding, so a thread
+    pool already spreads the work across cores; use_processes=True switches to
+    a process pool for pure-CPU batch jobs. workers defaults to
+    SNAPPROOF_IMAGE_WORKERS, or one per CPU.
+
+    images may hold bytes or photo store handles (anything with read_bytes()).
+    Results are looked up in `cache` (the module default_cache unless given;
+    pass cache=False to disable) by content hash; `digests` can supply known
+    SHA-256 hex digests per image to skip hashing. Inputs with the same digest
+    are prepared once and share the result. subsampling / optimize /
+    passthrough are passed to prepare_image.
+    Returns a list with a PreparedImage, or the exception raised, per input.
+    """
+    dpi = dpi or DEFAULT_DPI
+    jpeg_quality = jpeg_quality or DEFAULT_JPEG_QUALITY
+    if cache is None:
+        cache = default_cache
+    use_cache = cache is not False
+    args = (max_width, max_height, dpi, jpeg_quality, subsampling, optimize, passthrough)
+
+    results = [None] * len(images)
+    keys = [None] * len(images)
+    todo = []
+    duplicates = {}  # index prepared -> later indices with the same key
+    first_of_key = {}
+    for i, data in enumerate(images):
+        if data is not None and (use_cache or digests):
+            keys[i] = (_digest_of(data, digests[i] if digests else None),) + args
+            if keys[i] in first_of_key:
+                duplicates.setdefault(first_of_key[keys[i]], []).append(i)
+                continue
+            first_of_key[keys[i]] = i
+            if use_cache:
+                results[i] = cache.get(keys[i])
+        if results[i] is None:
+            todo.append(i)
+
+    if workers is None:
+        workers = DEFAULT_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(todo)))
+    if workers == 1:
+        done = [_prepare_or_error(images[i], *args) for i in todo]
+    else:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_cls(max_workers=workers) as pool:
+            futures = [pool.submit(_prepare_or_error, images[i], *args) for i in todo]
+            done = [f.result() for f in futures]
+
+    for i, prepared in zip(todo, done):
+        results[i] = prepared
+        if use_cache and keys[i] is not None and not isinstance(prepared, Exception):
+            cache.put(keys[i], prepared)
+    for i, same in duplicates.items():
+        for j in same:
+            results[j] = results[i]
+    return results
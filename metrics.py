@@ -0,0 +1,271 @@
+"""Opt-in per-stage timing for proof generation.
+
+Code wraps each stage in `with stage("name") as s:` and may set s.bytes_in,
+s.bytes_out and s.photos. While metrics are enabled (SNAPPROOF_METRICS=1 or
+enable()), every stage feeds histograms of its duration, bytes and photo
+count. The histograms can be read with snapshot() (JSON-ready dict) or
+prometheus_text() (Prometheus exposition format). start_http_server() serves
+both for scraping. Callbacks registered with add_callback() receive one
+event dict per finished stage, which is enough to build tracing spans.
+
+With metrics disabled and no callbacks, stage() returns a shared no-op
+object, so instrumented code pays only a function call per stage.
+
+Each process keeps its own registry; batch worker processes are not merged.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2,
+                 64 * 1024 ** 2, 256 * 1024 ** 2)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_enabled = os.getenv("SNAPPROOF_METRICS", "false").lower() in ("1", "true", "yes")
+_callbacks = []
+_server = None
+_server_lock = threading.Lock()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum and count, as Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """[(upper bound, observations <= bound)], ending with ("+Inf", count)."""
+        out, total = [], 0
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+
+# metric name -> (help text, buckets, StageTimer attribute)
+METRICS = {
+    "snapproof_stage_duration_seconds": ("Time spent in each proof generation stage", DURATION_BUCKETS, "seconds"),
+    "snapproof_stage_bytes_in": ("Bytes read by each stage", BYTES_BUCKETS, "bytes_in"),
+    "snapproof_stage_bytes_out": ("Bytes produced by each stage", BYTES_BUCKETS, "bytes_out"),
+    "snapproof_stage_photos": ("Photos handled by each stage", COUNT_BUCKETS, "photos"),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe set of per-stage histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (metric name, stage) -> Histogram
+        self.errors = {}  # stage -> stages that raised
+
+    def record(self, timer: "StageTimer") -> None:
+        with self._lock:
+            for name, (_, buckets, attr) in METRICS.items():
+                value = getattr(timer, attr)
+                if value is None:
+                    continue
+                key = (name, timer.name)
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = Histogram(buckets)
+                hist.observe(value)
+            if timer.error is not None:
+                self.errors[timer.name] = self.errors.get(timer.name, 0) + 1
+
+    def snapshot(self) -> dict:
+        """{stage: {metric: {count, sum, buckets}}, plus 'errors' per stage}."""
+        with self._lock:
+            out = {}
+            for (name, stage_name), hist in sorted(self._histograms.items()):
+                out.setdefault(stage_name, {})[name] = {
+                    "count": hist.count,
+                    "sum": hist.sum,
+                    "buckets": [[str(b), n] for b, n in hist.cumulative()],
+                }
+            for stage_name, n in self.errors.items():
+                out.setdefault(stage_name, {})["errors"] = n
+            return out
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (help_text, _, _) in METRICS.items():
+                series = sorted((s, h) for (n, s), h in self._histograms.items() if n == name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for stage_name, hist in series:
+                    label = _label(stage_name)
+                    for bound, n in hist.cumulative():
+                        lines.append(f'{name}_bucket{{stage="{label}",le="{bound}"}} {n}')
+                    lines.append(f'{name}_sum{{stage="{label}"}} {hist.sum}')
+                    lines.append(f'{name}_count{{stage="{label}"}} {hist.count}')
+            if self.errors:
+                lines.append("# HELP snapproof_stage_errors_total Stages that raised an exception")
+                lines.append("# TYPE snapproof_stage_errors_total counter")
+                for stage_name, n in sorted(self.errors.items()):
+                    lines.append(f'snapproof_stage_errors_total{{stage="{_label(stage_name)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self.errors.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+class StageTimer:
+    """One timed stage. Set bytes_in / bytes_out / photos inside the `with` block."""
+
+    __slots__ = ("name", "labels", "start", "seconds", "bytes_in", "bytes_out", "photos", "error")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.start = None
+        self.seconds = None
+        self.bytes_in = None
+        self.bytes_out = None
+        self.photos = None
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        if _enabled:
+            registry.record(self)
+        if _callbacks:
+            event = {"stage": self.name, "start": self.start, "seconds": self.seconds,
+                     "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "photos": self.photos,
+                     "error": self.error, **self.labels}
+            for callback in list(_callbacks):
+                try:
+                    callback(event)
+                except Exception:
+                    # a broken tracer must never break proof generation
+                    pass
+        return False
+
+
+class _NoopStage:
+    """Stand-in for StageTimer while nothing is listening."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name: str, **labels):
+    """Context manager timing one stage; a no-op unless metrics are enabled or a callback is set."""
+    if not _enabled and not _callbacks:
+        return _NOOP
+    return StageTimer(name, labels)
+
+
+def enable(on: bool = True) -> None:
+    """Turn histogram recording on (or off) for this process."""
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def add_callback(callback) -> None:
+    """Call `callback(event)` after every stage. event has stage, start (perf_counter),
+    seconds, bytes_in, bytes_out, photos, error and any labels passed to stage()."""
+    _callbacks.append(callback)
+
+
+def remove_callback(callback) -> None:
+    try:
+        _callbacks.remove(callback)
+    except ValueError:
+        pass
+
+
+def snapshot() -> dict:
+    return registry.snapshot()
+
+
+def prometheus_text() -> str:
+    return registry.prometheus_text()
+
+
+def start_http_server(port: int = None, host: str = "127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread, and enable recording.
+
+    port defaults to SNAPPROOF_METRICS_PORT or 9464. Returns the server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics.json":
+                body, ctype = json.dumps(snapshot()).encode("utf-8"), "application/json"
+            elif self.path.split("?")[0] == "/metrics":
+                body, ctype = prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    enable()
+    port = int(os.getenv("SNAPPROOF_METRICS_PORT", "9464")) if port is None else port
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="snapproof-metrics", daemon=True).start()
+    return server
+
+
+def serve_from_env():
+    """Start the metrics server once per process if SNAPPROOF_METRICS_PORT is set. Returns it, or None."""
+    global _server
+    port = os.getenv("SNAPPROOF_METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = start_http_server(int(port))
+        return _server
@@ -0,0 +1,93 @@
+"""Shared image XObjects for prepared JPEG data.
+
+reportlab names each image XObject by an MD5 of its fully decoded RGB pixels,
+so every embedded photo is decoded once more just to be named. Here the
+content key of the prepared image is the name. Identical photos in one
+document then share a single XObject, and the JPEG bytes go into the PDF
+as-is (DCTDecode) without being decoded.
+
+Imports reportlab at module level; import it lazily from the PDF writers.
+"""
+import hashlib
+import io
+
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
+from reportlab.pdfbase.pdfutils import asciiBase85Encode, readJPEGInfo
+from reportlab.platypus.flowables import Flowable
+
+
+def xobject_key(digest: str, *params) -> str:
+    """Name for the XObject of a source digest prepared with `params` (box, dpi, quality)."""
+    return hashlib.sha256(repr((digest,) + params).encode("utf-8")).hexdigest()[:32]
+
+
+def draw_jpeg(canvas, data: bytes, key: str, x: float, y: float, width: float, height: float,
+              ascii85: bool = False) -> None:
+    """Draw JPEG bytes at (x, y), registering one XObject per key per document.
+
+    Mirrors what Canvas.drawImage does for a new image, without decoding it.
+    The JPEG is stored as a binary DCT stream, or ASCII85-encoded (a quarter
+    larger, 7-bit clean) with ascii85=True, whatever rl_config.useA85 says.
+    (PDFImageXObject.loadImageFromJPEG is not used: it ASCII85-encodes the
+    whole JPEG whenever rl_config.useA85 is set.)
+    Raises ValueError if `data` is not a JPEG.
+    """
+    name = "SnapProofImg" + key
+    doc = canvas._doc
+    reg_name = doc.getXObjectName(name)
+    if doc.idToObject.get(reg_name) is None:
+        xobj = PDFImageXObject(name)
+        try:
+            xobj.width, xobj.height, components, _ = readJPEGInfo(io.BytesIO(data))
+        except Exception:
+            raise ValueError("prepared image is not a JPEG") from None
+        xobj.bitsPerComponent = 8
+        xobj.colorSpace = {1: "DeviceGray", 3: "DeviceRGB"}.get(components, "DeviceCMYK")
+        if xobj.colorSpace == "DeviceCMYK":
+            xobj._dotrans = 1  # Adobe CMYK JPEGs are stored inverted
+        xobj.mask = None
+        if ascii85:
+            xobj.streamContent = asciiBase85Encode(data)
+            xobj._filters = ("ASCII85Decode", "DCTDecode")
+        else:
+            xobj.streamContent = data
+            xobj._filters = ("DCTDecode",)
+        xobj.name = name
+        canvas._setXObjects(xobj)
+        doc.Reference(xobj, reg_name)
+        doc.addForm(name, xobj)
+    canvas._currentPageHasImages = 1
+    canvas.saveState()
+    try:
+        canvas.translate(x, y)
+        canvas.scale(width, height)
+        canvas._code.append(f"/{reg_name} Do")
+    finally:
+        canvas.restoreState()
+    canvas._formsinuse.append(name)
+
+
+class SharedImage(Flowable):
+    """Platypus flowable for a PreparedImage, centred like platypus.Image."""
+
+    def __init__(self, prepared, key: str, hAlign: str = "CENTER", ascii85: bool = False):
+        super().__init__()
+        self.data = prepared.data
+        self.key = key
+        self.ascii85 = ascii85
+        self.drawWidth = prepared.draw_width
+        self.drawHeight = prepared.draw_height
+        self.hAlign = hAlign
+        self.failed = False  # set when drawing fell back to a note
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        # draw_jpeg works on reportlab internals; if they change, lose the photo rather than the document
+        try:
+            draw_jpeg(self.canv, self.data, self.key, 0, 0, self.drawWidth, self.drawHeight, ascii85=self.ascii85)
+        except Exception:
+            self.failed = True
+            self.canv.setFont("Helvetica", 10)
+            self.canv.drawString(0, self.drawHeight - 10, "(Could not embed image)")
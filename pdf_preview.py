@@ -0,0 +1,168 @@
+"""Small per-page JPEG previews of a generated proof PDF.
+
+The app shows these instead of inlining the whole PDF as a base64 data URL,
+so a preview costs a few tens of KB per page shown rather than the size of
+the document, on every rerun. Pages are rasterized on demand and cached next
+to the PDF (in `<pdf>.preview/`); the cache is dropped when the PDF changes.
+
+Rasterizing needs PyMuPDF (in requirements.txt) or poppler's `pdftoppm` on
+PATH. Without either, PdfPreview raises PreviewUnavailable.
+"""
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+PREVIEW_WIDTH = int(os.getenv("SNAPPROOF_PREVIEW_WIDTH", "600"))
+PREVIEW_PAGES = int(os.getenv("SNAPPROOF_PREVIEW_PAGES", "3"))
+PREVIEW_JPEG_QUALITY = 70
+
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_XREF_SECTION_RE = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n")
+_ROOT_RE = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PAGES_RE = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+_lock = threading.Lock()
+
+
+class PreviewUnavailable(RuntimeError):
+    """No PDF rasterizer is installed."""
+
+
+def _object(pdf, xref: int, num: int) -> bytes:
+    """The body of object `num`, found through the classic cross-reference table at offset `xref`."""
+    pos = xref + len(b"xref")
+    while True:
+        m = _XREF_SECTION_RE.match(pdf, pos)
+        if m is None:
+            raise ValueError(f"object {num} is not in the cross-reference table")
+        first, count = int(m.group(1)), int(m.group(2))
+        if first <= num < first + count:
+            # fixed-width entries: 10-digit offset, 5-digit generation, type, 2-byte end of line
+            entry = m.end() + 20 * (num - first)
+            start = int(pdf[entry:entry + 10])
+            return pdf[start:pdf.find(b"endobj", start)]
+        pos = m.end() + 20 * count
+
+
+def count_pages(pdf_path: str) -> int:
+    """Pages in a PDF written by reportlab: the /Count of the page tree root.
+
+    Follows startxref, the trailer's /Root and the catalog's /Pages, so text that happens to read
+    "/Type /Page" in an uncompressed content stream is never counted.
+    """
+    with open(pdf_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                xref = int(_STARTXREF_RE.findall(mm[-1024:])[-1])
+                if mm[xref:xref + 4] != b"xref":
+                    raise ValueError("no cross-reference table")
+                root = int(_ROOT_RE.search(mm, xref).group(1))
+                pages = int(_PAGES_RE.search(_object(mm, xref, root)).group(1))
+                return int(_COUNT_RE.search(_object(mm, xref, pages)).group(1))
+            except (IndexError, AttributeError, ValueError) as e:
+                raise ValueError(f"cannot read the page tree of {pdf_path}: {e}") from None
+
+
+def _import_pymupdf():
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # PyMuPDF before 1.24
+    return pymupdf
+
+
+def _render_pymupdf(pdf_path: str, pages: list, width: int) -> list:
+    pymupdf = _import_pymupdf()
+    out = []
+    with pymupdf.open(pdf_path) as doc:
+        for n in pages:
+            page = doc[n]
+            zoom = width / page.rect.width
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom))
+            out.append(pix.tobytes("jpeg", jpg_quality=PREVIEW_JPEG_QUALITY))
+    return out
+
+
+def _render_pdftoppm(pdf_path: str, pages: list, width: int) -> list:
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in pages:
+            prefix = os.path.join(tmp, "page")
+            subprocess.run(["pdftoppm", "-jpeg", "-jpegopt", f"quality={PREVIEW_JPEG_QUALITY}",
+                            "-f", str(n + 1), "-l", str(n + 1), "-scale-to-x", str(width), "-scale-to-y", "-1",
+                            "-singlefile", pdf_path, prefix], check=True, capture_output=True)
+            with open(prefix + ".jpg", "rb") as f:
+                out.append(f.read())
+    return out
+
+
+def find_renderer():
+    """The first available rasterizer, as render(pdf_path, page_indexes, width) -> [JPEG bytes], or None."""
+    try:
+        _import_pymupdf()
+        return _render_pymupdf
+    except ImportError:
+        pass
+    if shutil.which("pdftoppm"):
+        return _render_pdftoppm
+    return None
+
+
+class PdfPreview:
+    """Cached page previews of one PDF file.
+
+    renderer: render(pdf_path, page_indexes, width) -> [JPEG bytes]; defaults to
+    find_renderer(). Raises PreviewUnavailable if there is none.
+    """
+
+    def __init__(self, pdf_path: str, width: int = PREVIEW_WIDTH, renderer=None):
+        self.pdf_path = pdf_path
+        self.width = width
+        self.renderer = renderer or find_renderer()
+        if self.renderer is None:
+            raise PreviewUnavailable("install PyMuPDF (pip install pymupdf) or poppler-utils to preview PDFs")
+        self.cache_dir = pdf_path + ".preview"
+        st = os.stat(pdf_path)
+        self.stamp = f"{st.st_size}-{st.st_mtime_ns}"
+        self._page_count = None
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            self._page_count = count_pages(self.pdf_path)
+        return self._page_count
+
+    def _page_path(self, n: int) -> str:
+        return os.path.join(self.cache_dir, f"page-{n + 1:04d}-{self.width}.jpg")
+
+    def _check_cache(self) -> None:
+        """Drop previews of an earlier version of the PDF."""
+        stamp_path = os.path.join(self.cache_dir, "stamp")
+        try:
+            with open(stamp_path, encoding="utf-8") as f:
+                if f.read() == self.stamp:
+                    return
+        except OSError:
+            pass
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(stamp_path, "w", encoding="utf-8") as f:
+            f.write(self.stamp)
+
+    def pages(self, first: int = 0, count: int = PREVIEW_PAGES) -> list:
+        """Paths of JPEG previews for pages first .. first+count-1 (0-based), rendering the missing ones."""
+        indexes = list(range(max(0, first), min(first + count, self.page_count)))
+        with _lock:
+            self._check_cache()
+            missing = [n for n in indexes if not os.path.exists(self._page_path(n))]
+            if missing:
+                for n, data in zip(missing, self.renderer(self.pdf_path, missing, self.width)):
+                    tmp = self._page_path(n) + ".part"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, self._page_path(n))
+        return [self._page_path(n) for n in indexes]
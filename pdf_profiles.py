@@ -0,0 +1,62 @@
+"""Named output profiles trading PDF generation time against file size.
+
+A profile sets how page streams are compressed and how photos are encoded:
+
+  fast      no page-stream compression; JPEGs in upright RGB/greyscale are
+            embedded as they are, even when larger than needed, so most
+            photos are never decoded
+  balanced  compressed pages; photos are resampled to the target DPI and
+            re-encoded at SNAPPROOF_JPEG_QUALITY, JPEGs that already fit
+            pass through (the default)
+  smallest  compressed pages; every photo is re-encoded at quality 70 with
+            4:2:0 chroma subsampling and optimised Huffman tables, keeping
+            the original only when that is smaller
+
+No profile ASCII85-encodes photos (reportlab's default, which makes each one
+a quarter larger to keep the file 7-bit clean); set ascii85 on a custom
+PdfProfile if a transport needs that.
+
+The default comes from SNAPPROOF_PDF_PROFILE. `python bench_pdf.py --filter
+profile=` measures the time and size of each.
+"""
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PdfProfile:
+    name: str
+    page_compression: bool
+    jpeg_quality: int = None  # None: SNAPPROOF_JPEG_QUALITY
+    subsampling: int = None  # PIL's JPEG subsampling (0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0); None: PIL's default
+    optimize: bool = False  # optimised Huffman tables: a few % smaller, slower to encode
+    passthrough: str = "fit"  # embed JPEGs untouched: "fit" (when no resampling is needed), "always" or "never"
+    ascii85: bool = False
+
+    def image_params(self) -> tuple:
+        """The settings that change prepared image bytes, for cache and XObject keys."""
+        return (self.subsampling, self.optimize, self.passthrough)
+
+
+PROFILES = {
+    "fast": PdfProfile("fast", page_compression=False, passthrough="always"),
+    "balanced": PdfProfile("balanced", page_compression=True),
+    "smallest": PdfProfile("smallest", page_compression=True, jpeg_quality=70, subsampling=2, optimize=True,
+                           passthrough="never"),
+}
+
+DEFAULT_PROFILE = os.getenv("SNAPPROOF_PDF_PROFILE", "balanced")
+
+
+def get_profile(profile=None) -> PdfProfile:
+    """Resolve a profile name (or None for SNAPPROOF_PDF_PROFILE) to a PdfProfile; profiles pass through.
+
+    Raises ValueError for unknown names.
+    """
+    if isinstance(profile, PdfProfile):
+        return profile
+    name = (profile or DEFAULT_PROFILE).lower()
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown PDF profile {name!r}; choose from {', '.join(PROFILES)}") from None
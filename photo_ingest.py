@@ -0,0 +1,168 @@
+"""Background ingest of uploaded and captured photos for the Streamlit app.
+
+Streamlit hands the app every file in the uploader (and the last camera
+capture) again on each rerun. IngestQueue remembers each upload by its
+widget file id and by content hash, so a photo is added to the session once.
+New photos are checked on a shared worker pool: the header against the
+pixel caps, then a full decode (which also fills the thumbnail cache), EXIF
+orientation and size. Valid photos are spooled to the session's PhotoStore
+and prepared for the proof in the background, so generation starts from
+cached, ready-to-embed images; unreadable or oversized files are rejected
+with a message as soon as they are uploaded.
+
+The worker never touches Streamlit state: the app calls drain() on its own
+rerun to collect finished photos, in upload order.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from image_prep import ImageTooLarge, check_image
+from photo_store import QuotaExceeded
+from thumbnails import content_hash, get_thumbnail
+
+INGEST_WORKERS = int(os.getenv("SNAPPROOF_INGEST_WORKERS", "2"))
+
+_ORIENTATION = 0x0112
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    """One pool for every session in the server process, so uploads can't start unbounded threads."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="snapproof-ingest")
+        return _executor
+
+
+def upload_id(upload):
+    """Streamlit's id for an UploadedFile (camera captures included), or None on versions without one."""
+    return getattr(upload, "file_id", None) or getattr(upload, "id", None)
+
+
+def oriented_size(data: bytes) -> tuple:
+    """(width, height) of an image as displayed, after its EXIF orientation."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    width, height = img.size
+    if img.getexif().get(_ORIENTATION, 1) in (5, 6, 7, 8):
+        width, height = height, width
+    return width, height
+
+
+def ingest_photo(store, data: bytes, filename: str, timestamp: str, digest: str = None,
+                 prepare: bool = True, generation: int = None, profile=None) -> dict:
+    """Validate, decode and spool one photo; return its session photo dict.
+
+    Raises ValueError with a message for the user when the photo can't be used
+    (unreadable, over the image caps, or over the session quota).
+    prepare: also prepare it for a multi-page proof with output `profile`, filling
+    image_prep's cache.
+    generation: the store's generation at submit time (see PhotoStore.put).
+    """
+    digest = digest or content_hash(data)
+    try:
+        check_image(data)
+        # decodes the whole image (in draft mode), which catches truncated or corrupt files
+        get_thumbnail(data, digest=digest)
+        width, height = oriented_size(data)
+    except ImageTooLarge as e:
+        raise ValueError(f"{filename} was not added: {e}") from None
+    except Exception:
+        raise ValueError(f"{filename} was not added: it is not a readable PNG or JPEG image") from None
+    try:
+        ref = store.put(data, sha256=digest, generation=generation)
+    except QuotaExceeded as e:
+        raise ValueError(str(e)) from None
+    photo = {"ref": ref, "sha256": digest, "filename": filename, "timestamp": timestamp, "comment": "",
+             "width": width, "height": height}
+    if prepare:
+        from utils import prepare_proof_photos
+
+        # best effort: generation prepares anything missing from the cache itself
+        prepare_proof_photos([photo], workers=1, profile=profile)
+    return photo
+
+
+class IngestQueue:
+    """One session's uploads in flight. Not thread-safe; use it from the session's script thread.
+
+    profile: output profile photos are prepared for; set it to the one the proof will use.
+    """
+
+    def __init__(self, store, prepare: bool = True, executor=None, profile=None):
+        self.store = store
+        self.prepare = prepare
+        self.profile = profile
+        self.executor = executor or _shared_executor()
+        self._seen_ids = set()
+        self._digests = set()  # photos in the session or on their way in
+        self._pending = []  # (filename, digest, future), in upload order
+
+    def seen(self, file_id) -> bool:
+        """True if the upload with this widget file id was already submitted."""
+        return file_id is not None and file_id in self._seen_ids
+
+    def submit(self, data: bytes, filename: str, timestamp: str, file_id=None) -> bool:
+        """Queue a photo unless this upload or identical content is already in the session."""
+        if self.seen(file_id):
+            return False
+        if file_id is not None:
+            self._seen_ids.add(file_id)
+        digest = content_hash(data)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        future = self.executor.submit(ingest_photo, self.store, data, filename, timestamp, digest, self.prepare,
+                                      self.store.generation, self.profile)
+        self._pending.append((filename, digest, future))
+        return True
+
+    def close(self) -> None:
+        """Give up on the photos in flight, before the session's store is cleared.
+
+        Queued ones are cancelled; ones already running are refused by the store
+        once it has been cleared, so nothing is left behind against the quota.
+        The queue stays usable. It still remembers the uploads it has seen, so the
+        files left in the uploader after a reset are not added again.
+        """
+        for _, _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        self._digests.clear()
+
+    def discard(self, digest: str) -> None:
+        """Forget a photo removed from the session, so the same content can be added again."""
+        self._digests.discard(digest)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait up to `timeout` seconds for queued photos. Returns True when none are still running."""
+        if self._pending:
+            wait([f for _, _, f in self._pending], timeout=timeout)
+        return all(f.done() for _, _, f in self._pending)
+
+    def drain(self) -> tuple:
+        """([photo dicts ready to add], [rejection messages]) of the photos finished so far.
+
+        Photos come out in upload order: a slow photo holds back the ones after it.
+        """
+        ready, rejected = [], []
+        while self._pending and self._pending[0][2].done():
+            filename, digest, future = self._pending.pop(0)
+            try:
+                ready.append(future.result())
+            except ValueError as e:
+                self._digests.discard(digest)
+                rejected.append(str(e))
+            except Exception as e:
+                self._digests.discard(digest)
+                rejected.append(f"{filename} was not added: {e}")
+        return ready, rejected
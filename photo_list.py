@@ -0,0 +1,54 @@
+"""Paging and reordering helpers for the session photo list in app.py.
+
+The app renders one page of photos per rerun, so these work on global indices
+into the session's photo list. A reorder coming from the drag-and-drop UI only
+permutes the visible page; moves by position can cross pages.
+"""
+import os
+import uuid
+
+DEFAULT_PAGE_SIZE = int(os.getenv("SNAPPROOF_PHOTOS_PER_PAGE", "12"))
+
+
+def page_count(total: int, page_size: int = DEFAULT_PAGE_SIZE) -> int:
+    return max(1, -(-total // page_size))
+
+
+def page_bounds(total: int, page: int, page_size: int = DEFAULT_PAGE_SIZE) -> tuple:
+    """(start, stop, page) for 0-based `page`, clamped to the pages that exist."""
+    page = min(max(0, page), page_count(total, page_size) - 1)
+    start = page * page_size
+    return start, min(start + page_size, total), page
+
+
+def page_of(index: int, page_size: int = DEFAULT_PAGE_SIZE) -> int:
+    return index // page_size
+
+
+def ensure_ids(photos: list) -> None:
+    """Give every photo a stable id, used to key its widgets across reorders."""
+    for p in photos:
+        if not p.get("id"):
+            p["id"] = uuid.uuid4().hex
+
+
+def apply_page_order(photos: list, start: int, order: list) -> bool:
+    """Reorder the page beginning at `start` in place.
+
+    order: the page's global indices in their new order (from the drag UI).
+    Returns False, leaving `photos` untouched, unless `order` is a permutation
+    of that page's indices.
+    """
+    stop = start + len(order)
+    if stop > len(photos) or sorted(order) != list(range(start, stop)):
+        return False
+    photos[start:stop] = [photos[i] for i in order]
+    return True
+
+
+def move_photo(photos: list, src: int, dst: int) -> bool:
+    """Move the photo at `src` to position `dst` (both global, 0-based). Returns False if nothing moved."""
+    if src == dst or not (0 <= src < len(photos)) or not (0 <= dst < len(photos)):
+        return False
+    photos.insert(dst, photos.pop(src))
+    return True
@@ -0,0 +1,166 @@
+"""Disk-backed photo store for Streamlit sessions.
+
+Session state only keeps small photo metadata plus a `PhotoRef` handle; the
+image bytes live in a per-session spool directory and are read back from
+there when needed. Each session has a byte quota, and directories of sessions
+that have gone quiet are swept after a TTL.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_ROOT = os.getenv("SNAPPROOF_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "snapproof", "sessions")
+DEFAULT_QUOTA_BYTES = int(os.getenv("SNAPPROOF_SESSION_QUOTA_MB", "500")) * 1024 * 1024
+DEFAULT_TTL_SECONDS = float(os.getenv("SNAPPROOF_SESSION_TTL_HOURS", "24")) * 3600
+
+
+class QuotaExceeded(Exception):
+    """Raised when adding a photo would take a session over its quota."""
+
+
+class SessionCleared(Exception):
+    """Raised when a photo is stored for a session that was cleared after it was submitted."""
+
+
+class PhotoRef:
+    """Handle to one stored photo. Cheap to keep in session state and to pickle."""
+
+    __slots__ = ("path", "size", "sha256")
+
+    def __init__(self, path: str, size: int, sha256: str = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def __getstate__(self):
+        return (self.path, self.size, self.sha256)
+
+    def __setstate__(self, state):
+        self.path, self.size, self.sha256 = state
+
+    def __repr__(self):
+        return f"PhotoRef({self.path!r}, size={self.size})"
+
+
+def load_photo_bytes(photo) -> bytes:
+    """Image bytes of a session photo dict holding either 'bytes' or a store 'ref'."""
+    if isinstance(photo, PhotoRef):
+        return photo.read_bytes()
+    if photo.get("bytes") is not None:
+        return photo["bytes"]
+    return photo["ref"].read_bytes()
+
+
+class PhotoStore:
+    """Spool directory for one session's photos."""
+
+    def __init__(self, session_id: str, root: str = None, quota_bytes: int = None):
+        self.session_id = session_id
+        self.root = root or DEFAULT_ROOT
+        self.quota_bytes = DEFAULT_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.dir = os.path.join(self.root, session_id)
+        self.generation = 0  # bumped whenever the session's files are dropped
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+        self._usage = sum(e.stat().st_size for e in os.scandir(self.dir) if e.is_file())
+
+    def usage(self) -> int:
+        """Bytes currently stored for this session."""
+        return self._usage
+
+    def put(self, data: bytes, sha256: str = None, suffix: str = ".img", generation: int = None) -> PhotoRef:
+        """Store photo bytes and return a handle to them.
+
+        generation: the store's `generation` when the photo was submitted; if the
+        session has been cleared since, the photo is refused with SessionCleared.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                raise SessionCleared("the session was reset while this photo was being added")
+            if self._usage + len(data) > self.quota_bytes:
+                raise QuotaExceeded(
+                    f"Session photo quota of {self.quota_bytes // (1024 * 1024)} MB reached; "
+                    "remove some photos or reset the session")
+            path = os.path.join(self.dir, uuid.uuid4().hex + suffix)
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._usage += len(data)
+        self.touch()
+        return PhotoRef(path, len(data), sha256)
+
+    def delete(self, ref: PhotoRef) -> None:
+        with self._lock:
+            try:
+                os.remove(ref.path)
+                self._usage -= ref.size
+            except FileNotFoundError:
+                pass
+
+    def path_for(self, name: str) -> str:
+        """Path for another per-session file (e.g. the generated PDF), cleaned up with the session."""
+        os.makedirs(self.dir, exist_ok=True)
+        return os.path.join(self.dir, name)
+
+    def touch(self) -> bool:
+        """Mark the session as active so the expiry sweep leaves it alone.
+
+        Returns False if the sweep already removed the session (it sat idle past
+        the TTL): its directory is recreated empty and earlier PhotoRefs are gone.
+        """
+        try:
+            os.utime(self.dir)
+            return True
+        except FileNotFoundError:
+            with self._lock:
+                os.makedirs(self.dir, exist_ok=True)
+                self._usage = 0
+                self.generation += 1
+            return False
+
+    def clear(self) -> None:
+        """Delete every file of this session (used by "Reset session")."""
+        with self._lock:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir, exist_ok=True)
+            self._usage = 0
+            self.generation += 1
+
+
+_last_sweep = 0.0
+
+
+def sweep_expired(root: str = None, max_age: float = None, min_interval: float = 600.0) -> int:
+    """Remove session directories untouched for `max_age` seconds.
+
+    Runs at most once per `min_interval` seconds per process, so it is cheap to
+    call on every Streamlit rerun. Returns the number of sessions removed.
+    """
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep < min_interval:
+        return 0
+    _last_sweep = now
+    root = root or DEFAULT_ROOT
+    max_age = DEFAULT_TTL_SECONDS if max_age is None else max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir() and now - entry.stat().st_mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
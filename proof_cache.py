@@ -0,0 +1,145 @@
+"""Cache of finished multi-page proof PDFs.
+
+A proof is keyed by a digest of everything that goes into it: the photo
+hashes in order, their filenames, timestamps and comments, the statement,
+and the image and output settings. Generating the same proof again (a second
+click on "Generate", or a batch job resubmitted unchanged) returns the stored
+PDF without any layout or image work. Multi-page proofs are written in
+reportlab's invariant mode (fixed creation date and document ID), so a cached
+PDF is byte-identical to a fresh render.
+
+Entries live in an in-memory LRU bounded by SNAPPROOF_PROOF_CACHE_MB
+(default 64). With SNAPPROOF_PROOF_CACHE_DIR set, they are also written to
+that directory, which is shared by worker processes and survives restarts;
+it is trimmed to SNAPPROOF_PROOF_CACHE_DISK_MB (default 1024), least
+recently used first.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_BYTES = int(os.getenv("SNAPPROOF_PROOF_CACHE_MB", "64")) * 1024 * 1024
+DEFAULT_CACHE_DIR = os.getenv("SNAPPROOF_PROOF_CACHE_DIR") or None
+DEFAULT_DISK_BYTES = int(os.getenv("SNAPPROOF_PROOF_CACHE_DISK_MB", "1024")) * 1024 * 1024
+# bump when the proof layout changes, so stored PDFs from older code are not served
+LAYOUT_VERSION = 2
+
+
+def proof_key(**parts) -> str:
+    """Hex SHA-256 of a proof's inputs; `parts` must be JSON-serializable."""
+    raw = json.dumps({"layout": LAYOUT_VERSION, **parts}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ProofCache:
+    """Thread-safe LRU of proof PDFs, bounded by `max_bytes`, with an optional on-disk tier.
+
+    directory: where PDFs are also stored (None: memory only), up to `max_disk_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, directory: str = DEFAULT_CACHE_DIR,
+                 max_disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pdf")
+
+    def accepts(self, size: int) -> bool:
+        """True if a PDF of `size` bytes would be stored in either tier."""
+        return size <= self.max_bytes or (self.directory is not None and size <= self.max_disk_bytes)
+
+    def get(self, key: str) -> bytes:
+        """The cached PDF for `key`, or None."""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                # mtime orders the disk tier for trimming
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.directory and len(data) <= self.max_disk_bytes:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._trim_disk()
+            except OSError:
+                # the disk tier is best effort
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._items[key] = data
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def _trim_disk(self) -> None:
+        entries = []
+        for e in os.scandir(self.directory):
+            if e.name.endswith(".pdf"):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue  # removed by another process
+                entries.append((st.st_mtime_ns, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self) -> None:
+        """Empty the memory tier (the disk tier is left to its size limit)."""
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+
+default_cache = ProofCache()
@@ -0,0 +1,193 @@
+"""Append-only writer for the local proof log (`proof_log.csv`).
+
+Rows are appended in O(1) under an exclusive file lock, so several Streamlit
+sessions (or worker processes) can log at the same time without losing rows.
+The file keeps the `timestamp,task,filename` CSV layout that pandas used to
+write, so existing logs can be appended to as-is.
+"""
+import csv
+import io
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOG_FIELDS = ("timestamp", "task", "filename")
+# log paths with these suffixes are SQLite stores (see proof_log_db)
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ProofLogWriter:
+    """Append rows to a CSV proof log.
+
+    fsync_every: fsync after this many rows (1 = every row, 0 = only on close)
+    fsync_interval: also fsync when this many seconds passed since the last one
+    """
+
+    def __init__(self, path: str = "proof_log.csv", fields=LOG_FIELDS,
+                 fsync_every: int = 1, fsync_interval: float = None):
+        self.path = path
+        self.fields = tuple(fields)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        # flock is per open file, so threads sharing this writer need their own lock
+        self._thread_lock = threading.Lock()
+
+    def _encode(self, entries) -> bytes:
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        for entry in entries:
+            writer.writerow(["" if entry.get(k) is None else entry.get(k) for k in self.fields])
+        return buf.getvalue().encode("utf-8")
+
+    def append(self, entry: dict) -> None:
+        """Append a single log entry (dict with keys timestamp, task, filename)."""
+        self.append_many([entry])
+
+    def append_many(self, entries) -> int:
+        """Append several entries with one lock/write. Returns the number of rows written."""
+        entries = list(entries)
+        if not entries:
+            return 0
+        data = self._encode(entries)
+        with self._thread_lock:
+            if self._file is None:
+                self._file = open(self.path, "ab+")
+            f = self._file
+            _lock(f)
+            try:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    f.write(self._encode([dict(zip(self.fields, self.fields))]))
+                else:
+                    # tolerate a log whose last row was written without a newline
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(data)
+                f.flush()
+                self._pending += len(entries)
+                if self._sync_due():
+                    os.fsync(f.fileno())
+                    self._pending = 0
+                    self._last_sync = time.monotonic()
+            finally:
+                _unlock(f)
+        return len(entries)
+
+    def drain(self) -> list:
+        """Read every logged entry and truncate the file, under the lock.
+
+        Used to replay spill files: rows appended by other writers either land
+        before the drain (and are returned) or after it (and stay in the file).
+        """
+        with self._thread_lock:
+            if self._file is None:
+                if not os.path.exists(self.path):
+                    return []
+                self._file = open(self.path, "ab+")
+            f = self._file
+            _lock(f)
+            try:
+                f.seek(0)
+                data = f.read().decode("utf-8")
+                f.truncate(0)
+                f.flush()
+            finally:
+                _unlock(f)
+        rows = list(csv.reader(io.StringIO(data)))
+        if rows and tuple(rows[0]) == self.fields:
+            rows = rows[1:]
+        return [dict(zip(self.fields, r)) for r in rows if r]
+
+    def _sync_due(self) -> bool:
+        if self.fsync_every and self._pending >= self.fsync_every:
+            return True
+        if self.fsync_interval is not None and time.monotonic() - self._last_sync >= self.fsync_interval:
+            return True
+        return False
+
+    def sync(self) -> None:
+        """Force any rows written since the last fsync to disk."""
+        with self._thread_lock:
+            if self._file is not None and self._pending:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+                self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.sync()
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def is_sqlite_path(path) -> bool:
+    """True if `path` names a SQLite proof log rather than a CSV one."""
+    return str(path).lower().endswith(SQLITE_SUFFIXES)
+
+
+def get_log_writer(path: str = "proof_log.csv") -> ProofLogWriter:
+    """Return a process-wide writer for `path`, creating it on first use.
+
+    A `.db` / `.sqlite` path returns a proof_log_db.ProofLogStore instead, which
+    has the same append interface. The CSV fsync batch size can be tuned with
+    the PROOF_LOG_FSYNC_EVERY env var.
+    """
+    if is_sqlite_path(path):
+        from proof_log_db import get_log_store
+        return get_log_store(path)
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            fsync_every = int(os.getenv("PROOF_LOG_FSYNC_EVERY", "1"))
+            writer = ProofLogWriter(path, fsync_every=fsync_every)
+            _writers[key] = writer
+        return writer
+
+
+def append_log_entry(entry: dict, log_path: str = "proof_log.csv") -> None:
+    """Append one entry to the log at `log_path` (CSV, or SQLite for a .db path)."""
+    get_log_writer(log_path).append(entry)
+
+
+def append_log_entries(entries, log_path: str = "proof_log.csv") -> int:
+    """Append several entries to the log at `log_path` in one locked write (or transaction)."""
+    return get_log_writer(log_path).append_many(entries)
@@ -0,0 +1,207 @@
+"""SQLite-backed proof log with indexed queries.
+
+A drop-in alternative to the CSV log: pass a `.db` / `.sqlite` path as
+`log_path` (to generate_proof_pdf, batch.py --log, ...) and entries go here
+instead. The database runs in WAL mode, so several processes can append while
+others read, and timestamp, task and filename are indexed for the query API.
+
+Existing CSV logs can be imported once:
+
+  python proof_log_db.py import proof_log.csv proof_log.db
+"""
+import csv
+import os
+import sqlite3
+import sys
+import threading
+
+from proof_log import LOG_FIELDS
+
+DEFAULT_PAGE_SIZE = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proofs (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    task TEXT NOT NULL DEFAULT '',
+    filename TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS proofs_timestamp ON proofs (timestamp);
+CREATE INDEX IF NOT EXISTS proofs_task ON proofs (task, timestamp);
+CREATE INDEX IF NOT EXISTS proofs_filename ON proofs (filename);
+CREATE TABLE IF NOT EXISTS csv_imports (
+    source TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+
+class ProofLogStore:
+    """Proof log entries in a SQLite database.
+
+    Has the same append/append_many/close interface as proof_log.ProofLogWriter,
+    plus query, count and import_csv. Safe to share between threads.
+    busy_timeout: seconds to wait for another process's write lock
+    """
+
+    def __init__(self, path: str = "proof_log.db", busy_timeout: float = 30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._conn = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use (and again after close). Call with the lock held."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps committed rows safe from crashes at this level; a power loss may drop the last few
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def append(self, entry: dict) -> None:
+        """Append a single log entry (dict with keys timestamp, task, filename)."""
+        self.append_many([entry])
+
+    def append_many(self, entries) -> int:
+        """Append several entries in one transaction. Returns the number of rows written."""
+        rows = [tuple("" if e.get(k) is None else str(e.get(k)) for k in LOG_FIELDS) for e in entries]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT INTO proofs (timestamp, task, filename) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    @staticmethod
+    def _where(task=None, filename=None, since=None, until=None, search=None):
+        clauses, params = [], []
+        if task is not None:
+            clauses.append("task = ?")
+            params.append(task)
+        if filename is not None:
+            clauses.append("filename = ?")
+            params.append(filename)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(str(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(str(until))
+        if search:
+            # substring match can't use the indexes; combine it with a time range on big logs
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(task LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, task: str = None, filename: str = None, since=None, until=None, search: str = None,
+              limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> list:
+        """Return matching entries, newest first, as dicts with id, timestamp, task and filename.
+
+        task / filename: exact matches; search: case-insensitive substring of either
+        since / until: timestamp range, since inclusive and until exclusive
+        ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS")
+        limit / offset: the page to return
+        """
+        where, params = self._where(task, filename, since, until, search)
+        sql = f"SELECT id, timestamp, task, filename FROM proofs{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._connect().execute(sql, params + [int(limit), int(offset)]).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, task: str = None, filename: str = None, since=None, until=None, search: str = None) -> int:
+        """Number of entries matching the same filters as query."""
+        where, params = self._where(task, filename, since, until, search)
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM proofs{where}", params).fetchone()[0]
+
+    def has_filename(self, filename: str) -> bool:
+        """True if a proof for `filename` has been logged before."""
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM proofs WHERE filename = ? LIMIT 1", (filename,)).fetchone() is not None
+
+    def import_csv(self, csv_path: str, force: bool = False) -> int:
+        """Import every row of a CSV proof log in one transaction. Returns the number of rows imported.
+
+        A CSV that was already imported is skipped (returns 0) unless force=True.
+        """
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if rows and tuple(rows[0]) == LOG_FIELDS:
+            rows = rows[1:]
+        rows = [tuple((r + ["", "", ""])[:3]) for r in rows if r]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if not force and self._imported(csv_path):
+                    return 0
+                conn.executemany("INSERT INTO proofs (timestamp, task, filename) VALUES (?, ?, ?)", rows)
+                conn.execute("INSERT OR REPLACE INTO csv_imports (source, rows) VALUES (?, ?)",
+                             (os.path.abspath(csv_path), len(rows)))
+        return len(rows)
+
+    def _imported(self, csv_path: str) -> bool:
+        return self._connect().execute("SELECT 1 FROM csv_imports WHERE source = ?",
+                                       (os.path.abspath(csv_path),)).fetchone() is not None
+
+    def was_imported(self, csv_path: str) -> bool:
+        """True if the CSV log at `csv_path` has already been imported."""
+        with self._lock:
+            return self._imported(csv_path)
+
+    def sync(self) -> None:
+        """Rows are committed as they are appended; kept for ProofLogWriter compatibility."""
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_log_store(path: str = "proof_log.db") -> ProofLogStore:
+    """Return a process-wide store for `path`, opening it on first use."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ProofLogStore(path)
+            _stores[key] = store
+        return store
+
+
+def main(argv=None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) not in (3, 4) or args[0] != "import" or (len(args) == 4 and args[3] != "--force"):
+        print("usage: python proof_log_db.py import LOG.csv LOG.db [--force]", file=sys.stderr)
+        return 2
+    force = len(args) == 4
+    with ProofLogStore(args[2]) as store:
+        if not force and store.was_imported(args[1]):
+            print(f"{args[1]} was already imported into {args[2]} (use --force to import it again)")
+            return 0
+        imported = store.import_csv(args[1], force=force)
+    print(f"imported {imported} row(s) into {args[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Photo digest manifests embedded in proof PDFs, and a verify command.
+
+Each proof carries the SHA-256, size and filename of every photo in its
+document info (Keywords), as `snapproof-manifest-v1:` followed by base64 of
+zlib-compressed JSON. The encoding sticks to characters that need no PDF
+string escaping, so verify can find the manifest with a plain byte search of
+the file. It does not parse the PDF or decode any image. Candidate photos are
+hashed in chunks, so large files are never read into memory whole.
+
+Usage:
+  python proof_manifest.py proof.pdf photo1.jpg photo2.jpg [--complete]
+
+Exits 0 if every candidate photo is in the proof's manifest (and, with
+--complete, every photo in the manifest was given), 1 otherwise.
+"""
+import base64
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import zlib
+
+MANIFEST_PREFIX = b"snapproof-manifest-v1:"
+HASH_CHUNK_SIZE = 1024 * 1024
+_MANIFEST_RE = re.compile(re.escape(MANIFEST_PREFIX) + rb"([A-Za-z0-9_=-]+)")
+
+
+def hash_stream(f, chunk_size: int = HASH_CHUNK_SIZE) -> tuple:
+    """Return (hex SHA-256, size) of a binary file object, read in chunks."""
+    h = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+        size += len(chunk)
+    return h.hexdigest(), size
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> tuple:
+    """Return (hex SHA-256, size) of the file at `path`."""
+    with open(path, "rb") as f:
+        return hash_stream(f, chunk_size)
+
+
+def photo_digest(p: dict) -> tuple:
+    """(hex SHA-256, size) of a session photo dict holding 'bytes' or a store 'ref'.
+
+    Uses the 'sha256' recorded when the photo was added when there is one.
+    """
+    data = p.get("bytes")
+    ref = p.get("ref")
+    if data is not None:
+        size = len(data)
+    elif ref is not None:
+        size = ref.size
+    else:
+        return None, 0
+    digest = p.get("sha256") or getattr(ref, "sha256", None)
+    if digest:
+        return digest, size
+    if data is not None:
+        return hashlib.sha256(data).hexdigest(), size
+    return hash_file(ref.path)
+
+
+def build_manifest(photos: list, digests: list = None) -> dict:
+    """Manifest of the photos going into a proof, in document order.
+
+    photos: session photo dicts (see photo_digest)
+    digests: (sha256, size) per photo when already computed
+    """
+    digests = digests or [photo_digest(p) for p in photos]
+    return {"v": 1, "alg": "sha256",
+            "photos": [[p.get("filename", ""), size, digest] for p, (digest, size) in zip(photos, digests)]}
+
+
+def encode_manifest(manifest: dict) -> str:
+    """Manifest as the string stored in the PDF's Keywords."""
+    raw = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    return (MANIFEST_PREFIX + base64.urlsafe_b64encode(zlib.compress(raw, 9))).decode("ascii")
+
+
+def decode_manifest(token: bytes) -> dict:
+    return json.loads(zlib.decompress(base64.urlsafe_b64decode(token)).decode("utf-8"))
+
+
+def read_manifest(pdf_path: str) -> dict:
+    """Find and decode the manifest embedded in a proof PDF. Returns None if it has none."""
+    with open(pdf_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # the document info is written last, so the final match wins over any copy in page content
+            start = mm.rfind(MANIFEST_PREFIX)
+            if start < 0:
+                return None
+            m = _MANIFEST_RE.match(mm, start)
+            return decode_manifest(m.group(1)) if m else None
+
+
+def verify(pdf_path: str, image_paths: list) -> dict:
+    """Check candidate photo files against a proof's manifest.
+
+    Returns a dict with 'matched' [(path, photo number, manifest filename)],
+    'unknown' [paths not in the proof] and 'missing' [(photo number, filename)
+    of manifest photos no candidate matched]. Raises ValueError if the PDF has
+    no manifest.
+    """
+    manifest = read_manifest(pdf_path)
+    if manifest is None:
+        raise ValueError(f"{pdf_path} has no SnapProof photo manifest")
+    by_key = {}
+    for n, (filename, size, digest) in enumerate(manifest["photos"], start=1):
+        by_key.setdefault((digest, size), []).append((n, filename))
+    matched, unknown, seen = [], [], set()
+    for path in image_paths:
+        hits = by_key.get(hash_file(path))
+        if hits:
+            matched += [(path, n, filename) for n, filename in hits]
+            seen.update(n for n, _ in hits)
+        else:
+            unknown.append(path)
+    missing = [(n, f) for n, (f, _, _) in enumerate(manifest["photos"], start=1) if n not in seen]
+    return {"matched": matched, "unknown": unknown, "missing": missing}
+
+
+def main(argv=None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    complete = "--complete" in args
+    args = [a for a in args if a != "--complete"]
+    if len(args) < 2:
+        print("usage: python proof_manifest.py PROOF.pdf PHOTO [PHOTO ...] [--complete]", file=sys.stderr)
+        return 2
+    try:
+        result = verify(args[0], args[1:])
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for path, n, filename in result["matched"]:
+        print(f"OK       {path} = photo {n} ({filename})")
+    for path in result["unknown"]:
+        print(f"UNKNOWN  {path} is not in this proof")
+    if complete:
+        for n, filename in result["missing"]:
+            print(f"MISSING  photo {n} ({filename})")
+    ok = not result["unknown"] and not (complete and result["missing"])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
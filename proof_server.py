@@ -0,0 +1,436 @@
+"""Async HTTP service for proof generation.
+
+A small HTTP/1.1 server on asyncio (standard library only) for mobile clients
+and other services. PDFs are rendered in a process pool: at most `workers`
+run at once, and at most `max_queue` more wait for a slot. Anything beyond
+that is answered at once with 429 and a Retry-After header, before the upload
+is read. The upload is streamed to a per-request temporary directory and
+split into its photos there, off the event loop; the finished PDF is written
+next to them and streamed back in chunks.
+
+Endpoints:
+
+  POST /proof      multipart form: photo (file), task         -> application/pdf
+  POST /multipage  multipart form: photos (files, in order), statement,
+                   comment (repeated, one per photo, optional) -> application/pdf
+                   Both take an optional `profile` field: fast, balanced or smallest.
+  GET  /healthz    JSON with running / queued counts and limits
+  GET  /metrics    Prometheus text from metrics.py (SNAPPROOF_METRICS=1 to record)
+
+Usage:
+  python proof_server.py [--host 127.0.0.1] [--port 8080] [-w 4] [--queue 16] [--log proof_log.csv]
+  python proof_server.py loadtest photo.jpg [--url http://127.0.0.1:8080/proof] [-n 200] [-c 16]
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from email import policy
+from email.parser import BytesParser
+
+import metrics
+from pdf_profiles import get_profile
+from photo_store import PhotoRef
+from utils import (PDF_CHUNK_SIZE, iter_file_chunks, log_proof_entries, warm_renderer, write_multipage_proof_pdf,
+                   write_proof_pdf)
+
+DEFAULT_MAX_BODY_BYTES = int(os.getenv("SNAPPROOF_SERVER_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+HEADER_TIMEOUT = 30.0
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    """An error answered with `status` and a short plain-text message."""
+
+    def __init__(self, status: int, message: str = None, headers: dict = None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+        self.headers = headers or {}
+
+
+def parse_multipart(content_type: str, path: str, out_dir: str) -> tuple:
+    """Split the multipart/form-data body spooled at `path`.
+
+    Returns ({field: [values]}, [(field, filename, path, size)]). File parts are copied from a memory
+    map of the body to numbered files in `out_dir`, so an upload is never held in memory whole.
+    """
+    header = BytesParser(policy=policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n", headersonly=True)
+    boundary = header.get_param("boundary")
+    if header.get_content_type() != "multipart/form-data":
+        raise HTTPError(400, "expected multipart/form-data")
+    if not boundary or os.path.getsize(path) == 0:
+        raise HTTPError(400, "malformed multipart body")
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    fields, files = {}, []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+        # the first boundary has no CRLF before it when the body starts with it
+        pos = body.find(delimiter[2:])
+        if pos < 0:
+            raise HTTPError(400, "malformed multipart body")
+        pos += len(delimiter) - 2
+        while body[pos:pos + 2] != b"--":
+            head_end = body.find(b"\r\n\r\n", pos)
+            end = body.find(delimiter, head_end + 4) if head_end >= 0 else -1
+            if end < 0:
+                raise HTTPError(400, "malformed multipart body")
+            part = BytesParser(policy=policy.HTTP).parsebytes(body[pos + 2:head_end + 4], headersonly=True)
+            name = part.get_param("name", header="content-disposition")
+            filename = part.get_filename()
+            start = head_end + 4
+            if filename is not None:
+                out = os.path.join(out_dir, f"{len(files):04d}.img")
+                with open(out, "wb") as dst:
+                    for i in range(start, end, PDF_CHUNK_SIZE):
+                        dst.write(body[i:min(i + PDF_CHUNK_SIZE, end)])
+                files.append((name, os.path.basename(filename), out, end - start))
+            elif name:
+                fields.setdefault(name, []).append(body[start:end].decode(part.get_content_charset() or "utf-8"))
+            pos = end + len(delimiter)
+    return fields, files
+
+
+def _content_length(headers: dict) -> int:
+    """Declared body size of a request, or 0 if it has none (or none we can trust)."""
+    try:
+        return max(0, int(headers.get("content-length", "0")))
+    except ValueError:
+        return 0
+
+
+def encode_multipart(fields: dict, files: list) -> tuple:
+    """Build a multipart/form-data body. Returns (content type, body bytes).
+
+    fields: {name: value or [values]}; files: [(field, filename, bytes)]
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, values in fields.items():
+        for value in values if isinstance(values, list) else [values]:
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode("utf-8")
+                         + str(value).encode("utf-8") + b"\r\n")
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode("utf-8") + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("ascii"))
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+def render_job(job: dict) -> str:
+    """Render one request's PDF into its spool directory and log it. Runs in a worker process."""
+    out_path = os.path.join(job["dir"], "proof.pdf")
+    if job["kind"] == "proof":
+        photo = job["photos"][0]
+        with open(photo["path"], "rb") as f:
+            data = f.read()
+        write_proof_pdf(out_path, data, photo["filename"], job["task"], log_path=job["log_path"],
+                        profile=job["profile"])
+    else:
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        photos = [{"ref": PhotoRef(p["path"], p["size"]), "filename": p["filename"]} for p in job["photos"]]
+        write_multipage_proof_pdf(out_path, photos, job["statement"], photo_comments=job["comments"],
+                                  workers=1, profile=job["profile"])
+        if job["log_path"] is not None:
+            task = (job["statement"].splitlines() or [""])[0][:200]
+            log_proof_entries([{"timestamp": timestamp, "task": task, "filename": p["filename"]} for p in photos],
+                              job["log_path"])
+    return out_path
+
+
+class ProofService:
+    """Admission control plus the HTTP handler.
+
+    workers: PDFs rendered at once (worker processes; default one per CPU)
+    max_queue: requests allowed to wait for a worker before 429s are returned
+    log_path: proof log for generated proofs (None disables logging)
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = 16, log_path: str = "proof_log.csv",
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, spool_dir: str = None, executor=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.log_path = log_path
+        self.max_body_bytes = max_body_bytes
+        self.spool_dir = spool_dir or os.path.join(tempfile.gettempdir(), "snapproof", "server")
+        # spawned, not forked: the pool starts workers on demand, and a forked one would inherit (and hold
+        # open) the sockets of connections accepted so far, so clients would never see the response end
+        self.executor = executor or ProcessPoolExecutor(max_workers=self.workers, initializer=warm_renderer,
+                                                        mp_context=multiprocessing.get_context("spawn"))
+        self.admitted = 0  # running + waiting
+        self.running = 0
+        self.rejected = 0
+        self._slots = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080):
+        """Start listening; returns the asyncio server."""
+        self._slots = asyncio.Semaphore(self.workers)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle(self, reader, writer) -> None:
+        body = {"unread": 0}
+        try:
+            try:
+                method, path, headers = await asyncio.wait_for(self._read_head(reader), HEADER_TIMEOUT)
+                # body bytes the client will still send; none until we answer Expect: 100-continue
+                body = {"unread": 0 if headers.get("expect", "").lower() == "100-continue"
+                        else _content_length(headers)}
+                await self._route(method, path, headers, body, reader, writer)
+            except HTTPError as e:
+                await self._send_text(writer, e.status, str(e), e.headers)
+                if body["unread"]:
+                    await self._discard_rest(reader, writer, body["unread"])
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                pass
+            except Exception as e:
+                await self._send_text(writer, 500, f"{type(e).__name__}: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _discard_rest(reader, writer, unread: int) -> None:
+        """Read and drop the `unread` bytes of an upload we answered early, so closing doesn't reset
+        the connection before the client sees our answer."""
+        try:
+            writer.write_eof()
+            await asyncio.wait_for(ProofService._drain(reader, unread), 5)
+        except (asyncio.TimeoutError, OSError):
+            pass
+
+    @staticmethod
+    async def _drain(reader, unread: int) -> None:
+        while unread > 0:
+            chunk = await reader.read(min(unread, PDF_CHUNK_SIZE))
+            if not chunk:
+                break
+            unread -= len(chunk)
+
+    async def _read_head(self, reader) -> tuple:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "bad request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return parts[0].upper(), parts[1].split("?", 1)[0], headers
+
+    async def _route(self, method, path, headers, body, reader, writer) -> None:
+        if path == "/healthz":
+            body = {"running": self.running, "queued": self.admitted - self.running, "rejected": self.rejected,
+                    "workers": self.workers, "max_queue": self.max_queue}
+            await self._send(writer, 200, json.dumps(body).encode("utf-8"), "application/json")
+        elif path == "/metrics":
+            await self._send(writer, 200, metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        elif path in ("/proof", "/multipage"):
+            if method != "POST":
+                raise HTTPError(405, headers={"Allow": "POST"})
+            await self._generate(path.strip("/"), headers, body, reader, writer)
+        else:
+            raise HTTPError(404)
+
+    async def _generate(self, kind, headers, body, reader, writer) -> None:
+        # backpressure: refuse before reading the upload, so an overloaded host spends nothing on it
+        if self.admitted >= self.capacity:
+            self.rejected += 1
+            raise HTTPError(429, "server busy, retry later", {"Retry-After": "1"})
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "send a Content-Length")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            raise HTTPError(411, "send a Content-Length")
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"upload larger than {self.max_body_bytes // (1024 * 1024)} MB")
+
+        self.admitted += 1
+        job_dir = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        os.makedirs(job_dir)
+        try:
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+                body["unread"] = length
+            body_path = os.path.join(job_dir, "body")
+            await self._receive(reader, body_path, body)
+            fields, files = await asyncio.to_thread(parse_multipart, headers.get("content-type", ""), body_path,
+                                                    job_dir)
+            os.remove(body_path)
+            photos = [f for f in files if f[0] in ("photo", "photos")]
+            if not photos or (kind == "proof" and len(photos) != 1):
+                raise HTTPError(400, "upload one 'photo'" if kind == "proof" else "upload one or more 'photos'")
+            statement = "\n".join(fields.get("statement", []))
+            if kind == "multipage" and not statement.strip():
+                raise HTTPError(400, "a 'statement' is required")
+            profile = (fields.get("profile") or [None])[0]
+            try:
+                get_profile(profile)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            job = {
+                "kind": kind,
+                "dir": job_dir,
+                "photos": [{"path": path, "size": size, "filename": filename or f"photo_{i + 1}.jpg"}
+                           for i, (_, filename, path, size) in enumerate(photos)],
+                "task": (fields.get("task") or [""])[0],
+                "statement": statement,
+                "comments": dict(enumerate(fields.get("comment", []))),
+                "log_path": self.log_path,
+                "profile": profile,
+            }
+            with metrics.stage("server.queue_wait"):
+                await self._slots.acquire()
+            self.running += 1
+            try:
+                with metrics.stage("server.render") as s:
+                    s.photos = len(photos)
+                    pdf_path = await asyncio.get_running_loop().run_in_executor(self.executor, render_job, job)
+            finally:
+                self.running -= 1
+                self._slots.release()
+            await self._send_file(writer, pdf_path)
+        finally:
+            self.admitted -= 1
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    @staticmethod
+    async def _receive(reader, path: str, body: dict) -> None:
+        """Spool the unread request body to `path` as it arrives."""
+        with open(path, "wb") as f:
+            while body["unread"]:
+                chunk = await reader.read(min(body["unread"], PDF_CHUNK_SIZE))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", body["unread"])
+                f.write(chunk)
+                body["unread"] -= len(chunk)
+
+    async def _send_file(self, writer, path: str) -> None:
+        size = os.path.getsize(path)
+        writer.write(self._head(200, {"Content-Type": "application/pdf", "Content-Length": str(size),
+                                      "Content-Disposition": 'attachment; filename="proof.pdf"'}))
+        with open(path, "rb") as f:
+            for chunk in iter_file_chunks(f, PDF_CHUNK_SIZE):
+                writer.write(chunk)
+                # wait for slow clients instead of buffering the whole PDF in memory
+                await writer.drain()
+
+    async def _send_text(self, writer, status: int, message: str, headers: dict = None) -> None:
+        await self._send(writer, status, (message + "\n").encode("utf-8"), "text/plain; charset=utf-8", headers)
+
+    async def _send(self, writer, status: int, body: bytes, content_type: str, headers: dict = None) -> None:
+        head = {"Content-Type": content_type, "Content-Length": str(len(body)), **(headers or {})}
+        writer.write(self._head(status, head) + body)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: int, headers: dict) -> bytes:
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{k}: {v}" for k, v in {**headers, "Connection": "close"}.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def serve(host: str, port: int, **kwargs) -> None:
+    service = ProofService(**kwargs)
+    server = await service.start(host, port)
+    print(f"SnapProof proof service on http://{host}:{port} "
+          f"(workers={service.workers}, queue={service.max_queue})", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def load_test(url: str, photo_path: str, requests: int = 200, concurrency: int = 16) -> dict:
+    """Fire `requests` single-photo proof requests with `concurrency` clients. Returns status counts and latencies."""
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import urlsplit
+
+    from batch import percentile
+
+    target = urlsplit(url)
+    with open(photo_path, "rb") as f:
+        content_type, body = encode_multipart({"task": "Load test"},
+                                              [("photo", os.path.basename(photo_path), f.read())])
+
+    def one(_):
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+        try:
+            conn.request("POST", target.path or "/proof", body=body, headers={"Content-Type": content_type})
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            status = "error"
+        finally:
+            conn.close()
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [seconds for status, seconds in results if status == 200]
+    return {"statuses": statuses, "wall_seconds": wall, "throughput": len(ok) / wall if wall > 0 else 0.0,
+            "p50": percentile(ok, 50), "p90": percentile(ok, 90), "p99": percentile(ok, 99)}
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "loadtest":
+        parser = argparse.ArgumentParser(prog="proof_server.py loadtest", description="Load-test a running proof service")
+        parser.add_argument("photo")
+        parser.add_argument("--url", default="http://127.0.0.1:8080/proof")
+        parser.add_argument("-n", "--requests", type=int, default=200)
+        parser.add_argument("-c", "--concurrency", type=int, default=16)
+        args = parser.parse_args(argv[1:])
+        summary = load_test(args.url, args.photo, args.requests, args.concurrency)
+        print(f"statuses={summary['statuses']} wall={summary['wall_seconds']:.2f}s "
+              f"throughput={summary['throughput']:.2f} proofs/s")
+        print(f"latency p50={summary['p50']:.3f}s p90={summary['p90']:.3f}s p99={summary['p99']:.3f}s")
+        return 0
+
+    parser = argparse.ArgumentParser(description="Serve SnapProof proof generation over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="render processes (default: one per CPU)")
+    parser.add_argument("--queue", type=int, default=16, help="requests that may wait for a worker before 429s")
+    parser.add_argument("--log", default="proof_log.csv", help="proof log path ('' to disable)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, max_queue=args.queue,
+                          log_path=args.log or None))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
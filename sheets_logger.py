@@ -0,0 +1,227 @@
+"""Long-lived Google Sheets logging client.
+
+A `SheetsLogger` authorizes once, keeps the worksheet handle, and appends rows
+from a background thread with `append_rows`, flushing when `batch_size` rows
+are queued or `flush_interval` seconds have passed. Failed batches are retried
+with exponential backoff and, if they still fail, spilled to a local CSV that
+is replayed ahead of the next successful batch.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from proof_log import ProofLogWriter
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+def _require_gspread():
+    try:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+    except Exception as e:
+        raise RuntimeError("gspread and oauth2client are required for Google Sheets logging") from e
+    return gspread, ServiceAccountCredentials
+
+
+def entry_to_row(entry: dict) -> list:
+    return [entry.get("timestamp", ""), entry.get("task", ""), entry.get("filename", "")]
+
+
+class SheetsLogger:
+    """Batched, background appender for one worksheet.
+
+    Pass `worksheet` to use an existing handle (or a fake in tests); otherwise
+    it is opened from the service-account credentials on first use.
+    """
+
+    def __init__(self, sheet_id: str = None, sheet_name: str = "Sheet1", creds_path: str = None,
+                 worksheet=None, batch_size: int = 50, flush_interval: float = 2.0,
+                 max_retries: int = 4, backoff: float = 0.5, max_backoff: float = 30.0,
+                 spill_path: str = None):
+        if worksheet is None:
+            if creds_path is None:
+                creds_path = os.getenv("GOOGLE_CREDENTIALS", "credentials.json")
+            if sheet_id is None:
+                sheet_id = os.getenv("GOOGLE_SHEETS_ID")
+            if not sheet_id:
+                raise ValueError("Google Sheets ID not provided. Set GOOGLE_SHEETS_ID env var or pass sheet_id")
+            # fail at construction, not in the background thread, so callers can fall back to CSV
+            _require_gspread()
+        if spill_path is None:
+            spill_path = os.getenv("SHEETS_SPILL_PATH", "sheets_spill.csv")
+        self.sheet_id = sheet_id
+        self.sheet_name = sheet_name
+        self.creds_path = creds_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.spill = ProofLogWriter(spill_path)
+        self._worksheet = worksheet
+        self._owns_worksheet = worksheet is None
+        self._open_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._sleep = time.sleep
+
+    # -- worksheet handle -------------------------------------------------
+
+    def get_worksheet(self):
+        """Return the cached worksheet, authorizing and opening it on first use."""
+        with self._open_lock:
+            if self._worksheet is None:
+                gspread, ServiceAccountCredentials = _require_gspread()
+                creds = ServiceAccountCredentials.from_json_keyfile_name(self.creds_path, SCOPE)
+                gc = gspread.authorize(creds)
+                sh = gc.open_by_key(self.sheet_id)
+                try:
+                    self._worksheet = sh.worksheet(self.sheet_name)
+                except Exception:
+                    self._worksheet = sh.add_worksheet(title=self.sheet_name, rows="1000", cols="10")
+            return self._worksheet
+
+    # -- synchronous path -------------------------------------------------
+
+    def append_now(self, entries: list) -> bool:
+        """Append entries immediately with retries. Returns True on success, raises on failure."""
+        rows = [entry_to_row(e) for e in entries]
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.get_worksheet().append_rows(rows, value_input_option="USER_ENTERED")
+                return True
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                self._sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def replay_spill(self) -> int:
+        """Send rows spilled by earlier failures. Returns the number replayed."""
+        entries = self.spill.drain()
+        if not entries:
+            return 0
+        try:
+            self.append_now(entries)
+        except Exception:
+            self.spill.append_many(entries)
+            raise
+        return len(entries)
+
+    # -- background path --------------------------------------------------
+
+    def log(self, entry: dict) -> None:
+        """Queue an entry for the background writer and return immediately."""
+        self._ensure_thread()
+        self._queue.put(entry)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until everything queued so far has been sent or spilled."""
+        if self._thread is None:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        with self._thread_lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+        self.spill.close()
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sheets-logger", daemon=True)
+                self._thread.start()
+
+    def _send_batch(self, batch: list) -> None:
+        try:
+            self.replay_spill()
+            self.append_now(batch)
+        except Exception:
+            # drop the cached handle so the next batch re-authorizes
+            if self._owns_worksheet:
+                with self._open_lock:
+                    self._worksheet = None
+            self.spill.append_many(batch)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                self._send_batch(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_sheets_logger(sheet_id: str = None, sheet_name: str = "Sheet1", creds_path: str = None) -> SheetsLogger:
+    """Return the shared logger for a sheet, creating it on first use.
+
+    Batching can be tuned with the SHEETS_BATCH_SIZE and SHEETS_FLUSH_INTERVAL env vars.
+    """
+    if creds_path is None:
+        creds_path = os.getenv("GOOGLE_CREDENTIALS", "credentials.json")
+    if sheet_id is None:
+        sheet_id = os.getenv("GOOGLE_SHEETS_ID")
+    key = (sheet_id, sheet_name, creds_path)
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None:
+            logger = SheetsLogger(sheet_id, sheet_name, creds_path,
+                                  batch_size=int(os.getenv("SHEETS_BATCH_SIZE", "50")),
+                                  flush_interval=float(os.getenv("SHEETS_FLUSH_INTERVAL", "2.0")))
+            _loggers[key] = logger
+        return logger
+
+
+@atexit.register
+def _close_loggers():
+    for logger in list(_loggers.values()):
+        try:
+            logger.close()
+        except Exception:
+            pass
@@ -0,0 +1,162 @@
+"""One-pass layout for long statements in multi-page proofs.
+
+As one platypus Paragraph per line, every statement line pays for markup
+parsing, a width lookup per word and its own frame placement, and each page
+end re-wraps what is left. Dictated statements run to thousands of lines.
+StatementFlowable lays the whole statement out in one pass instead:
+
+- each line is tokenized once, resolving "Photo N" references as it goes;
+- words are measured through a width cache, since dictation repeats a small
+  vocabulary;
+- lines are broken greedily;
+- a page split is a bisect over the precomputed line positions, so the
+  pieces share one layout.
+
+The statement is drawn as plain text (no inline markup) with one text
+object per page. References to photos that exist become links. Dangling
+ones, such as "Photo 99" in a 3-photo proof, stay plain text and are listed
+in `dangling`.
+
+Imports reportlab at module level; import it lazily from the PDF writers.
+"""
+import bisect
+import re
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus.flowables import Flowable
+
+from utils import PHOTO_REF_RE
+
+# a photo reference, or a run of other non-space characters up to the next one
+_TOKEN_RE = re.compile(rf"{PHOTO_REF_RE.pattern}|(?:(?!{PHOTO_REF_RE.pattern})\S)+", flags=re.IGNORECASE)
+
+_widths = {}  # (word, font, size) -> width in points
+_WIDTHS_MAX = 200000
+
+
+def word_width(word: str, font: str, size: float) -> float:
+    key = (word, font, size)
+    w = _widths.get(key)
+    if w is None:
+        if len(_widths) >= _WIDTHS_MAX:
+            _widths.clear()
+        w = _widths[key] = stringWidth(word, font, size)
+    return w
+
+
+def layout_statement(lines: list, width: float, font: str, size: float, leading: float, line_gap: float,
+                     photo_count: int) -> tuple:
+    """Break statement lines to `width`.
+
+    Returns (rows, tops, height, dangling): rows are (text, [(x, width, anchor)])
+    per output line, tops their distance from the top of the statement.
+    Each statement line is followed by `line_gap` points (a blank one is only
+    that gap); height ends at the bottom of the last row, without a gap.
+    """
+    space = word_width(" ", font, size)
+    rows, tops, dangling = [], [], []
+    y = 0.0
+    for line in lines:
+        pieces, links, x, end = [], [], 0.0, None
+        for m in _TOKEN_RE.finditer(line):
+            if m.group(2):
+                word = f"{m.group(1)} {m.group(2)}"
+                n = int(m.group(2))
+                anchor = f"photo_{n}" if 1 <= n <= photo_count else None
+                if anchor is None:
+                    dangling.append(word)
+            else:
+                word, anchor = m.group(0), None
+            w = word_width(word, font, size)
+            gap = space if pieces and m.start() > end else 0.0
+            if pieces and x + gap + w > width:
+                rows.append(("".join(pieces), links))
+                tops.append(y)
+                y += leading
+                pieces, links, x, gap = [], [], 0.0, 0.0
+            if gap:
+                pieces.append(" ")
+                x += gap
+            if anchor is not None:
+                links.append((x, w, anchor))
+            pieces.append(word)
+            x += w
+            end = m.end()
+        if pieces:
+            rows.append(("".join(pieces), links))
+            tops.append(y)
+            y += leading
+        y += line_gap
+    return rows, tops, (tops[-1] + leading if rows else 0.0), dangling
+
+
+class StatementFlowable(Flowable):
+    """Statement text laid out once and split across pages without re-wrapping.
+
+    lines: statement lines; style: a ParagraphStyle for the font, size and
+    leading; photo_count: photos in the proof, for resolving references.
+    """
+
+    def __init__(self, lines: list, style, photo_count: int, line_gap: float = 6, _layout=None, _span=None):
+        super().__init__()
+        self.lines = lines
+        self.style = style
+        self.photo_count = photo_count
+        self.line_gap = line_gap
+        self._layout = _layout  # (width, rows, tops, total height, dangling), shared by split pieces
+        self._span = _span  # (first row, end row, top of first row) of this piece
+
+    @property
+    def dangling(self) -> list:
+        """References to photos the proof doesn't have, in statement order (after the first wrap)."""
+        return self._layout[4] if self._layout else []
+
+    def _rows(self, width: float):
+        if self._layout is None:
+            s = self.style
+            rows, tops, height, dangling = layout_statement(self.lines, width, s.fontName, s.fontSize, s.leading,
+                                                            self.line_gap, self.photo_count)
+            self._layout = (width, rows, tops, height, dangling)
+            self._span = (0, len(rows), 0.0)
+        return self._layout
+
+    def _height(self) -> float:
+        """From the top of the first row to the bottom of the last: a piece never ends with a gap."""
+        lo, hi, top = self._span
+        return self._layout[2][hi - 1] + self.style.leading - top if hi > lo else 0.0
+
+    def wrap(self, availWidth, availHeight):
+        width = self._rows(availWidth)[0]
+        self.height = self._height()
+        return width, self.height
+
+    def split(self, availWidth, availHeight):
+        tops = self._rows(availWidth)[2]
+        lo, hi, top = self._span
+        # rows whose bottom fits: tops[i] - top + leading <= availHeight
+        cut = min(bisect.bisect_right(tops, top + availHeight - self.style.leading, lo, hi), hi - 1)
+        if cut <= lo:
+            return []
+        return [self._piece(lo, cut, top), self._piece(cut, hi, tops[cut])]
+
+    def _piece(self, lo: int, hi: int, top: float) -> "StatementFlowable":
+        return StatementFlowable(self.lines, self.style, self.photo_count, self.line_gap, _layout=self._layout,
+                                 _span=(lo, hi, top))
+
+    def draw(self):
+        _, rows, tops, _, _ = self._layout
+        lo, hi, top = self._span
+        height = self._height()
+        s = self.style
+        canv = self.canv
+        text = canv.beginText()
+        text.setFont(s.fontName, s.fontSize, s.leading)
+        for i in range(lo, hi):
+            row, links = rows[i]
+            # baseline as platypus Paragraph places it: one font size below the line's top
+            y = height - (tops[i] - top) - s.fontSize
+            text.setTextOrigin(0, y)
+            text.textOut(row)
+            for x, w, anchor in links:
+                canv.linkRect("", anchor, (x, y - 0.2 * s.fontSize, x + w, y + s.fontSize), relative=1)
+        canv.drawText(text)
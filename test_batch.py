@@ -0,0 +1,78 @@
+"""Test for the headless batch engine: renders a small manifest, then resumes it."""
+
+import csv
+import json
+import os
+import tempfile
+
+from PIL import Image
+
+import batch
+from batch import file_photo_ref, run_batch
+
+
+def make_test_image(path, color=(200, 100, 50), size=(640, 480)):
+    Image.new("RGB", size, color=color).save(path, format="JPEG")
+
+
+def test_batch_renders_logs_and_resumes():
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(3):
+            make_test_image(os.path.join(tmp, f"img_{i}.jpg"), color=(i * 80, 100, 100))
+        jobs = [
+            {"id": "single", "images": ["img_0.jpg"], "task": "Single photo job"},
+            {"id": "multi", "images": ["img_1.jpg", "img_2.jpg"], "statement": "See Photo 1 and Photo 2",
+             "comments": ["left side", "right side"]},
+            {"id": "missing", "images": ["nope.jpg"], "task": "Broken job"},
+        ]
+        manifest = os.path.join(tmp, "manifest.jsonl")
+        with open(manifest, "w", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(j) for j in jobs))
+        out_dir = os.path.join(tmp, "out")
+        log_path = os.path.join(tmp, "log.csv")
+
+        summary = run_batch(manifest, out_dir, workers=2, log_path=log_path)
+        assert summary["completed"] == 2
+        assert [job_id for job_id, _ in summary["failed"]] == ["missing"]
+        for name in ("single.pdf", "multi.pdf"):
+            with open(os.path.join(out_dir, name), "rb") as f:
+                assert f.read(4) == b"%PDF"
+        with open(log_path, newline="") as f:
+            rows = list(csv.reader(f))
+        assert sorted(r[2] for r in rows[1:]) == ["img_0.jpg", "img_1.jpg", "img_2.jpg"]
+
+        # a second run only retries the failed job
+        summary = run_batch(manifest, out_dir, workers=2, log_path=log_path)
+        assert summary["skipped"] == 2
+        assert summary["completed"] == 0 and len(summary["failed"]) == 1
+
+
+def test_reference_photo_digest_is_memoized():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ref.jpg")
+        make_test_image(path)
+        first = file_photo_ref(path)
+        assert len(first.sha256) == 64
+        batch._file_digests[(os.path.abspath(path), first.size, os.stat(path).st_mtime_ns)] = "memoized"
+        assert file_photo_ref(path).sha256 == "memoized"
+
+
+def test_csv_comments_keep_their_photo_positions():
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = os.path.join(tmp, "manifest.csv")
+        with open(manifest, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "images", "statement", "comments"])
+            writer.writerow(["j1", "a.jpg; b.jpg; c.jpg", "See Photo 3", "first||third"])
+            writer.writerow(["j2", "a.jpg;b.jpg", "s", "|second"])
+        jobs = list(batch.read_manifest(manifest))
+        assert jobs[0]["comments"] == {0: "first", 2: "third"}
+        assert jobs[1]["comments"] == {1: "second"}
+        assert [os.path.basename(p) for p in jobs[0]["images"]] == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+if __name__ == "__main__":
+    test_batch_renders_logs_and_resumes()
+    test_reference_photo_digest_is_memoized()
+    test_csv_comments_keep_their_photo_positions()
+    print("Batch engine test passed")
@@ -0,0 +1,87 @@
+"""Tests for bulk single-photo proofs rendered in one canvas pass."""
+
+import csv
+import io
+import os
+import re
+import tempfile
+
+from PIL import Image
+
+from proof_manifest import read_manifest, verify
+from utils import write_bulk_proof_pdfs
+
+
+def make_test_image(color=(200, 100, 50), size=(640, 480)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def page_count(path):
+    with open(path, "rb") as f:
+        return len(re.findall(rb"/Type /Page\b", f.read()))
+
+
+def test_bulk_proofs_roll_over_and_log_once_per_document():
+    with tempfile.TemporaryDirectory() as tmp:
+        on_disk = os.path.join(tmp, "disk.jpg")
+        with open(on_disk, "wb") as f:
+            f.write(make_test_image(color=(1, 2, 3)))
+
+        def items():
+            for i in range(4):
+                yield make_test_image(color=(40 * i, 100, 150)), f"img_{i}.jpg", f"Task {i}"
+            yield on_disk, "disk.jpg", "From disk"
+            yield os.path.join(tmp, "missing.jpg"), "missing.jpg", "Gone"
+
+        log_path = os.path.join(tmp, "log.csv")
+        template = os.path.join(tmp, "bulk_{n:02d}.pdf")
+        outputs = write_bulk_proof_pdfs(items(), template, pages_per_file=4, log_path=log_path, workers=2)
+
+        assert outputs == [(template.format(n=1), 4), (template.format(n=2), 2)]
+        assert [page_count(path) for path, _ in outputs] == [4, 2]
+
+        # each document carries the digests of its own photos
+        assert [p[0] for p in read_manifest(outputs[0][0])["photos"]] == [f"img_{i}.jpg" for i in range(4)]
+        second = outputs[1][0]
+        assert verify(second, [on_disk])["matched"] == [(on_disk, 1, "disk.jpg")]
+
+        with open(log_path, newline="") as f:
+            rows = list(csv.reader(f))
+        assert [r[2] for r in rows[1:]] == ["img_0.jpg", "img_1.jpg", "img_2.jpg", "img_3.jpg",
+                                            "disk.jpg", "missing.jpg"]
+
+
+def test_bulk_proofs_into_one_file_share_identical_photos():
+    data = make_test_image()
+    single = io.BytesIO()
+    outputs = write_bulk_proof_pdfs(((data, f"copy_{i}.jpg", "Same") for i in range(5)), single,
+                                    log_path=None, workers=1)
+    assert outputs == [(single, 5)]
+    pdf = single.getvalue()
+    assert pdf[:4] == b"%PDF"
+    # one embedded JPEG for five pages of the same photo
+    assert len(re.findall(rb"/Subtype /Image", pdf)) == 1
+
+
+def test_rolling_output_needs_a_template_with_n():
+    with tempfile.TemporaryDirectory() as tmp:
+        data = make_test_image()
+        for out in (os.path.join(tmp, "proofs.pdf"), io.BytesIO()):
+            try:
+                write_bulk_proof_pdfs(((data, f"{i}.jpg", "t") for i in range(5)), out, pages_per_file=2,
+                                      log_path=None)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"expected a ValueError for {out!r}")
+        assert os.listdir(tmp) == []
+
+
+if __name__ == "__main__":
+    test_bulk_proofs_roll_over_and_log_once_per_document()
+    test_bulk_proofs_into_one_file_share_identical_photos()
+    test_rolling_output_needs_a_template_with_n()
+    print("Bulk proof tests passed")
@@ -0,0 +1,133 @@
+"""Tests for the target-DPI image preparation stage."""
+
+import io
+import re
+
+from PIL import Image
+
+import image_prep
+from image_prep import ImageTooLarge, PreparedImageCache, check_image, prepare_image, prepare_images
+from utils import generate_multipage_proof_pdf
+
+
+def make_image(size, fmt="JPEG", mode="RGB", exif=None):
+    im = Image.new(mode, size, color=(200, 100, 50, 128)[:len(mode)])
+    buf = io.BytesIO()
+    kwargs = {"exif": exif} if exif is not None else {}
+    im.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def test_small_jpeg_passes_through_untouched():
+    data = make_image((400, 300))
+    prepared = prepare_image(data, 512, 300, dpi=150)
+    assert prepared.passthrough
+    assert prepared.data is data
+    assert (prepared.draw_width, prepared.draw_height) == (400, 300)
+
+
+def test_large_photo_is_resampled_to_target_dpi():
+    data = make_image((4000, 3000))
+    prepared = prepare_image(data, 512, 600, dpi=144)
+    assert not prepared.passthrough
+    assert prepared.draw_width == 512
+    # 512pt at 144 dpi is 1024 px
+    assert prepared.width == 1024
+    assert Image.open(io.BytesIO(prepared.data)).format == "JPEG"
+    assert len(prepared.data) < len(data)
+
+
+def test_png_with_alpha_is_flattened_to_jpeg():
+    data = make_image((300, 200), fmt="PNG", mode="RGBA")
+    prepared = prepare_image(data, 512)
+    im = Image.open(io.BytesIO(prepared.data))
+    assert im.format == "JPEG" and im.mode == "RGB"
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees
+    data = make_image((400, 200), exif=exif.tobytes())
+    prepared = prepare_image(data, 512, 600)
+    assert not prepared.passthrough
+    assert (prepared.width, prepared.height) == (200, 400)
+    assert (prepared.draw_width, prepared.draw_height) == (200, 400)
+
+
+def test_prepare_images_keeps_order_and_reports_failures():
+    images = [make_image((100 + i * 10, 80)) for i in range(6)]
+    images[3] = b"not an image"
+    results = prepare_images(images, 512, workers=4)
+    assert isinstance(results[3], Exception)
+    widths = [r.width for i, r in enumerate(results) if i != 3]
+    assert widths == [100, 110, 120, 140, 150]
+
+
+def test_cache_makes_reorder_free_and_evicts_by_bytes():
+    images = [make_image((2000 + i * 100, 1500)) for i in range(3)]
+    cache = PreparedImageCache()
+    first = prepare_images(images, 512, cache=cache, workers=1)
+    assert (cache.hits, cache.misses) == (0, 3)
+    again = prepare_images(list(reversed(images)), 512, cache=cache, workers=1)
+    assert cache.hits == 3
+    assert [r.data for r in again] == [r.data for r in reversed(first)]
+    # a different target size is a different entry
+    prepare_images(images[:1], 256, cache=cache, workers=1)
+    assert cache.misses == 4
+
+    small = PreparedImageCache(max_bytes=len(first[0].data) + len(first[1].data))
+    prepare_images(images, 512, cache=small, workers=1)
+    assert len(small) == 2 and small.current_bytes <= small.max_bytes
+
+
+def test_duplicate_photos_are_prepared_once_and_share_one_xobject():
+    a, b = make_image((2000, 1500)), make_image((1800, 1500))
+    cache = PreparedImageCache()
+    results = prepare_images([a, b, bytes(a)], 512, cache=cache, workers=2)
+    assert cache.misses == 2
+    assert results[2] is results[0]
+
+    photos = [{"bytes": data, "filename": f"{i}.jpg"} for i, data in enumerate([a, b, a, a])]
+    pdf = generate_multipage_proof_pdf(photos, "Photo 1 and Photo 3 are the same")
+    assert len(re.findall(rb"/Subtype /Image", pdf)) == 2
+
+
+def test_huge_jpeg_is_draft_decoded_to_target_size():
+    data = make_image((6000, 4000))
+    prepared = prepare_image(data, 300, 300, dpi=72)
+    assert (prepared.width, prepared.height) == (300, 200)
+
+
+def test_pixel_and_decode_caps_refuse_before_decoding():
+    saved = image_prep.DEFAULT_MAX_PIXELS, image_prep.DEFAULT_MAX_DECODE_BYTES
+    try:
+        image_prep.DEFAULT_MAX_PIXELS = 1_000_000
+        big = make_image((1500, 1000), fmt="PNG")
+        try:
+            check_image(big)
+            assert False, "expected ImageTooLarge"
+        except ImageTooLarge as e:
+            assert "1500x1000" in str(e)
+        assert isinstance(prepare_images([big], 512, cache=False, workers=1)[0], ImageTooLarge)
+
+        image_prep.DEFAULT_MAX_PIXELS = 10_000_000
+        image_prep.DEFAULT_MAX_DECODE_BYTES = 1024 * 1024
+        photos = [{"bytes": big, "filename": "big.png"}]
+        pdf = generate_multipage_proof_pdf(photos, "Photo 1", workers=1)
+        assert pdf[:4] == b"%PDF"
+        assert isinstance(prepare_images([big], 512, cache=False, workers=1)[0], ImageTooLarge)
+    finally:
+        image_prep.DEFAULT_MAX_PIXELS, image_prep.DEFAULT_MAX_DECODE_BYTES = saved
+
+
+if __name__ == "__main__":
+    test_small_jpeg_passes_through_untouched()
+    test_large_photo_is_resampled_to_target_dpi()
+    test_png_with_alpha_is_flattened_to_jpeg()
+    test_exif_orientation_is_applied()
+    test_prepare_images_keeps_order_and_reports_failures()
+    test_cache_makes_reorder_free_and_evicts_by_bytes()
+    test_duplicate_photos_are_prepared_once_and_share_one_xobject()
+    test_huge_jpeg_is_draft_decoded_to_target_size()
+    test_pixel_and_decode_caps_refuse_before_decoding()
+    print("Image preparation tests passed")
@@ -0,0 +1,54 @@
+"""Import-time budget for the modules the Streamlit app and batch workers load at startup.
+
+Each check runs `python -X importtime` in a fresh interpreter and parses its
+report, so results don't depend on what this test process already imported.
+Override the budget with SNAPPROOF_IMPORT_BUDGET_MS on slow machines.
+"""
+
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_BUDGET_MS = float(os.getenv("SNAPPROOF_IMPORT_BUDGET_MS", "150"))
+# loaded on first use only, never at import
+HEAVY_MODULES = ("pandas", "reportlab", "PIL", "gspread", "oauth2client", "numpy")
+
+
+def import_times(module: str) -> dict:
+    """Return {module name: cumulative import time in ms} for a cold `import module`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=HERE, capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self [us] | cumulative | imported package"
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000.0
+    return times
+
+
+def check_module(module: str, runs: int = 3) -> None:
+    times = import_times(module)
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+    assert not heavy, f"importing {module} eagerly loads {heavy}"
+    # best of a few cold starts, so a busy machine doesn't fail the budget
+    best = min([times[module]] + [import_times(module)[module] for _ in range(runs - 1)])
+    assert best <= IMPORT_BUDGET_MS, f"importing {module} took {best:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
+
+
+def test_utils_import_is_lazy_and_within_budget():
+    check_module("utils")
+
+
+def test_batch_import_is_lazy_and_within_budget():
+    check_module("batch")
+
+
+if __name__ == "__main__":
+    for name in ("utils", "batch", "image_prep", "thumbnails", "photo_store"):
+        print(f"{name}: {import_times(name)[name]:.1f} ms")
+    test_utils_import_is_lazy_and_within_budget()
+    test_batch_import_is_lazy_and_within_budget()
+    print("Import time tests passed")
@@ -0,0 +1,55 @@
+"""Tests for the opt-in per-stage metrics."""
+
+import io
+
+from PIL import Image
+
+import metrics
+from utils import generate_multipage_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(1600, 1200)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_disabled_stage_is_a_noop():
+    metrics.enable(False)
+    metrics.registry.reset()
+    with metrics.stage("x") as s:
+        s.bytes_in = 10
+    assert metrics.snapshot() == {}
+
+
+def test_multipage_stages_are_recorded_and_traced():
+    events = []
+    metrics.registry.reset()
+    metrics.enable()
+    metrics.add_callback(events.append)
+    try:
+        photos = [{"bytes": make_test_image(color=(i * 60, 0, 0)), "filename": f"{i}.png"} for i in range(3)]
+        pdf = generate_multipage_proof_pdf(photos, "Photo 1", workers=1)
+    finally:
+        metrics.remove_callback(events.append)
+        metrics.enable(False)
+
+    snap = metrics.snapshot()
+    for name in ("multipage.hash", "multipage.prepare", "multipage.layout", "image.decode", "image.scale", "image.encode"):
+        assert snap[name]["snapproof_stage_duration_seconds"]["count"] >= 1, name
+    assert snap["multipage.prepare"]["snapproof_stage_photos"]["sum"] == 3
+    assert snap["multipage.layout"]["snapproof_stage_bytes_out"]["sum"] == len(pdf)
+
+    text = metrics.prometheus_text()
+    assert "# TYPE snapproof_stage_duration_seconds histogram" in text
+    assert 'snapproof_stage_photos_count{stage="multipage.layout"} 1' in text
+    assert 'le="+Inf"' in text
+    assert [e["stage"] for e in events if e["stage"].startswith("multipage.")] == [
+        "multipage.hash", "multipage.cache", "multipage.prepare", "multipage.layout"]
+
+
+if __name__ == "__main__":
+    test_disabled_stage_is_a_noop()
+    test_multipage_stages_are_recorded_and_traced()
+    print("Metrics tests passed")
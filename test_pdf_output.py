@@ -0,0 +1,62 @@
+"""Tests for writing proofs to paths and file sinks, and streaming them in chunks."""
+
+import csv
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+from utils import generate_multipage_proof_pdf, iter_file_chunks, iter_multipage_proof_pdf, write_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(640, 480)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_write_proof_pdf_to_path_and_file_object():
+    data = make_test_image()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "proof.pdf")
+        log_path = os.path.join(tmp, "log.csv")
+        entry = write_proof_pdf(path, data, "a.jpg", "Fix sink", log_path=log_path)
+        assert entry["task"] == "Fix sink" and entry["filename"] == "a.jpg"
+        with open(path, "rb") as f:
+            assert f.read(4) == b"%PDF"
+        with open(log_path, newline="") as f:
+            assert [r[1:] for r in csv.reader(f)][1:] == [["Fix sink", "a.jpg"]]
+
+        sink = io.BytesIO()
+        write_proof_pdf(sink, data, "a.jpg", "Fix sink", log_path=None)
+        pdf = sink.getvalue()
+        assert pdf[:4] == b"%PDF" and pdf.rstrip().endswith(b"%%EOF")
+        with open(log_path, newline="") as f:
+            assert len(list(csv.reader(f))) == 2  # log_path=None logged nothing
+
+
+def test_iter_multipage_proof_pdf_yields_the_whole_document_in_chunks():
+    photos = [{"bytes": make_test_image((i * 80, 0, 0)), "filename": f"{i}.jpg"} for i in range(2)]
+    chunks = list(iter_multipage_proof_pdf(photos, "See Photo 2", chunk_size=1024, cache=False))
+    assert len(chunks) > 1 and all(len(c) == 1024 for c in chunks[:-1]) and 0 < len(chunks[-1]) <= 1024
+    assert b"".join(chunks) == generate_multipage_proof_pdf(photos, "See Photo 2", cache=False)
+
+
+def test_iter_file_chunks_reads_paths_and_file_objects():
+    data = bytes(range(256)) * 10
+    assert list(iter_file_chunks(io.BytesIO(data), 1000)) == [data[:1000], data[1000:2000], data[2000:]]
+    assert list(iter_file_chunks(io.BytesIO(b""), 1000)) == []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        assert b"".join(iter_file_chunks(path, 999)) == data
+
+
+if __name__ == "__main__":
+    test_write_proof_pdf_to_path_and_file_object()
+    test_iter_multipage_proof_pdf_yields_the_whole_document_in_chunks()
+    test_iter_file_chunks_reads_paths_and_file_objects()
+    print("PDF output tests passed")
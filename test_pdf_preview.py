@@ -0,0 +1,92 @@
+"""Tests for cached per-page PDF previews."""
+
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from pdf_preview import PdfPreview, PreviewUnavailable, count_pages, find_renderer
+from utils import write_multipage_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50)):
+    im = Image.new("RGB", (320, 240), color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def write_proof(path, photos):
+    write_multipage_proof_pdf(path, [{"bytes": make_test_image((i * 40, 0, 0)), "filename": f"{i}.jpg"}
+                                     for i in range(photos)], "Statement")
+
+
+class RecordingRenderer:
+    """Renders a blank JPEG per page and remembers what it was asked for."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, pdf_path, pages, width):
+        self.calls.append(list(pages))
+        buf = io.BytesIO()
+        Image.new("RGB", (width, int(width * 11 / 8.5)), "white").save(buf, format="JPEG")
+        return [buf.getvalue()] * len(pages)
+
+
+def test_page_count_ignores_page_markers_in_uncompressed_text():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "proof.pdf")
+        write_multipage_proof_pdf(pdf_path, [{"bytes": make_test_image(), "filename": "0.jpg"}],
+                                  "Fixed /Type /Page and /Type/Page in the template", profile="fast", cache=False)
+        with open(pdf_path, "rb") as f:
+            assert b"/Type /Page and" in f.read()
+        assert count_pages(pdf_path) == 2
+
+
+def test_pages_are_rendered_once_and_dropped_when_the_pdf_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "proof.pdf")
+        write_proof(pdf_path, 5)
+        assert count_pages(pdf_path) == 6
+
+        renderer = RecordingRenderer()
+        preview = PdfPreview(pdf_path, width=200, renderer=renderer)
+        first = preview.pages(0, 3)
+        assert [os.path.basename(p) for p in first] == ["page-0001-200.jpg", "page-0002-200.jpg", "page-0003-200.jpg"]
+        # showing more pages only renders the new ones; asking past the end is clipped
+        assert len(preview.pages(0, 10)) == 6
+        assert renderer.calls == [[0, 1, 2], [3, 4, 5]]
+        assert Image.open(first[0]).width == 200
+
+        time.sleep(0.01)
+        write_proof(pdf_path, 1)
+        preview = PdfPreview(pdf_path, width=200, renderer=renderer)
+        assert preview.page_count == 2
+        assert len(preview.pages(0, 3)) == 2
+        assert renderer.calls[-1] == [0, 1]
+        assert sorted(os.listdir(pdf_path + ".preview")) == ["page-0001-200.jpg", "page-0002-200.jpg", "stamp"]
+
+
+def test_missing_rasterizer_is_reported():
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "proof.pdf")
+        write_proof(pdf_path, 1)
+        if find_renderer() is not None:
+            assert os.path.getsize(PdfPreview(pdf_path, width=100).pages(0, 1)[0]) > 0
+            return
+        try:
+            PdfPreview(pdf_path)
+        except PreviewUnavailable:
+            pass
+        else:
+            raise AssertionError("expected PreviewUnavailable")
+
+
+if __name__ == "__main__":
+    test_page_count_ignores_page_markers_in_uncompressed_text()
+    test_pages_are_rendered_once_and_dropped_when_the_pdf_changes()
+    test_missing_rasterizer_is_reported()
+    print("PDF preview tests passed")
@@ -0,0 +1,73 @@
+"""Tests for the fast / balanced / smallest PDF output profiles."""
+
+import io
+import re
+
+from PIL import Image
+
+from image_prep import prepare_image
+from pdf_profiles import PROFILES, get_profile
+from utils import generate_multipage_proof_pdf, generate_proof_pdf
+
+
+def make_photo(size=(1200, 900)):
+    # crossed gradients plus noise, so JPEG quality and subsampling change the encoded size
+    ramp = Image.linear_gradient("L").resize(size)
+    im = Image.merge("RGB", (ramp, ramp.transpose(Image.Transpose.ROTATE_90).resize(size),
+                             Image.effect_noise(size, 40)))
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_profile_lookup():
+    assert get_profile("FAST") is PROFILES["fast"]
+    assert get_profile(PROFILES["smallest"]) is PROFILES["smallest"]
+    assert get_profile().name == "balanced"
+    try:
+        get_profile("tiny")
+    except ValueError as e:
+        assert "fast, balanced, smallest" in str(e)
+    else:
+        raise AssertionError("unknown profile accepted")
+
+
+def test_passthrough_modes():
+    data = make_photo((800, 600))
+    assert prepare_image(data, 200, 150, passthrough="always").data is data
+    assert not prepare_image(data, 200, 150, passthrough="fit").passthrough
+    # "never" re-encodes even a JPEG that fits, unless that comes out larger
+    small = prepare_image(data, 800, 600, jpeg_quality=60, passthrough="never")
+    assert not small.passthrough and len(small.data) < len(data)
+    assert prepare_image(data, 800, 600, jpeg_quality=100, subsampling=0, passthrough="never").data is data
+
+
+def test_profiles_trade_size_and_stay_readable():
+    photos = [{"bytes": make_photo(), "filename": "a.jpg"}, {"bytes": make_photo((900, 1200)), "filename": "b.jpg"}]
+    sizes = {}
+    for name in PROFILES:
+        pdf = generate_multipage_proof_pdf(photos, "See Photo 1.", profile=name, workers=1)
+        sizes[name] = len(pdf)
+        assert len(re.findall(rb"/Type /Page\b", pdf)) == 3
+        filters = set(re.findall(rb"/Filter \[([^\]]*)\]", pdf))
+        # photos are binary DCT streams (no ASCII85 inflation); page streams are only compressed when asked
+        assert len(re.findall(rb"/Subtype /Image", pdf)) == 2
+        assert (b" /DCTDecode " in filters) and all(b"DCTDecode" not in f or f == b" /DCTDecode " for f in filters)
+        assert any(b"FlateDecode" in f for f in filters) == PROFILES[name].page_compression
+    assert sizes["fast"] > sizes["balanced"] > sizes["smallest"]
+
+
+def test_single_proof_profile():
+    data = make_photo()
+    fast = generate_proof_pdf(data, "a.jpg", "Roof", log_path=None, profile="fast")
+    # the original JPEG is embedded as is
+    assert data in fast
+    assert len(generate_proof_pdf(data, "a.jpg", "Roof", log_path=None, profile="smallest")) < len(fast)
+
+
+if __name__ == "__main__":
+    test_profile_lookup()
+    test_passthrough_modes()
+    test_profiles_trade_size_and_stay_readable()
+    test_single_proof_profile()
+    print("PDF profile tests passed")
@@ -0,0 +1,144 @@
+"""Tests for background ingest of uploaded and captured photos."""
+
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import image_prep
+from photo_ingest import IngestQueue, ingest_photo, oriented_size
+from photo_store import PhotoStore, SessionCleared
+from utils import write_multipage_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(320, 240), orientation=None):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    if orientation is None:
+        im.save(buf, format="JPEG")
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        im.save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def make_queue(root, prepare=False, quota_bytes=None):
+    store = PhotoStore("s1", root=root, quota_bytes=quota_bytes)
+    return IngestQueue(store, prepare=prepare, executor=ThreadPoolExecutor(max_workers=2))
+
+
+def test_upload_submitted_once_by_file_id_and_content():
+    with tempfile.TemporaryDirectory() as root:
+        queue = make_queue(root)
+        red, blue = make_test_image((255, 0, 0)), make_test_image((0, 0, 255))
+        assert queue.submit(red, "a.jpg", "t", file_id="f1")
+        # the same upload on a rerun, and the same photo uploaded again
+        assert queue.seen("f1") and not queue.submit(red, "a.jpg", "t", file_id="f1")
+        assert not queue.submit(red, "a copy.jpg", "t", file_id="f2")
+        assert queue.submit(blue, "b.jpg", "t", file_id="f3")
+        assert queue.wait(timeout=30)
+        ready, rejected = queue.drain()
+        assert [p["filename"] for p in ready] == ["a.jpg", "b.jpg"] and rejected == []
+        assert queue.pending == 0
+        assert ready[0]["ref"].read_bytes() == red
+        # once removed from the session, the same content can be added again
+        queue.discard(ready[0]["sha256"])
+        assert queue.submit(red, "a again.jpg", "t", file_id="f4")
+        queue.wait(timeout=30)
+        assert [p["filename"] for p in queue.drain()[0]] == ["a again.jpg"]
+
+
+def test_unreadable_and_over_quota_photos_are_rejected_with_a_message():
+    with tempfile.TemporaryDirectory() as root:
+        good = make_test_image()
+        queue = make_queue(root, quota_bytes=len(good) + 10)
+        truncated = make_test_image((0, 255, 0), size=(640, 480))[:600]
+        queue.submit(good, "good.jpg", "t")
+        queue.submit(b"not an image", "notes.txt", "t")
+        queue.submit(truncated, "cut.jpg", "t")
+        # photos are stored in the order they finish; let good.jpg take the quota first
+        queue.wait(timeout=30)
+        queue.submit(make_test_image((0, 0, 0)), "late.jpg", "t")
+        queue.wait(timeout=30)
+        ready, rejected = queue.drain()
+        assert [p["filename"] for p in ready] == ["good.jpg"]
+        assert rejected[0] == "notes.txt was not added: it is not a readable PNG or JPEG image"
+        assert rejected[1].startswith("cut.jpg was not added")
+        assert "quota" in rejected[2]
+        # a rejected photo can be uploaded again, e.g. after making room
+        assert queue.submit(b"not an image", "notes.txt", "t")
+
+
+def test_reset_session_leaves_nothing_behind():
+    with tempfile.TemporaryDirectory() as root:
+        store = PhotoStore("s1", root=root)
+        executor = ThreadPoolExecutor(max_workers=1)
+        queue = IngestQueue(store, prepare=False, executor=executor)
+        release = threading.Event()
+        executor.submit(release.wait, 30)  # holds the only worker
+        queue.submit(make_test_image((255, 0, 0)), "queued.jpg", "t")
+        stale = store.generation
+        queue.close()
+        store.clear()
+        release.set()
+        executor.shutdown(wait=True)
+        assert queue.pending == 0 and os.listdir(store.dir) == [] and store.usage() == 0
+        # a photo already being ingested when the session was cleared is refused by the store
+        try:
+            ingest_photo(store, make_test_image(), "running.jpg", "t", prepare=False, generation=stale)
+        except SessionCleared:
+            pass
+        else:
+            raise AssertionError("expected SessionCleared")
+        assert os.listdir(store.dir) == [] and store.usage() == 0
+        # after the reset, uploads still sitting in the uploader are not ingested again
+        executor = ThreadPoolExecutor(max_workers=1)
+        queue = IngestQueue(store, prepare=False, executor=executor)
+        assert queue.submit(make_test_image(), "a.jpg", "t", file_id="f1")
+        queue.wait(timeout=30)
+        queue.close()
+        store.clear()
+        assert queue.seen("f1") and not queue.submit(make_test_image(), "a.jpg", "t", file_id="f1")
+        # the same photo uploaded anew is welcome
+        assert queue.submit(make_test_image(), "a.jpg", "t", file_id="f2")
+        queue.wait(timeout=30)
+        assert [p["filename"] for p in queue.drain()[0]] == ["a.jpg"]
+
+
+def test_oriented_size_follows_exif_rotation():
+    assert oriented_size(make_test_image(size=(320, 240))) == (320, 240)
+    assert oriented_size(make_test_image(size=(320, 240), orientation=6)) == (240, 320)
+    with tempfile.TemporaryDirectory() as root:
+        photo = ingest_photo(PhotoStore("s1", root=root), make_test_image(orientation=8), "r.jpg", "t",
+                             prepare=False)
+        assert (photo["width"], photo["height"]) == (240, 320)
+
+
+def test_prepared_photos_are_reused_by_the_proof():
+    for profile in (None, "smallest"):
+        image_prep.default_cache.clear()
+        with tempfile.TemporaryDirectory() as root:
+            queue = make_queue(root, prepare=True)
+            queue.profile = profile
+            for i in range(3):
+                queue.submit(make_test_image((i * 80, 0, 0), size=(1600, 1200)), f"p{i}.jpg", "t")
+            queue.wait(timeout=60)
+            photos, rejected = queue.drain()
+            assert len(photos) == 3 and rejected == []
+            assert len(image_prep.default_cache) == 3
+            hits = image_prep.default_cache.hits
+            write_multipage_proof_pdf(f"{root}/proof.pdf", photos, "", profile=profile, cache=False)
+            assert image_prep.default_cache.hits == hits + 3, profile
+
+
+if __name__ == "__main__":
+    test_upload_submitted_once_by_file_id_and_content()
+    test_unreadable_and_over_quota_photos_are_rejected_with_a_message()
+    test_reset_session_leaves_nothing_behind()
+    test_oriented_size_follows_exif_rotation()
+    test_prepared_photos_are_reused_by_the_proof()
+    print("photo ingest tests passed")
@@ -0,0 +1,60 @@
+"""Tests for paging and reordering the session photo list."""
+
+from photo_list import apply_page_order, ensure_ids, move_photo, page_bounds, page_count, page_of
+
+
+def make_photos(n):
+    photos = [{"filename": f"img_{i}.jpg"} for i in range(n)]
+    ensure_ids(photos)
+    return photos
+
+
+def names(photos):
+    return [int(p["filename"][4:-4]) for p in photos]
+
+
+def test_page_bounds_clamp_to_existing_pages():
+    assert page_count(0, 5) == 1
+    assert page_count(11, 5) == 3
+    assert page_bounds(11, 0, 5) == (0, 5, 0)
+    assert page_bounds(11, 2, 5) == (10, 11, 2)
+    # a page past the end (e.g. after deleting photos) falls back to the last page
+    assert page_bounds(11, 7, 5) == (10, 11, 2)
+    assert page_bounds(0, 3, 5) == (0, 0, 0)
+    assert page_of(10, 5) == 2
+
+
+def test_ids_are_stable_and_unique():
+    photos = make_photos(4)
+    ids = [p["id"] for p in photos]
+    assert len(set(ids)) == 4
+    ensure_ids(photos)
+    assert [p["id"] for p in photos] == ids
+
+
+def test_page_order_only_permutes_that_page():
+    photos = make_photos(10)
+    assert apply_page_order(photos, 5, [7, 5, 6, 9, 8])
+    assert names(photos) == [0, 1, 2, 3, 4, 7, 5, 6, 9, 8]
+    # stale or foreign indices leave the list alone
+    before = list(photos)
+    assert not apply_page_order(photos, 5, [5, 6, 7, 8, 10])
+    assert not apply_page_order(photos, 5, [5, 5, 6, 7, 8])
+    assert photos == before
+
+
+def test_move_crosses_pages():
+    photos = make_photos(10)
+    assert move_photo(photos, 8, 1)
+    assert names(photos) == [0, 8, 1, 2, 3, 4, 5, 6, 7, 9]
+    assert not move_photo(photos, 0, 0)
+    assert not move_photo(photos, 0, 10)
+    assert not move_photo(photos, -1, 3)
+
+
+if __name__ == "__main__":
+    test_page_bounds_clamp_to_existing_pages()
+    test_ids_are_stable_and_unique()
+    test_page_order_only_permutes_that_page()
+    test_move_crosses_pages()
+    print("Photo list test passed")
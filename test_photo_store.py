@@ -0,0 +1,70 @@
+"""Tests for the disk-backed session photo store."""
+
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+import photo_store
+from photo_store import PhotoStore, QuotaExceeded, load_photo_bytes
+from utils import generate_multipage_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(320, 240)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_put_read_delete_and_quota():
+    with tempfile.TemporaryDirectory() as root:
+        data = make_test_image()
+        store = PhotoStore("s1", root=root, quota_bytes=len(data) * 2)
+        ref = store.put(data)
+        assert ref.read_bytes() == data
+        assert load_photo_bytes({"ref": ref}) == data
+        store.put(data)
+        try:
+            store.put(data)
+            assert False, "quota not enforced"
+        except QuotaExceeded:
+            pass
+        store.delete(ref)
+        assert store.usage() == len(data)
+        store.clear()
+        assert store.usage() == 0 and os.listdir(store.dir) == []
+
+
+def test_sweep_removes_only_expired_sessions():
+    with tempfile.TemporaryDirectory() as root:
+        old = PhotoStore("old", root=root)
+        PhotoStore("fresh", root=root)
+        past = time.time() - 3600
+        os.utime(old.dir, (past, past))
+        photo_store._last_sweep = 0.0
+        assert photo_store.sweep_expired(root, max_age=60) == 1
+        assert os.listdir(root) == ["fresh"]
+        # the swept session finds out on its next touch and starts over empty
+        assert not old.touch() and old.usage() == 0 and os.listdir(old.dir) == []
+        assert old.touch()
+
+
+def test_multipage_pdf_accepts_store_handles():
+    with tempfile.TemporaryDirectory() as root:
+        store = PhotoStore("s2", root=root)
+        photos = [{"ref": store.put(make_test_image(color=(i * 60, 80, 80))), "filename": f"img_{i}.jpg"}
+                  for i in range(3)]
+        photos.append({"bytes": make_test_image(), "filename": "in_memory.jpg"})
+        pdf_bytes = generate_multipage_proof_pdf(photos, "Photo 1 and Photo 4")
+        assert pdf_bytes[:4] == b"%PDF"
+        assert pdf_bytes.count(b"/Subtype /Image") == 4
+
+
+if __name__ == "__main__":
+    test_put_read_delete_and_quota()
+    test_sweep_removes_only_expired_sessions()
+    test_multipage_pdf_accepts_store_handles()
+    print("Photo store tests passed")
@@ -0,0 +1,135 @@
+"""Tests for the finished-proof cache."""
+
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+import metrics
+from proof_cache import ProofCache
+from utils import generate_multipage_proof_pdf, multipage_proof_key, write_multipage_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(320, 240)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def make_photos(n=3):
+    return [{"bytes": make_test_image((i * 60, 20, 90)), "filename": f"{i}.jpg", "timestamp": "2024-05-01 10:00:00"}
+            for i in range(n)]
+
+
+def test_proofs_are_deterministic():
+    photos = make_photos()
+    first = generate_multipage_proof_pdf(photos, "See Photo 2", {1: "scratch"}, cache=False)
+    second = generate_multipage_proof_pdf(photos, "See Photo 2", {1: "scratch"}, cache=False)
+    assert first == second
+    assert b"/CreationDate (D:2000" in first
+
+
+def test_identical_request_is_served_from_cache_without_layout():
+    cache = ProofCache(max_bytes=16 * 1024 * 1024)
+    photos = make_photos()
+    first = generate_multipage_proof_pdf(photos, "See Photo 2", {1: "scratch"}, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+
+    events = []
+    metrics.add_callback(events.append)
+    try:
+        again = generate_multipage_proof_pdf(photos, "See Photo 2", {"1": "scratch"}, cache=cache)
+    finally:
+        metrics.remove_callback(events.append)
+    assert again == first and cache.hits == 1
+    stages = [e["stage"] for e in events]
+    assert stages == ["multipage.hash", "multipage.cache"]
+
+    # anything that changes the document is a different proof
+    assert generate_multipage_proof_pdf(photos, "See Photo 3", {1: "scratch"}, cache=cache) != first
+    assert generate_multipage_proof_pdf(photos[::-1], "See Photo 2", {1: "scratch"}, cache=cache) != first
+    assert generate_multipage_proof_pdf(photos, "See Photo 2", {1: "scratch"}, profile="fast", cache=cache) != first
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_key_covers_inputs_and_settings():
+    photos = make_photos(2)
+    key = multipage_proof_key(photos, "s", {0: "a"})
+    assert key == multipage_proof_key(photos, "s", {"0": "a"})
+    assert key == multipage_proof_key(photos, "s", {0: "a"}, jpeg_quality=85, profile="balanced")
+    renamed = [dict(photos[0], filename="other.jpg"), photos[1]]
+    for other in (multipage_proof_key(photos, "s", {0: "b"}), multipage_proof_key(photos, "t", {0: "a"}),
+                  multipage_proof_key(renamed, "s", {0: "a"}), multipage_proof_key(photos, "s", {0: "a"}, image_dpi=300),
+                  multipage_proof_key(photos, "s", {0: "a"}, profile="smallest")):
+        assert other != key
+
+
+def test_cached_proof_written_to_paths_and_file_objects():
+    cache = ProofCache()
+    photos = make_photos(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "proof.pdf")
+        write_multipage_proof_pdf(path, photos, "statement", cache=cache)
+        with open(path, "rb") as f:
+            expected = f.read()
+        assert len(cache) == 1
+        # a sink that already holds other data: only the document is cached and replayed
+        sink = io.BytesIO(b"prefix")
+        sink.seek(0, io.SEEK_END)
+        write_multipage_proof_pdf(sink, photos, "statement", cache=cache)
+        assert sink.getvalue() == b"prefix" + expected and cache.hits == 1
+        os.remove(path)
+        write_multipage_proof_pdf(path, photos, "statement", cache=cache)
+        with open(path, "rb") as f:
+            assert f.read() == expected
+        assert cache.hits == 2
+
+
+def test_proofs_with_photos_that_failed_are_not_cached():
+    cache = ProofCache()
+    photos = make_photos(2) + [{"bytes": b"not an image", "filename": "broken.jpg"}]
+    generate_multipage_proof_pdf(photos, "statement", cache=cache)
+    assert len(cache) == 0
+    # a key the caller already computed is used as is
+    key = multipage_proof_key(photos[:2], "statement")
+    pdf = generate_multipage_proof_pdf(photos[:2], "statement", cache=cache, cache_key=key)
+    assert cache.get(key) == pdf
+
+
+def test_memory_tier_is_bounded_lru():
+    cache = ProofCache(max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") is not None  # a is now the most recent
+    cache.put("c", b"c" * 100)
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    cache.put("huge", b"x" * 1000)
+    assert cache.get("huge") is None and cache.current_bytes == 200
+
+
+def test_disk_tier_is_shared_and_trimmed():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ProofCache(max_bytes=0, directory=tmp, max_disk_bytes=250)
+        writer.put("a", b"a" * 100)
+        assert len(writer) == 0 and writer.accepts(200) and not writer.accepts(300)
+        # another process (or a restart) sees the stored proof
+        reader = ProofCache(directory=tmp, max_disk_bytes=250)
+        assert reader.get("a") == b"a" * 100 and reader.hits == 1
+        os.utime(os.path.join(tmp, "a.pdf"), ns=(1, 1))
+        writer.put("b", b"b" * 100)
+        writer.put("c", b"c" * 100)
+        assert sorted(os.listdir(tmp)) == ["b.pdf", "c.pdf"]
+        assert writer.get("a") is None
+
+
+if __name__ == "__main__":
+    test_proofs_are_deterministic()
+    test_identical_request_is_served_from_cache_without_layout()
+    test_key_covers_inputs_and_settings()
+    test_cached_proof_written_to_paths_and_file_objects()
+    test_proofs_with_photos_that_failed_are_not_cached()
+    test_memory_tier_is_bounded_lru()
+    test_disk_tier_is_shared_and_trimmed()
+    print("Proof cache tests passed")
@@ -0,0 +1,74 @@
+"""Tests for the append-only proof log writer.
+
+Checks that rows keep the `timestamp,task,filename` CSV layout, that appending
+to an existing pandas-written log works, and that concurrent writers (threads
+and processes) never lose rows.
+"""
+
+import csv
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from proof_log import ProofLogWriter, append_log_entry
+
+
+def _read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def _write_rows(path, worker, count):
+    with ProofLogWriter(path, fsync_every=0) as writer:
+        for i in range(count):
+            writer.append({"timestamp": "2025-11-20 12:00:00", "task": f"w{worker}", "filename": f"{i}.jpg"})
+
+
+def test_header_and_quoting():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.csv")
+        append_log_entry({"timestamp": "2025-11-20 12:00:00", "task": "Fix sink, kitchen", "filename": "a.jpg"}, path)
+        append_log_entry({"timestamp": "2025-11-20 12:00:01", "task": "Roof", "filename": "b.jpg"}, path)
+        rows = _read_rows(path)
+        assert rows[0] == ["timestamp", "task", "filename"]
+        assert rows[1] == ["2025-11-20 12:00:00", "Fix sink, kitchen", "a.jpg"]
+        assert rows[2] == ["2025-11-20 12:00:01", "Roof", "b.jpg"]
+
+
+def test_appends_to_existing_log_without_trailing_newline():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("timestamp,task,filename\n2025-11-19 17:21:12,Smoke test,test.jpg")
+        with ProofLogWriter(path) as writer:
+            writer.append_many([
+                {"timestamp": "2025-11-20 09:00:00", "task": "t1", "filename": "1.jpg"},
+                {"timestamp": "2025-11-20 09:00:01", "task": "t2", "filename": "2.jpg"},
+            ])
+        rows = _read_rows(path)
+        assert len(rows) == 4
+        assert rows[1][2] == "test.jpg"
+        assert rows[3] == ["2025-11-20 09:00:01", "t2", "2.jpg"]
+
+
+def test_concurrent_writers_do_not_lose_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.csv")
+        threads = [threading.Thread(target=_write_rows, args=(path, i, 50)) for i in range(4)]
+        procs = [multiprocessing.Process(target=_write_rows, args=(path, 10 + i, 50)) for i in range(3)]
+        for t in threads + procs:
+            t.start()
+        for t in threads + procs:
+            t.join()
+        rows = _read_rows(path)
+        assert rows[0] == ["timestamp", "task", "filename"]
+        assert len(rows) == 1 + 7 * 50
+        assert all(len(r) == 3 for r in rows)
+
+
+if __name__ == "__main__":
+    test_header_and_quoting()
+    test_appends_to_existing_log_without_trailing_newline()
+    test_concurrent_writers_do_not_lose_rows()
+    print("Proof log tests passed")
@@ -0,0 +1,80 @@
+"""Tests for the SQLite proof log store."""
+
+import multiprocessing
+import os
+import tempfile
+
+from proof_log import append_log_entries, get_log_writer
+from proof_log_db import ProofLogStore, get_log_store
+
+
+def _entries(n, task="Roof", day="2025-11-20"):
+    return [{"timestamp": f"{day} 12:00:{i:02d}", "task": task, "filename": f"{task}_{i}.jpg"} for i in range(n)]
+
+
+def _write_rows(path, worker, count):
+    with ProofLogStore(path) as store:
+        for i in range(count):
+            store.append({"timestamp": "2025-11-20 12:00:00", "task": f"w{worker}", "filename": f"{i}.jpg"})
+
+
+def test_query_filters_and_pages_newest_first():
+    with tempfile.TemporaryDirectory() as tmp:
+        with ProofLogStore(os.path.join(tmp, "log.db")) as store:
+            store.append_many(_entries(5, "Roof", "2025-11-20") + _entries(3, "Sink", "2025-11-27"))
+            assert store.count() == 8
+            assert store.count(task="Roof") == 5
+            assert store.count(since="2025-11-27") == 3
+            assert store.count(until="2025-11-21", search="roof") == 5
+            page1 = store.query(task="Roof", limit=2)
+            page2 = store.query(task="Roof", limit=2, offset=2)
+            assert [r["filename"] for r in page1 + page2] == ["Roof_4.jpg", "Roof_3.jpg", "Roof_2.jpg", "Roof_1.jpg"]
+            assert store.has_filename("Sink_0.jpg")
+            assert not store.has_filename("Sink_9.jpg")
+            # LIKE wildcards in the search text are matched literally
+            assert store.count(search="%") == 0
+
+
+def test_log_path_with_db_suffix_uses_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.db")
+        append_log_entries(_entries(2), path)
+        assert isinstance(get_log_writer(path), ProofLogStore)
+        assert get_log_store(path).count(task="Roof") == 2
+        get_log_store(path).close()
+        assert get_log_store(path).has_filename("Roof_1.jpg")  # reopens after close
+        get_log_store(path).close()
+
+
+def test_import_csv_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "log.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            f.write('timestamp,task,filename\n2025-11-20 12:00:00,"Fix sink, kitchen",a.jpg\n2025-11-20 12:00:01,Roof,b.jpg\n')
+        with ProofLogStore(os.path.join(tmp, "log.db")) as store:
+            assert store.import_csv(csv_path) == 2
+            assert store.import_csv(csv_path) == 0
+            assert store.was_imported(csv_path)
+            assert store.query(filename="a.jpg")[0]["task"] == "Fix sink, kitchen"
+
+
+def test_concurrent_processes_lose_no_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "log.db")
+        ProofLogStore(path).close()
+        procs = [multiprocessing.Process(target=_write_rows, args=(path, w, 50)) for w in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        with ProofLogStore(path) as store:
+            assert store.count() == 200
+            assert all(store.count(task=f"w{w}") == 50 for w in range(4))
+
+
+if __name__ == "__main__":
+    test_query_filters_and_pages_newest_first()
+    test_log_path_with_db_suffix_uses_store()
+    test_import_csv_once()
+    test_concurrent_processes_lose_no_rows()
+    print("Proof log store tests passed")
@@ -0,0 +1,71 @@
+"""Tests for the photo digest manifest embedded in proof PDFs."""
+
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+from photo_store import PhotoStore
+from proof_manifest import hash_file, read_manifest, verify
+from thumbnails import content_hash
+from utils import write_multipage_proof_pdf, write_proof_pdf
+
+
+def make_test_image(color=(200, 100, 50), size=(320, 240)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _write_images(tmp, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(tmp, f"img_{i+1}.jpg")
+        with open(path, "wb") as f:
+            f.write(make_test_image(color=(40 * i, 100, 150)))
+        paths.append(path)
+    return paths
+
+
+def test_multipage_manifest_verifies_originals():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _write_images(tmp, 3)
+        store = PhotoStore("s1", root=os.path.join(tmp, "spool"))
+        photos = []
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            photos.append({"ref": store.put(data, sha256=content_hash(data)), "sha256": content_hash(data),
+                           "filename": os.path.basename(path)})
+        pdf_path = os.path.join(tmp, "proof.pdf")
+        write_multipage_proof_pdf(pdf_path, photos, "See Photo 1.")
+
+        manifest = read_manifest(pdf_path)
+        assert [p[0] for p in manifest["photos"]] == ["img_1.jpg", "img_2.jpg", "img_3.jpg"]
+        assert manifest["photos"][1][2] == hash_file(paths[1])[0]
+
+        other = os.path.join(tmp, "other.jpg")
+        with open(other, "wb") as f:
+            f.write(make_test_image(color=(1, 2, 3)))
+        result = verify(pdf_path, [paths[2], other])
+        assert result["matched"] == [(paths[2], 3, "img_3.jpg")]
+        assert result["unknown"] == [other]
+        assert [n for n, _ in result["missing"]] == [1, 2]
+
+
+def test_single_proof_carries_manifest():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _write_images(tmp, 1)[0]
+        with open(path, "rb") as f:
+            data = f.read()
+        pdf_path = os.path.join(tmp, "proof.pdf")
+        write_proof_pdf(pdf_path, data, "img_1.jpg", "Roof", log_path=None)
+        assert verify(pdf_path, [path])["missing"] == []
+
+
+if __name__ == "__main__":
+    test_multipage_manifest_verifies_originals()
+    test_single_proof_carries_manifest()
+    print("Proof manifest tests passed")
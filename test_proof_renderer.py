@@ -0,0 +1,70 @@
+"""Tests for the reusable ProofRenderer behind the PDF writer functions."""
+
+import io
+import re
+
+from PIL import Image
+
+import utils
+from utils import ProofRenderer, link_photo_refs
+
+
+def make_test_image(color=(200, 100, 50), size=(1600, 1200)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_statement_photo_refs_become_links():
+    assert link_photo_refs("See Photo 2 and picture 10, not Photos 3.") == (
+        'See <a href="#photo_2">Photo 2</a> and <a href="#photo_10">picture 10</a>, not Photos 3.')
+
+
+def test_renderer_builds_resources_once_and_renders_many_documents():
+    renderer = ProofRenderer()
+    data = make_test_image()
+    first = io.BytesIO()
+    renderer.write_proof(first, data, "a.jpg", "Roof", log_path=None)
+    resources = renderer._res
+    assert resources is not None
+    photos = [{"bytes": data, "filename": "a.jpg"}, {"bytes": make_test_image((1, 2, 3)), "filename": "b.jpg"}]
+    second = io.BytesIO()
+    renderer.write_multipage(second, photos, "See Photo 2.", photo_comments={"0": "front"})
+    assert renderer._res is resources
+    assert first.getvalue()[:4] == second.getvalue()[:4] == b"%PDF"
+
+
+def test_renderer_defaults_apply_to_its_documents():
+    data = make_test_image()
+    low = io.BytesIO()
+    ProofRenderer(image_dpi=72, jpeg_quality=40).write_proof(low, data, "a.jpg", "Roof", log_path=None)
+    default = io.BytesIO()
+    utils.write_proof_pdf(default, data, "a.jpg", "Roof", log_path=None)
+    widths = [int(re.search(rb"/Width (\d+)", pdf.getvalue()).group(1)) for pdf in (low, default)]
+    # the photo fills 400x300pt: 400px at 72 dpi vs 834px at the 150 dpi default
+    assert widths == [400, 834]
+
+
+def test_image_that_cannot_be_drawn_falls_back_to_a_note():
+    from types import SimpleNamespace
+
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    from pdf_images import SharedImage
+
+    broken = SharedImage(SimpleNamespace(data=b"not a jpeg", draw_width=200, draw_height=150), "k")
+    out = io.BytesIO()
+    doc = SimpleDocTemplate(out, pageCompression=0)
+    doc.build([broken, Paragraph("after the photo", getSampleStyleSheet()["Normal"])])
+    pdf = out.getvalue()
+    assert b"(\\(Could not embed image\\))" in pdf and b"after the photo" in pdf
+
+
+if __name__ == "__main__":
+    test_statement_photo_refs_become_links()
+    test_renderer_builds_resources_once_and_renders_many_documents()
+    test_renderer_defaults_apply_to_its_documents()
+    test_image_that_cannot_be_drawn_falls_back_to_a_note()
+    print("Proof renderer tests passed")
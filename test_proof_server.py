@@ -0,0 +1,173 @@
+"""Tests for the async HTTP proof service: a round trip per endpoint, upload parsing and 429 backpressure."""
+
+import asyncio
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from proof_server import HTTPError, ProofService, encode_multipart, parse_multipart
+
+
+def make_test_image(color=(200, 100, 50), size=(640, 480)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class RunningService:
+    """Run a ProofService on its own event loop thread for the duration of a `with` block."""
+
+    def __init__(self, **kwargs):
+        self.service = ProofService(**kwargs)
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def __enter__(self):
+        started = threading.Event()
+
+        async def run():
+            self.server = await self.service.start("127.0.0.1", 0)
+            self.port = self.server.sockets[0].getsockname()[1]
+            started.set()
+            await self.server.serve_forever()
+
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(run(), self.loop)
+        assert started.wait(10), "service did not start"
+        return self
+
+    def __exit__(self, *exc):
+        async def stop():
+            self.server.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+        self.service.close()
+
+    def wait_idle(self, timeout):
+        """True once no request handler is running, within `timeout` seconds."""
+        async def handlers():
+            return [t for t in asyncio.all_tasks() if t.get_coro().__qualname__ == "ProofService.handle"]
+
+        deadline = time.monotonic() + timeout
+        while asyncio.run_coroutine_threadsafe(handlers(), self.loop).result(5):
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def post(self, path, fields, files):
+        content_type, body = encode_multipart(fields, files)
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+            resp = conn.getresponse()
+            return resp.status, dict(resp.getheaders()), resp.read()
+        finally:
+            conn.close()
+
+
+def test_single_and_multipage_round_trip():
+    with tempfile.TemporaryDirectory() as tmp, RunningService(workers=1, max_queue=2, log_path=None,
+                                                              spool_dir=tmp) as running:
+        status, headers, body = running.post("/proof", {"task": "Roof"}, [("photo", "a.jpg", make_test_image())])
+        assert status == 200 and body[:4] == b"%PDF"
+        assert int(headers["Content-Length"]) == len(body)
+
+        files = [("photos", f"{i}.jpg", make_test_image(color=(i * 80, 0, 0))) for i in range(2)]
+        status, _, body = running.post("/multipage", {"statement": "See Photo 2", "comment": ["one", "two"]}, files)
+        assert status == 200 and body[:4] == b"%PDF"
+
+        status, _, body = running.post("/multipage", {}, files)
+        assert status == 400
+
+        status, _, body = running.post("/proof", {"task": "Roof", "profile": "smallest"}, files[:1])
+        assert status == 200 and body[:4] == b"%PDF"
+        status, _, body = running.post("/proof", {"task": "Roof", "profile": "tiny"}, files[:1])
+        assert status == 400 and b"unknown PDF profile" in body
+
+        # an upload rejected after it was read in full: the answer ends at once, without waiting for the client
+        content_type, upload = encode_multipart({"profile": "tiny"}, files[:1])
+        with socket.create_connection(("127.0.0.1", running.port), timeout=3) as sock:
+            sock.sendall(f"POST /proof HTTP/1.1\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(upload)}\r\n\r\n".encode("latin-1") + upload)
+            with sock.makefile("rb") as f:
+                assert f.readline().startswith(b"HTTP/1.1 400") and b"unknown PDF profile" in f.read()
+            # ... and the handler is done, rather than waiting for the client to hang up
+            assert running.wait_idle(1)
+
+
+def test_full_queue_returns_429():
+    with tempfile.TemporaryDirectory() as tmp, RunningService(workers=1, max_queue=0, log_path=None,
+                                                              spool_dir=tmp) as running:
+        # a slow client holds the only slot while its upload trickles in
+        content_type, body = encode_multipart({"task": "Roof"}, [("photo", "a.jpg", make_test_image())])
+        slow = socket.create_connection(("127.0.0.1", running.port), timeout=60)
+        slow.sendall(f"POST /proof HTTP/1.1\r\nHost: x\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body[:1000])
+        deadline = time.monotonic() + 10
+        while running.service.admitted == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert running.service.admitted == 1
+
+        status, headers, _ = running.post("/proof", {"task": "Roof"}, [("photo", "b.jpg", make_test_image())])
+        assert status == 429 and headers["Retry-After"] == "1"
+
+        # the admitted request still completes
+        slow.sendall(body[1000:])
+        with slow.makefile("rb") as f:
+            assert f.readline().startswith(b"HTTP/1.1 200") and f.read()[-6:].rstrip().endswith(b"%%EOF")
+        slow.close()
+
+        conn = http.client.HTTPConnection("127.0.0.1", running.port, timeout=10)
+        conn.request("GET", "/healthz")
+        health = json.loads(conn.getresponse().read())
+        conn.close()
+        assert health["rejected"] == 1 and health["queued"] == 0 and health["running"] == 0
+        assert os.listdir(tmp) == []
+
+
+def test_multipart_body_is_split_from_the_spool():
+    content_type, body = encode_multipart({"statement": "line 1\r\nline 2", "comment": ["", "b"]},
+                                          [("photos", "dir/a.jpg", b"\r\n--x\r\n"), ("photos", "b.jpg", b"")])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "body")
+        with open(path, "wb") as f:
+            f.write(body)
+        fields, files = parse_multipart(content_type, path, tmp)
+        assert fields == {"statement": ["line 1\r\nline 2"], "comment": ["", "b"]}
+        assert [(name, filename, size) for name, filename, _, size in files] == [("photos", "a.jpg", 7),
+                                                                                ("photos", "b.jpg", 0)]
+        with open(files[0][2], "rb") as f:
+            assert f.read() == b"\r\n--x\r\n"
+        with open(path, "wb") as f:
+            f.write(body[:-40])
+        for args in ((content_type, path, tmp), ("text/plain", path, tmp)):
+            try:
+                parse_multipart(*args)
+            except HTTPError as e:
+                assert e.status == 400
+            else:
+                raise AssertionError("expected a 400")
+
+
+if __name__ == "__main__":
+    test_single_and_multipage_round_trip()
+    test_full_queue_returns_429()
+    test_multipart_body_is_split_from_the_spool()
+    print("Proof server tests passed")
@@ -0,0 +1,81 @@
+"""Tests for the batched Sheets logger against a local fake worksheet.
+
+No network or credentials are needed: `FakeWorksheet` stands in for a gspread
+worksheet and can be told to fail a number of calls.
+"""
+
+import os
+import tempfile
+
+from sheets_logger import SheetsLogger
+
+
+class FakeWorksheet:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.rows = []
+
+    def append_rows(self, rows, value_input_option="RAW"):
+        self.calls.append(len(rows))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("simulated Sheets outage")
+        self.rows.extend(rows)
+
+
+def _entry(i):
+    return {"timestamp": "2025-11-20 12:00:00", "task": "Sheets test", "filename": f"{i}.jpg"}
+
+
+def _logger(ws, tmp, **kwargs):
+    logger = SheetsLogger(worksheet=ws, spill_path=os.path.join(tmp, "spill.csv"), **kwargs)
+    logger._sleep = lambda s: None
+    return logger
+
+
+def test_batches_rows_with_append_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        ws = FakeWorksheet()
+        logger = _logger(ws, tmp, batch_size=10, flush_interval=60)
+        for i in range(25):
+            logger.log(_entry(i))
+        assert logger.flush(timeout=5)
+        logger.close()
+        assert ws.calls == [10, 10, 5]
+        assert [r[2] for r in ws.rows] == [f"{i}.jpg" for i in range(25)]
+
+
+def test_retries_transient_failures():
+    with tempfile.TemporaryDirectory() as tmp:
+        ws = FakeWorksheet(failures=2)
+        logger = _logger(ws, tmp, max_retries=3)
+        assert logger.append_now([_entry(1)])
+        assert len(ws.rows) == 1
+        assert ws.calls == [1, 1, 1]
+
+
+def test_spills_to_csv_and_replays_later():
+    with tempfile.TemporaryDirectory() as tmp:
+        ws = FakeWorksheet(failures=100)
+        logger = _logger(ws, tmp, batch_size=3, max_retries=1)
+        for i in range(3):
+            logger.log(_entry(i))
+        assert logger.flush(timeout=5)
+        assert ws.rows == []
+        assert os.path.getsize(os.path.join(tmp, "spill.csv")) > 0
+
+        # outage over: the spilled rows go out ahead of the next batch
+        ws.failures = 0
+        logger.log(_entry(3))
+        assert logger.flush(timeout=5)
+        logger.close()
+        assert [r[2] for r in ws.rows] == ["0.jpg", "1.jpg", "2.jpg", "3.jpg"]
+        assert os.path.getsize(os.path.join(tmp, "spill.csv")) == 0
+
+
+if __name__ == "__main__":
+    test_batches_rows_with_append_rows()
+    test_retries_transient_failures()
+    test_spills_to_csv_and_replays_later()
+    print("Sheets logger tests passed")
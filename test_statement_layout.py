@@ -0,0 +1,90 @@
+"""Tests for statement layout and photo reference resolution in multi-page proofs."""
+
+import io
+import re
+
+from PIL import Image
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+import utils
+from statement_layout import StatementFlowable, layout_statement
+from utils import dangling_photo_refs, generate_multipage_proof_pdf, link_photo_refs
+
+LINK_RE = re.compile(rb"/Subtype\s*/Link")
+
+
+def make_photos(n):
+    photos = []
+    for i in range(n):
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 48), color=(i * 60, 0, 0)).save(buf, format="JPEG")
+        photos.append({"bytes": buf.getvalue(), "filename": f"{i}.jpg"})
+    return photos
+
+
+def test_dangling_refs_are_left_unlinked():
+    assert link_photo_refs("Photo 2 and Photo 3", photo_count=2) == '<a href="#photo_2">Photo 2</a> and Photo 3'
+    assert dangling_photo_refs("Photo 3, photo 0, picture 03 and Photo 1", 2) == ["Photo 3", "Photo 0", "Picture 3"]
+    # a link to a missing anchor used to fail the whole build
+    pdf = generate_multipage_proof_pdf(make_photos(2), "See Photo 1 and Photo 99.", cache=False)
+    assert len(LINK_RE.findall(pdf)) == 1
+
+
+def test_layout_wraps_lines_and_resolves_refs_in_one_pass():
+    lines = ["short (Photo 2) and Photo 7", "", "word " * 40]
+    rows, tops, height, dangling = layout_statement(lines, 200, "Helvetica", 10, 12, 6, photo_count=3)
+    assert rows[0][0] == "short (Photo 2) and Photo 7"
+    # only the existing photo is linked, at the x of its text
+    [(x, w, anchor)] = rows[0][1]
+    assert anchor == "photo_2"
+    assert abs(x - stringWidth("short (", "Helvetica", 10)) < 1e-6 and w == stringWidth("Photo 2", "Helvetica", 10)
+    assert dangling == ["Photo 7"]
+    # the blank line is just a gap; the long line wraps onto several rows
+    assert tops[:2] == [0, 12 + 6 + 6]
+    assert len(rows) > 3 and all(text.strip() for text, _ in rows)
+    assert height == tops[-1] + 12
+
+
+def test_long_statement_splits_across_pages_without_rewrapping():
+    style = getSampleStyleSheet()["Normal"]
+    flowable = StatementFlowable([f"Line {i}: see Photo {i % 3 + 1}" for i in range(500)], style, photo_count=3)
+    width, height = flowable.wrap(500, 700)
+    assert height > 700
+    pieces, rows = [], 0
+    while True:
+        parts = flowable.split(500, 700)
+        if not parts:
+            break
+        head, flowable = parts
+        assert head.wrap(500, 700)[1] <= 700
+        pieces.append(head)
+        assert head._layout is flowable._layout  # shared, never laid out again
+        if flowable.wrap(500, 700)[1] <= 700:
+            pieces.append(flowable)
+            break
+    assert sum(p._span[1] - p._span[0] for p in pieces) == 500
+
+
+def test_every_statement_length_fits_its_pages():
+    # lengths where the last piece fit only without its trailing gap used to fail with a LayoutError
+    photos = make_photos(1)
+    for n in range(utils.LONG_STATEMENT_LINES + 1, utils.LONG_STATEMENT_LINES + 200):
+        pdf = generate_multipage_proof_pdf(photos, "\n".join(f"line {i} short" for i in range(n)), cache=False)
+        assert pdf[:4] == b"%PDF", n
+
+
+def test_long_statements_use_one_flowable_and_link_real_photos():
+    lines = [f"Line {i}: inspected the area in Photo {i % 4 + 1}." for i in range(utils.LONG_STATEMENT_LINES + 50)]
+    pdf = generate_multipage_proof_pdf(make_photos(3), "\n".join(lines), cache=False)
+    # every fourth line refers to a photo the proof doesn't have
+    assert len(LINK_RE.findall(pdf)) == len(lines) - len(lines) // 4
+
+
+if __name__ == "__main__":
+    test_dangling_refs_are_left_unlinked()
+    test_layout_wraps_lines_and_resolves_refs_in_one_pass()
+    test_long_statement_splits_across_pages_without_rewrapping()
+    test_every_statement_length_fits_its_pages()
+    test_long_statements_use_one_flowable_and_link_real_photos()
+    print("Statement layout tests passed")
@@ -0,0 +1,44 @@
+"""Tests for the content-addressed thumbnail cache."""
+
+import io
+
+from PIL import Image
+
+from thumbnails import ThumbnailCache, content_hash
+
+
+def make_test_image(color=(200, 100, 50), size=(1600, 1200)):
+    im = Image.new("RGB", size, color=color)
+    buf = io.BytesIO()
+    im.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_thumbnail_is_small_and_cached_by_content():
+    cache = ThumbnailCache()
+    data = make_test_image()
+    thumb = cache.get(data, 160)
+    assert Image.open(io.BytesIO(thumb)).size == (160, 120)
+    # the same bytes (even a different object) hit the cache
+    assert cache.get(bytes(bytearray(data)), 160) is thumb
+    assert len(cache) == 1
+
+
+def test_cache_evicts_least_recently_used():
+    images = [make_test_image(color=(i * 40, 0, 0)) for i in range(4)]
+    first = ThumbnailCache().get(images[0], 160)
+    cache = ThumbnailCache(max_bytes=len(first) * 2 + len(first) // 2)
+    for data in images[:2]:
+        cache.get(data, 160)
+    cache.get(images[0], 160)  # touch, so images[1] is now the oldest
+    cache.get(images[2], 160)
+    assert len(cache) == 2
+    assert cache.current_bytes <= cache.max_bytes
+    kept = {digest for digest, _ in cache._items}
+    assert kept == {content_hash(images[0]), content_hash(images[2])}
+
+
+if __name__ == "__main__":
+    test_thumbnail_is_small_and_cached_by_content()
+    test_cache_evicts_least_recently_used()
+    print("Thumbnail cache tests passed")
@@ -0,0 +1,94 @@
+"""Content-addressed thumbnail cache for the session photo grid.
+
+Thumbnails are keyed by the SHA-256 of the original image bytes and the
+requested size, so each photo is decoded and shrunk once and then reused by
+every rerun (and by every session that uploads the same file). The cache is
+an LRU bounded by the total size of the stored thumbnails.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from image_prep import check_pixels
+
+DEFAULT_THUMB_SIZE = 160
+
+
+def content_hash(data: bytes) -> str:
+    """Hex SHA-256 of image bytes, used as the cache key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_thumbnail(data: bytes, size: int = DEFAULT_THUMB_SIZE, quality: int = 80) -> bytes:
+    """Return JPEG bytes of the image scaled to fit a size x size box."""
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    check_pixels(*img.size)
+    # let the JPEG decoder skip most of the pixels when shrinking a lot
+    img.draft("RGB", (size, size))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((size, size))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of thumbnails, bounded by `max_bytes` of thumbnail data."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, data: bytes, size: int = DEFAULT_THUMB_SIZE, digest: str = None) -> bytes:
+        """Return the thumbnail for `data`, generating it on a miss.
+
+        Pass `digest` (from content_hash) when already known to skip rehashing.
+        `data` may also be a photo store handle, which is only read on a miss.
+        """
+        if digest is None and hasattr(data, "read_bytes"):
+            digest = data.sha256
+        if digest is None:
+            if hasattr(data, "read_bytes"):
+                data = data.read_bytes()
+            digest = content_hash(data)
+        key = (digest, size)
+        with self._lock:
+            thumb = self._items.get(key)
+            if thumb is not None:
+                self._items.move_to_end(key)
+                return thumb
+        if hasattr(data, "read_bytes"):
+            data = data.read_bytes()
+        thumb = make_thumbnail(data, size)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = thumb
+                self.current_bytes += len(thumb)
+                while self.current_bytes > self.max_bytes and len(self._items) > 1:
+                    _, old = self._items.popitem(last=False)
+                    self.current_bytes -= len(old)
+        return thumb
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+
+default_cache = ThumbnailCache(int(os.getenv("SNAPPROOF_THUMB_CACHE_MB", "64")) * 1024 * 1024)
+
+
+def get_thumbnail(data: bytes, size: int = DEFAULT_THUMB_SIZE, digest: str = None) -> bytes:
+    """Thumbnail from the process-wide cache."""
+    return default_cache.get(data, size, digest)
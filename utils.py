@@ -1,100 +1,144 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
-from PIL import Image
+"""PDF proof generation and proof logging for SnapProof.
+
+Heavy dependencies (reportlab, PIL) are imported inside the functions that
+use them, so importing this module stays cheap for the Streamlit app and
+batch workers; Python caches each one after its first use. The PDF writers
+are thin wrappers over a ProofRenderer, which builds reportlab styles and
+font metrics once per process.
+"""
 import io
 import os
-import pandas as pd
+import re
+import tempfile
+import threading
+import types
+from dataclasses import asdict
 from datetime import datetime
+from html import escape
+
 try:
-    # optional: load .env if present
+    # optional: load .env if present (before the modules below read their env defaults)
     from dotenv import load_dotenv
     load_dotenv()
 except Exception:
     pass
 
+from proof_log import append_log_entries
+from image_prep import (DEFAULT_DPI, DEFAULT_JPEG_QUALITY, DEFAULT_WORKERS as DEFAULT_IMAGE_WORKERS, ImageTooLarge,
+                        prepare_images)
+from sheets_logger import get_sheets_logger
+from proof_manifest import build_manifest, encode_manifest, photo_digest
+from pdf_profiles import get_profile
+from metrics import stage
+import proof_cache
+
+
+PDF_CHUNK_SIZE = 64 * 1024
+# box the photo of a single-photo proof is scaled into: letter width less margins, 300pt high
+PROOF_IMAGE_BOX = (512.0, 300)
+# box photos of a multi-page proof are scaled into: the letter frame inside 50pt margins,
+# less 96pt for the label and comment
+MULTIPAGE_IMAGE_BOX = (512.0, 596.0)
+# statements with more lines than this are laid out in one pass as plain text (see statement_layout)
+LONG_STATEMENT_LINES = int(os.getenv("SNAPPROOF_LONG_STATEMENT_LINES", "200"))
 
-def generate_proof_pdf(file_bytes: bytes, filename: str, task_description: str, log_path: str = "proof_log.csv") -> bytes:
+
+def generate_proof_pdf(file_bytes: bytes, filename: str, task_description: str, log_path: str = "proof_log.csv",
+                       image_dpi: int = None, jpeg_quality: int = None, profile=None) -> bytes:
     """Generate a proof PDF from image bytes and log the entry.
 
-    Returns PDF bytes.
+    image_dpi / jpeg_quality: resampling target for the embedded photo
+    (defaults: SNAPPROOF_IMAGE_DPI / SNAPPROOF_JPEG_QUALITY or 150 dpi, quality 85)
+    profile: output profile name or pdf_profiles.PdfProfile ("fast", "balanced",
+    "smallest"; default SNAPPROOF_PDF_PROFILE or "balanced")
+    Returns PDF bytes. Use write_proof_pdf to write to a file instead.
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
     pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=letter)
-    page_width, page_height = letter
-    margin = 50
-    y = page_height - margin
-
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, "SnapProof – Timestamped Proof")
-    c.setFont("Helvetica", 11)
-    y -= 30
-    c.drawString(margin, y, f"Task: {task_description}")
-    y -= 18
-    c.drawString(margin, y, f"Timestamp: {timestamp}")
-    y -= 18
-    c.drawString(margin, y, f"Filename: {filename}")
-    y -= 24
+    write_proof_pdf(pdf_buffer, file_bytes, filename, task_description, log_path=log_path,
+                    image_dpi=image_dpi, jpeg_quality=jpeg_quality, profile=profile)
+    return pdf_buffer.getvalue()
 
-    try:
-        img = Image.open(io.BytesIO(file_bytes)).convert("RGB")
-        img_w, img_h = img.size
-
-        max_w = page_width - 2 * margin
-        max_h = 300
-        scale = min(max_w / img_w, max_h / img_h, 1.0)
-        draw_w = img_w * scale
-        draw_h = img_h * scale
-
-        img_reader = ImageReader(img)
-        c.drawImage(img_reader, margin, y - draw_h, width=draw_w, height=draw_h)
-        y -= draw_h + 20
-    except Exception as e:
-        y -= 10
-        c.setFont("Helvetica-Oblique", 10)
-        c.drawString(margin, y, f"(Could not embed image: {e})")
-        y -= 12
-
-    c.setFont("Helvetica", 9)
-    c.drawString(margin, 40, "Generated by SnapProof")
-
-    c.showPage()
-    c.save()
-    pdf_buffer.seek(0)
-    pdf_bytes = pdf_buffer.getvalue()
 
+def write_proof_pdf(out, file_bytes: bytes, filename: str, task_description: str, log_path: str = "proof_log.csv",
+                    image_dpi: int = None, jpeg_quality: int = None, profile=None) -> dict:
+    """Write a proof PDF to `out` (a path or writable binary file) and log the entry.
+
+    Takes the same arguments as generate_proof_pdf; log_path=None skips logging
+    (for callers that log in bulk). Returns the log entry.
+    """
+    return default_renderer.write_proof(out, file_bytes, filename, task_description, log_path=log_path,
+                                        image_dpi=image_dpi, jpeg_quality=jpeg_quality, profile=profile)
+
+
+def write_bulk_proof_pdfs(items, out, pages_per_file: int = None, log_path: str = "proof_log.csv",
+                          image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                          profile=None) -> list:
+    """Write many single-photo proofs, one page each, in one canvas pass per output document.
+
+    items: iterable of (image, filename, task_description); image is bytes, a file
+    path or a photo_store.PhotoRef. Items are consumed lazily and files are read
+    only when their page is prepared, so the input can be a generator over
+    thousands of photos.
+    out: a path or writable binary file. With pages_per_file, `out` is a path
+    template such as "proofs_{n:03d}.pdf" and a new document is started every
+    `pages_per_file` pages (n counts from 1); a template without {n} raises
+    ValueError. reportlab keeps a document's
+    embedded photos in memory until it is saved, so this bounds memory for
+    large runs.
+    workers: photos prepared in parallel (default SNAPPROOF_IMAGE_WORKERS or
+    one per CPU); that many items are read ahead of the page being drawn.
+    Each document's pages are logged with one batch write once it is saved;
+    log_path=None skips logging. image_dpi / jpeg_quality / profile as for
+    generate_proof_pdf. Returns [(output, pages)] per document.
+    """
+    return default_renderer.write_bulk(items, out, pages_per_file=pages_per_file, log_path=log_path,
+                                       image_dpi=image_dpi, jpeg_quality=jpeg_quality, workers=workers,
+                                       profile=profile)
+
+
+def log_proof_entries(entries: list, log_path: str = "proof_log.csv") -> None:
+    """Log proof entries to Google Sheets if enabled, otherwise (or on failure) to the CSV log.
+
+    Several entries are written with a single locked append. Never raises.
+    """
     # Attempt Google Sheets logging if enabled, otherwise fall back to CSV
-    entry = {"timestamp": timestamp, "task": task_description, "filename": filename}
     use_sheets = os.getenv("USE_SHEETS", "false").lower() in ("1", "true", "yes")
     if use_sheets:
         try:
-            log_to_sheets(entry)
+            # queued for the background writer; failed batches spill to a CSV and are replayed later
+            with stage("log.sheets_queue") as s:
+                s.photos = len(entries)
+                sheets = get_sheets_logger()
+                for entry in entries:
+                    sheets.log(entry)
         except Exception:
             # if sheets logging fails, fall back to CSV
             try:
-                if os.path.exists(log_path):
-                    df = pd.read_csv(log_path)
-                    df = pd.concat([df, pd.DataFrame([entry])], ignore_index=True)
-                else:
-                    df = pd.DataFrame([entry])
-                df.to_csv(log_path, index=False)
+                _append_log(entries, log_path)
             except Exception:
                 pass
     else:
         try:
-            if os.path.exists(log_path):
-                df = pd.read_csv(log_path)
-                df = pd.concat([df, pd.DataFrame([entry])], ignore_index=True)
-            else:
-                df = pd.DataFrame([entry])
-            df.to_csv(log_path, index=False)
+            _append_log(entries, log_path)
         except Exception:
             # If logging fails, ignore but do not break PDF generation
             pass
 
-    return pdf_bytes
+
+def _append_log(entries: list, log_path: str) -> None:
+    with stage("log.local") as s:
+        s.photos = len(entries)
+        append_log_entries(entries, log_path)
+
+
+def _output_size(out) -> int:
+    """Bytes written to a path or file sink, or None when the sink can't tell."""
+    try:
+        if isinstance(out, (str, os.PathLike)):
+            return os.path.getsize(out)
+        return out.tell()
+    except (OSError, AttributeError, ValueError):
+        return None
 
 
 def log_to_sheets(entry: dict, sheet_id: str = None, sheet_name: str = "Sheet1", creds_path: str = None) -> bool:
@@ -104,122 +148,545 @@ def log_to_sheets(entry: dict, sheet_id: str = None, sheet_name: str = "Sheet1",
       - GOOGLE_CREDENTIALS: path to service account JSON (default: credentials.json)
       - GOOGLE_SHEETS_ID: spreadsheet ID (from its URL)
 
-    Returns True on success, raises on failure.
+    The credentials and worksheet handle are cached per sheet, so only the
+    first call pays for authorization. Returns True on success, raises on failure.
+    """
+    with stage("log.sheets_append") as s:
+        s.photos = 1
+        return get_sheets_logger(sheet_id, sheet_name, creds_path).append_now([entry])
+
+
+def generate_multipage_proof_pdf(photos: list, statement: str, photo_comments: dict = None,
+                                 image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                                 profile=None, cache=None, cache_key: str = None) -> bytes:
+    """Generate a multi-page PDF containing a statement and a page per photo.
+
+    photos: list of dicts with keys 'bytes' (or 'ref', a photo_store.PhotoRef) and 'filename'
+    statement: user statement text
+    image_dpi / jpeg_quality: resampling target for embedded photos (see generate_proof_pdf)
+    workers: photos prepared in parallel (default SNAPPROOF_IMAGE_WORKERS or one per CPU)
+    profile: output profile (see generate_proof_pdf)
+    cache: proof_cache.ProofCache holding finished proofs (default
+    proof_cache.default_cache; False renders without it). An identical
+    request returns the stored PDF without any layout or image work. A proof
+    in which a photo could not be embedded is not stored.
+    cache_key: multipage_proof_key() of these arguments, when the caller
+    already has it
+    Returns PDF bytes. Use write_multipage_proof_pdf or iter_multipage_proof_pdf
+    to avoid holding the document in memory.
+    """
+    pdf_buffer = io.BytesIO()
+    write_multipage_proof_pdf(pdf_buffer, photos, statement, photo_comments=photo_comments,
+                              image_dpi=image_dpi, jpeg_quality=jpeg_quality, workers=workers, profile=profile,
+                              cache=cache, cache_key=cache_key)
+    return pdf_buffer.getvalue()
+
+
+def multipage_proof_key(photos: list, statement: str, photo_comments: dict = None,
+                        image_dpi: int = None, jpeg_quality: int = None, profile=None) -> str:
+    """Digest of a multi-page proof's inputs: its proof cache key.
+
+    Equal keys mean byte-identical PDFs, so a caller holding the PDF of a key
+    can skip generating it again.
     """
+    return default_renderer.multipage_key(photos, statement, photo_comments=photo_comments,
+                                          image_dpi=image_dpi, jpeg_quality=jpeg_quality, profile=profile)
+
+
+def prepare_proof_photos(photos: list, image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                         profile=None) -> list:
+    """Prepare session photos for a multi-page proof ahead of time.
+
+    The results land in image_prep's cache, so a later generate_multipage_proof_pdf
+    with the same settings skips decoding and scaling them. Returns the
+    PreparedImage (or exception) per photo.
+    """
+    return default_renderer.prepare_photos(photos, image_dpi=image_dpi, jpeg_quality=jpeg_quality,
+                                           workers=workers, profile=profile)
+
+
+def iter_multipage_proof_pdf(photos: list, statement: str, photo_comments: dict = None,
+                             chunk_size: int = PDF_CHUNK_SIZE, **kwargs):
+    """Render a multi-page proof and yield it in chunks of `chunk_size` bytes.
+
+    The document is spooled to a temporary file (in memory only while small),
+    so callers such as an HTTP response can stream it without a full copy.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as spool:
+        write_multipage_proof_pdf(spool, photos, statement, photo_comments=photo_comments, **kwargs)
+        spool.seek(0)
+        yield from iter_file_chunks(spool, chunk_size)
+
+
+def iter_file_chunks(source, chunk_size: int = PDF_CHUNK_SIZE):
+    """Yield the contents of a path or binary file object in chunks."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_file_chunks(f, chunk_size)
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _encoder_options(profile) -> dict:
+    """prepare_images keyword arguments for a PdfProfile's image settings."""
+    return {"subsampling": profile.subsampling, "optimize": profile.optimize, "passthrough": profile.passthrough}
+
+
+def _photo_source(p: dict):
+    """In-memory bytes of a session photo, or its disk-backed store handle."""
+    if p.get('bytes') is not None:
+        return p['bytes']
+    return p.get('ref')
+
+
+def _is_long_statement(statement: str) -> bool:
+    return len(statement.splitlines()) > LONG_STATEMENT_LINES
+
+
+def _photo_comment(photo_comments: dict, idx: int) -> str:
+    """Comment of the photo at `idx`; photo_comments may be keyed by int or str index."""
+    return photo_comments.get(str(idx)) or photo_comments.get(idx) or ''
+
+
+def _write_output(out, data: bytes) -> None:
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "wb") as f:
+            f.write(data)
+    else:
+        out.write(data)
+
+
+def _output_start(out):
+    """Offset a file object is at before a document is written to it (0 for paths), or None if unknown."""
+    if isinstance(out, (str, os.PathLike)):
+        return 0
     try:
-        import gspread
-        from oauth2client.service_account import ServiceAccountCredentials
-    except Exception as e:
-        raise RuntimeError("gspread and oauth2client are required for Google Sheets logging") from e
-
-    if creds_path is None:
-        creds_path = os.getenv("GOOGLE_CREDENTIALS", "credentials.json")
-    if sheet_id is None:
-        sheet_id = os.getenv("GOOGLE_SHEETS_ID")
-    if not sheet_id:
-        raise ValueError("Google Sheets ID not provided. Set GOOGLE_SHEETS_ID env var or pass sheet_id")
-
-    scope = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-    gc = gspread.authorize(creds)
-
-    # Open spreadsheet and worksheet
-    sh = gc.open_by_key(sheet_id)
+        return out.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _read_output(out, start: int) -> bytes:
+    """The document just written to `out` from offset `start`, or None if it can't be read back."""
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "rb") as f:
+            return f.read()
     try:
-        worksheet = sh.worksheet(sheet_name)
-    except Exception:
-        worksheet = sh.add_worksheet(title=sheet_name, rows="1000", cols="10")
+        end = out.tell()
+        out.seek(start)
+        data = out.read(end - start)
+        out.seek(end)
+        return data
+    except (AttributeError, OSError, ValueError):
+        return None
 
-    row = [entry.get("timestamp", ""), entry.get("task", ""), entry.get("filename", "")]
-    worksheet.append_row(row, value_input_option="USER_ENTERED")
-    return True
 
+def write_multipage_proof_pdf(out, photos: list, statement: str, photo_comments: dict = None,
+                              image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                              profile=None, cache=None, cache_key: str = None) -> None:
+    """Write a multi-page proof PDF to `out` (a path or writable binary file).
 
-def generate_multipage_proof_pdf(photos: list, statement: str, photo_comments: dict = None) -> bytes:
-    """Generate a multi-page PDF containing a statement and a page per photo.
+    Takes the same arguments as generate_multipage_proof_pdf.
+    """
+    default_renderer.write_multipage(out, photos, statement, photo_comments=photo_comments,
+                                     image_dpi=image_dpi, jpeg_quality=jpeg_quality, workers=workers,
+                                     profile=profile, cache=cache, cache_key=cache_key)
 
-    photos: list of dicts with keys 'bytes' and 'filename'
-    statement: user statement text
-    Returns PDF bytes.
+
+# "Photo 3" / "picture 12" in a statement; linked to that photo's page
+PHOTO_REF_RE = re.compile(r"\b(Photo|Picture)\s+(\d+)\b", flags=re.IGNORECASE)
+
+
+def link_photo_refs(text: str, photo_count: int = None) -> str:
+    """Replace occurrences like Photo 1 or Picture 2 with an internal link to #photo_1 / #photo_2.
+
+    With photo_count, references to photos the proof doesn't have are left as
+    plain text (a link to a missing anchor fails the whole PDF build).
     """
-    # Use ReportLab platypus to support anchors and internal links
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus.flowables import AnchorFlowable
+    def link(m):
+        n = int(m.group(2))
+        if photo_count is not None and not 1 <= n <= photo_count:
+            return m.group(0)
+        return f'<a href="#photo_{n}">{m.group(1)} {m.group(2)}</a>'
 
-    photo_comments = photo_comments or {}
+    return PHOTO_REF_RE.sub(link, text)
 
-    pdf_buffer = io.BytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter,
-                            rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    styles = getSampleStyleSheet()
-    normal = styles['Normal']
-    h1 = ParagraphStyle('h1', parent=styles['Heading1'], fontName='Helvetica-Bold', fontSize=16)
-    link_style = ParagraphStyle('link', parent=normal, textColor='blue', underline=True)
-
-    story = []
-
-    # Build statement page: replace "Photo N" or "Picture N" with internal links
-    import re
-
-    def replace_photo_refs(text: str) -> str:
-        # replace occurrences like Photo 1 or Picture 2 with an internal link to #photo_1
-        def _repl(m):
-            kind = m.group(1)
-            num = m.group(2)
-            anchor = f"photo_{num}"
-            return f'<a href="#{anchor}">{kind} {num}</a>'
-        return re.sub(r"\b(Photo|Picture)\s+(\d+)\b", _repl, text, flags=re.IGNORECASE)
-
-    story.append(Paragraph("SnapProof – Statement", h1))
-    story.append(Spacer(1, 12))
-    # Convert statement to paragraphs, applying replacements
-    for line in statement.splitlines():
-        linked = replace_photo_refs(line)
-        story.append(Paragraph(linked, normal))
-        story.append(Spacer(1, 6))
-
-    story.append(PageBreak())
-
-    # One page per photo with anchor and optional comment
-    for idx, p in enumerate(photos):
-        # anchor name
-        anchor_name = f"photo_{idx+1}"
-        story.append(AnchorFlowable(anchor_name))
-        # label
-        label = f"Photo {idx+1}: {p.get('filename','')}"
-        timestamp = p.get('timestamp', '')
-        if timestamp:
-            label = f"{label} — {timestamp}"
-        story.append(Paragraph(label, styles['Heading3']))
-        story.append(Spacer(1, 6))
+
+def dangling_photo_refs(statement: str, photo_count: int) -> list:
+    """References such as "Photo 9" to photos a proof of `photo_count` photos doesn't have, each once."""
+    found = {}
+    for m in PHOTO_REF_RE.finditer(statement):
+        if not 1 <= int(m.group(2)) <= photo_count:
+            found.setdefault(f"{m.group(1).capitalize()} {int(m.group(2))}", None)
+    return list(found)
+
+
+class ProofRenderer:
+    """Renders proof PDFs, reusing reportlab modules, styles and fonts across documents.
+
+    The module functions (generate_proof_pdf, write_multipage_proof_pdf, ...)
+    go through `default_renderer`; a long-running worker can also keep its own.
+    reportlab is imported and the styles are built on the first render (or on
+    warm()), not when the renderer is created. Rendering only reads those
+    resources, so one renderer can serve several threads.
+
+    image_dpi / jpeg_quality / workers / profile: defaults for documents rendered
+    without their own (see generate_proof_pdf / generate_multipage_proof_pdf)
+    """
+
+    # single-photo proof page layout, in points
+    MARGIN = 50
+    FOOTER_Y = 40
+
+    def __init__(self, image_dpi: int = None, jpeg_quality: int = None, workers: int = None, profile=None):
+        self.image_dpi = image_dpi
+        self.jpeg_quality = jpeg_quality
+        self.workers = workers
+        self.profile = profile
+        self._res = None
+        self._lock = threading.Lock()
+
+    def warm(self) -> "ProofRenderer":
+        """Import reportlab and build the styles and font metrics now (e.g. in a worker initializer)."""
+        self._resources()
+        return self
+
+    def _resources(self) -> types.SimpleNamespace:
+        if self._res is None:
+            with self._lock:
+                if self._res is None:
+                    self._res = self._build_resources()
+        return self._res
+
+    @staticmethod
+    def _build_resources() -> types.SimpleNamespace:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfgen import canvas
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus.flowables import AnchorFlowable
+        from pdf_images import SharedImage, draw_jpeg, xobject_key
+        from statement_layout import StatementFlowable
+
+        # load the metrics of the fonts proofs use, so the first document doesn't pay for parsing them
+        for font in ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique", "Times-Roman"):
+            pdfmetrics.getFont(font)
+        styles = getSampleStyleSheet()
+        return types.SimpleNamespace(
+            Canvas=canvas.Canvas, SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer,
+            PageBreak=PageBreak, AnchorFlowable=AnchorFlowable, SharedImage=SharedImage,
+            StatementFlowable=StatementFlowable,
+            draw_jpeg=draw_jpeg, xobject_key=xobject_key, pagesize=letter,
+            normal=styles['Normal'], heading3=styles['Heading3'],
+            h1=ParagraphStyle('h1', parent=styles['Heading1'], fontName='Helvetica-Bold', fontSize=16),
+        )
+
+    def _settings(self, image_dpi, jpeg_quality, profile) -> tuple:
+        """(profile, image_dpi, jpeg_quality) of one document: the call's, else the renderer's, else the profile's."""
+        profile = get_profile(profile or self.profile)
+        return profile, image_dpi or self.image_dpi, jpeg_quality or self.jpeg_quality or profile.jpeg_quality
+
+    def write_proof(self, out, file_bytes: bytes, filename: str, task_description: str,
+                    log_path: str = "proof_log.csv", image_dpi: int = None, jpeg_quality: int = None,
+                    profile=None) -> dict:
+        """See write_proof_pdf."""
+        r = self._resources()
+        profile, image_dpi, jpeg_quality = self._settings(image_dpi, jpeg_quality, profile)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        c = r.Canvas(out, pagesize=r.pagesize, pageCompression=int(profile.page_compression))
+        # photo digest for `python proof_manifest.py` verification
+        digest = photo_digest({"bytes": file_bytes})
+        c.setKeywords(encode_manifest(build_manifest([{"filename": filename}], [digest])))
+        with stage("proof.prepare") as s:
+            s.photos, s.bytes_in = 1, len(file_bytes)
+            prepared = prepare_images([file_bytes], *PROOF_IMAGE_BOX, dpi=image_dpi, jpeg_quality=jpeg_quality,
+                                      workers=1, digests=[digest[0]], **_encoder_options(profile))[0]
+            if not isinstance(prepared, Exception):
+                s.bytes_out = len(prepared.data)
+        self._draw_proof_page(c, prepared, digest[0], filename, task_description, timestamp,
+                              image_dpi, jpeg_quality, profile)
+
+        with stage("proof.render") as s:
+            c.showPage()
+            c.save()
+            s.bytes_out = _output_size(out)
+
+        entry = {"timestamp": timestamp, "task": task_description, "filename": filename}
+        if log_path is not None:
+            log_proof_entries([entry], log_path)
+        return entry
+
+    def _draw_proof_page(self, c, prepared, digest: str, filename: str, task_description: str, timestamp: str,
+                         image_dpi: int, jpeg_quality: int, profile) -> None:
+        """Draw one single-photo proof page on canvas `c` (without finishing the page).
+
+        prepared: the PreparedImage for PROOF_IMAGE_BOX, or the exception preparing it raised.
+        """
+        r = self._resources()
+        margin = self.MARGIN
+        y = r.pagesize[1] - margin
+
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(margin, y, "SnapProof – Timestamped Proof")
+        c.setFont("Helvetica", 11)
+        y -= 30
+        c.drawString(margin, y, f"Task: {task_description}")
+        y -= 18
+        c.drawString(margin, y, f"Timestamp: {timestamp}")
+        y -= 18
+        c.drawString(margin, y, f"Filename: {filename}")
+        y -= 24
 
         try:
-            img_buf = io.BytesIO(p['bytes'])
-            rl_img = RLImage(img_buf)
-            # scale image to fit width
-            max_w = letter[0] - doc.leftMargin - doc.rightMargin
-            if rl_img.drawWidth > max_w:
-                rl_img.drawHeight = rl_img.drawHeight * (max_w / rl_img.drawWidth)
-                rl_img.drawWidth = max_w
-            story.append(rl_img)
-            story.append(Spacer(1, 6))
-        except Exception:
-            story.append(Paragraph("(Could not embed image)", normal))
+            if isinstance(prepared, Exception):
+                raise prepared
+            draw_w = prepared.draw_width
+            draw_h = prepared.draw_height
+
+            key = r.xobject_key(digest, *PROOF_IMAGE_BOX, image_dpi, jpeg_quality, *profile.image_params())
+            r.draw_jpeg(c, prepared.data, key, margin, y - draw_h, draw_w, draw_h, ascii85=profile.ascii85)
+            y -= draw_h + 20
+        except Exception as e:
+            y -= 10
+            c.setFont("Helvetica-Oblique", 10)
+            c.drawString(margin, y, f"(Could not embed image: {e})")
+            y -= 12
+
+        c.setFont("Helvetica", 9)
+        c.drawString(margin, self.FOOTER_Y, "Generated by SnapProof")
+
+    def write_bulk(self, items, out, pages_per_file: int = None, log_path: str = "proof_log.csv",
+                   image_dpi: int = None, jpeg_quality: int = None, workers: int = None, profile=None) -> list:
+        """See write_bulk_proof_pdfs."""
+        from photo_store import PhotoRef
+
+        r = self._resources()
+        profile, image_dpi, jpeg_quality = self._settings(image_dpi, jpeg_quality, profile)
+
+        if pages_per_file is not None and (pages_per_file < 1 or not isinstance(out, str)):
+            raise ValueError("pages_per_file needs a positive page count and a path template for `out`")
+        if pages_per_file is not None and out.format(n=1) == out.format(n=2):
+            # every document would land on the same path, each overwriting the one before
+            raise ValueError(f"with pages_per_file, `out` must be a template with an {{n}} field, got {out!r}")
+        workers = workers or self.workers
+        if workers is None:
+            workers = DEFAULT_IMAGE_WORKERS or os.cpu_count() or 1
+        window = max(1, workers)
+
+        outputs = []
+        state = {"canvas": None, "target": None, "photos": [], "digests": [], "entries": []}
+
+        def finish():
+            c = state["canvas"]
+            if c is None:
+                return
+            # photo digests for `python proof_manifest.py` verification of the whole document
+            c.setKeywords(encode_manifest(build_manifest(state["photos"], state["digests"])))
+            with stage("bulk.render") as s:
+                s.photos = len(state["entries"])
+                c.save()
+                s.bytes_out = _output_size(state["target"])
+            outputs.append((state["target"], len(state["entries"])))
+            if log_path is not None:
+                log_proof_entries(state["entries"], log_path)
+            state.update(canvas=None, photos=[], digests=[], entries=[])
+
+        def source_of(image):
+            if isinstance(image, (str, os.PathLike)):
+                return PhotoRef(os.fspath(image), os.path.getsize(image))
+            return image
+
+        def render(chunk):
+            sources, digests = [], []
+            for image, _, _ in chunk:
+                try:
+                    source = source_of(image)
+                    digests.append(photo_digest({"ref": source} if isinstance(source, PhotoRef) else {"bytes": source}))
+                except OSError:
+                    source = None
+                    digests.append((None, 0))
+                sources.append(source)
+            with stage("bulk.prepare") as s:
+                s.photos = len(chunk)
+                s.bytes_in = sum(size for _, size in digests)
+                prepared_images = prepare_images(sources, *PROOF_IMAGE_BOX, dpi=image_dpi, jpeg_quality=jpeg_quality,
+                                                 workers=workers, digests=[d for d, _ in digests],
+                                                 **_encoder_options(profile))
+            for (image, filename, task), source, digest, prepared in zip(chunk, sources, digests, prepared_images):
+                if state["canvas"] is None:
+                    n = len(outputs) + 1
+                    state["target"] = out.format(n=n) if pages_per_file is not None else out
+                    state["canvas"] = r.Canvas(state["target"], pagesize=r.pagesize,
+                                               pageCompression=int(profile.page_compression))
+                if source is None:
+                    prepared = FileNotFoundError(f"cannot read {image}")
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._draw_proof_page(state["canvas"], prepared, digest[0], filename, task, timestamp,
+                                      image_dpi, jpeg_quality, profile)
+                state["canvas"].showPage()
+                state["photos"].append({"filename": filename})
+                state["digests"].append(digest)
+                state["entries"].append({"timestamp": timestamp, "task": task, "filename": filename})
+                if pages_per_file is not None and len(state["entries"]) >= pages_per_file:
+                    finish()
+
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= window:
+                render(chunk)
+                chunk = []
+        if chunk:
+            render(chunk)
+        finish()
+        return outputs
+
+    def prepare_photos(self, photos: list, image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                       profile=None) -> list:
+        """See prepare_proof_photos."""
+        profile, image_dpi, jpeg_quality = self._settings(image_dpi, jpeg_quality, profile)
+        return prepare_images([_photo_source(p) for p in photos], *MULTIPAGE_IMAGE_BOX, dpi=image_dpi,
+                              jpeg_quality=jpeg_quality, workers=workers or self.workers,
+                              digests=[p.get("sha256") for p in photos], **_encoder_options(profile))
+
+    def multipage_key(self, photos: list, statement: str, photo_comments: dict = None,
+                      image_dpi: int = None, jpeg_quality: int = None, profile=None, digests: list = None) -> str:
+        """See multipage_proof_key. digests: photo_digest() per photo, when already computed."""
+        profile, image_dpi, jpeg_quality = self._settings(image_dpi, jpeg_quality, profile)
+        photo_comments = photo_comments or {}
+        digests = digests or [photo_digest(p) for p in photos]
+        return proof_cache.proof_key(
+            photos=[[d, p.get('filename', ''), p.get('timestamp', ''), _photo_comment(photo_comments, i)]
+                    for i, (p, (d, _)) in enumerate(zip(photos, digests))],
+            statement=statement, long_statement=_is_long_statement(statement),
+            box=MULTIPAGE_IMAGE_BOX, image_dpi=image_dpi or DEFAULT_DPI,
+            jpeg_quality=jpeg_quality or DEFAULT_JPEG_QUALITY, profile=asdict(profile))
+
+    def write_multipage(self, out, photos: list, statement: str, photo_comments: dict = None,
+                        image_dpi: int = None, jpeg_quality: int = None, workers: int = None,
+                        profile=None, cache=None, cache_key: str = None) -> None:
+        """See write_multipage_proof_pdf."""
+        r = self._resources()
+        profile, image_dpi, jpeg_quality = self._settings(image_dpi, jpeg_quality, profile)
+        workers = workers or self.workers
+        photo_comments = photo_comments or {}
+        if cache is None:
+            cache = proof_cache.default_cache
+        # SHA-256 of each photo (recorded when it entered the session, else hashed in chunks),
+        # embedded as a manifest so `python proof_manifest.py` can verify originals against the PDF
+        with stage("multipage.hash") as s:
+            s.photos = len(photos)
+            digests = [photo_digest(p) for p in photos]
+
+        start = None
+        if cache is not False:
+            with stage("multipage.cache") as s:
+                cache_key = cache_key or self.multipage_key(photos, statement, photo_comments, image_dpi,
+                                                            jpeg_quality, profile, digests=digests)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    _write_output(out, cached)
+                    s.photos = len(photos)
+                    s.bytes_out = len(cached)
+                    return
+            start = _output_start(out)
+
+        # invariant: fixed creation date and document ID, so equal inputs give byte-identical PDFs
+        doc = r.SimpleDocTemplate(out, pagesize=r.pagesize,
+                                  rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50,
+                                  pageCompression=int(profile.page_compression), invariant=1,
+                                  keywords=encode_manifest(build_manifest(photos, digests)))
+        story = []
+
+        # Build statement page: "Photo N" / "Picture N" of photos in the proof become internal links
+        story.append(r.Paragraph("SnapProof – Statement", r.h1))
+        story.append(r.Spacer(1, 12))
+        lines = statement.splitlines()
+        if len(lines) > LONG_STATEMENT_LINES:
+            # one flowable for the whole statement: layout time stays linear in its length
+            story.append(r.StatementFlowable(lines, r.normal, len(photos)))
+        else:
+            # a paragraph per line, so short statements can use inline markup
+            for line in lines:
+                story.append(r.Paragraph(link_photo_refs(line, len(photos)), r.normal))
+                story.append(r.Spacer(1, 6))
+
+        story.append(r.PageBreak())
+
+        # Photos are scaled to the frame width, leaving room for the label and comment
+        max_w, max_h = MULTIPAGE_IMAGE_BOX
+        # Decode, orient, scale and encode every photo up front, in parallel
+        # (prepared results are cached by content hash, so regenerating after an edit or reorder skips this)
+        with stage("multipage.prepare") as s:
+            prepared_images = prepare_images([_photo_source(p) for p in photos], max_w, max_h,
+                                             dpi=image_dpi, jpeg_quality=jpeg_quality, workers=workers,
+                                             digests=[d for d, _ in digests], **_encoder_options(profile))
+            s.photos = len(photos)
+            s.bytes_in = sum(size for _, size in digests)
+            s.bytes_out = sum(len(p.data) for p in prepared_images if not isinstance(p, Exception))
+
+        # One page per photo with anchor and optional comment
+        images = []
+        for idx, p in enumerate(photos):
+            # anchor name
+            anchor_name = f"photo_{idx+1}"
+            story.append(r.AnchorFlowable(anchor_name))
+            # label
+            label = f"Photo {idx+1}: {p.get('filename','')}"
+            timestamp = p.get('timestamp', '')
+            if timestamp:
+                label = f"{label} — {timestamp}"
+            story.append(r.Paragraph(label, r.heading3))
+            story.append(r.Spacer(1, 6))
 
-        # photo comment
-        comment = photo_comments.get(str(idx)) or photo_comments.get(idx) or ''
-        if comment:
-            story.append(Paragraph(f"<b>Comment:</b> {comment}", normal))
-            story.append(Spacer(1, 6))
+            try:
+                prepared = prepared_images[idx]
+                if isinstance(prepared, Exception):
+                    raise prepared
+                # identical photos (same content hash) share one image XObject in the PDF
+                key = r.xobject_key(digests[idx][0], max_w, max_h, image_dpi, jpeg_quality, *profile.image_params())
+                images.append(r.SharedImage(prepared, key, ascii85=profile.ascii85))
+                story.append(images[-1])
+                story.append(r.Spacer(1, 6))
+            except ImageTooLarge as e:
+                start = None
+                story.append(r.Paragraph(f"<i>(Image not embedded: {escape(str(e), quote=False)})</i>", r.normal))
+            except Exception:
+                start = None
+                story.append(r.Paragraph("(Could not embed image)", r.normal))
 
-        story.append(PageBreak())
+            # photo comment
+            comment = _photo_comment(photo_comments, idx)
+            if comment:
+                story.append(r.Paragraph(f"<b>Comment:</b> {comment}", r.normal))
+                story.append(r.Spacer(1, 6))
 
-    doc.build(story)
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue()
+            story.append(r.PageBreak())
+
+        # platypus layout, image embedding and compression
+        with stage("multipage.layout") as s:
+            s.photos = len(photos)
+            doc.build(story)
+            s.bytes_out = _output_size(out)
+
+        # a photo that failed to embed may be readable next time: only complete proofs are cached
+        if start is not None and not any(image.failed for image in images):
+            size = _output_size(out)
+            if size is not None and cache.accepts(size - start):
+                data = _read_output(out, start)
+                if data is not None:
+                    cache.put(cache_key, data)
+
+
+default_renderer = ProofRenderer()
+
+
+def warm_renderer() -> None:
+    """Process pool initializer: load reportlab and the default renderer's styles before the first job."""
+    default_renderer.warm()